@@ -18,7 +18,8 @@ def create_app(config_name='development'):
     CORS(app, 
         resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:3001", "http://localhost:3002"]}},
         supports_credentials=True,
-        allow_headers=["Content-Type", "Authorization"],
+        allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+        expose_headers=["ETag"],
         methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
     
     db.init_app(app)
@@ -39,14 +40,30 @@ def create_app(config_name='development'):
     
     # Try to load ML routes (optional - backend can run without ML features)
     try:
-        from routes_ml import ml_bp
+        from routes_ml import ml_bp, init_ml
         app.register_blueprint(ml_bp, url_prefix='/api')
+        init_ml(app)
+
+        # Optional WebSocket streaming for live capture (needs flask-sock)
+        from ml_stream import register_ml_stream
+        register_ml_stream(app)
         print("ML routes loaded successfully")
     except ImportError as e:
         print(f"WARNING: ML routes not available: {e}")
         print("Backend will run without ML features (login and other features will still work)")
     
     register_routes(app)
+
+    from routes_telemetry import telemetry_bp
+    from telemetry_state import init_state_store
+    from telemetry import init_telemetry_buffer
+    from heartbeats import init_heartbeat_buffer
+    from view_counter import init_view_buffer
+    app.register_blueprint(telemetry_bp, url_prefix='/api')
+    init_state_store(app)
+    init_telemetry_buffer(app)
+    init_heartbeat_buffer(app)
+    init_view_buffer(app)
     
     with app.app_context():
         # Enable WAL mode for SQLite to handle concurrency better
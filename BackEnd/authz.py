@@ -0,0 +1,157 @@
+"""
+Authorization helpers shared by the route modules.
+
+Routes used to load the caller with User.query.get(get_jwt_identity()) and
+the device with Device.query.get() on every request just to compare
+device.user_id and user.role. Instead:
+
+  - The caller's role comes from the users table, never from the token,
+    and is cached per process (user id -> role, None once the user is gone)
+    for USER_ROLE_TTL seconds, so admin checks usually need no query. A
+    deleted or demoted admin loses access within the TTL instead of keeping
+    it until the 24 h token expires. Code that changes a role or deletes a
+    user calls ``invalidate_user``.
+  - The current user and their devices are loaded at most once per request
+    and kept on flask.g.
+  - Device ownership (device_id -> owner user id) is cached per process for
+    DEVICE_OWNER_TTL seconds. Code that adds a device (SQLite may hand out
+    the id of a deleted one again) or deletes one calls ``invalidate_device``;
+    the TTL bounds staleness for changes made outside the app (scripts).
+"""
+
+import threading
+import time
+
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt_identity
+
+from models import db, User, Device
+
+DEVICE_OWNER_TTL = 60
+USER_ROLE_TTL = 60
+
+# user_id -> (role or None if the user does not exist, expires at)
+_user_roles = {}
+_user_roles_lock = threading.Lock()
+
+# device_id -> (owner user id, expires at)
+_device_owners = {}
+_device_owners_lock = threading.Lock()
+
+
+def request_user_id():
+    """The caller's user id as int (None without a valid token)."""
+    if 'authz_user_id' not in g:
+        identity = get_jwt_identity()
+        g.authz_user_id = int(identity) if identity is not None else None
+    return g.authz_user_id
+
+
+def request_user():
+    """The caller's User row, loaded once per request (None if it no longer exists)."""
+    if 'authz_user' not in g:
+        user_id = request_user_id()
+        g.authz_user = db.session.get(User, user_id) if user_id is not None else None
+    return g.authz_user
+
+
+def request_devices():
+    """The caller's own Device rows, loaded once per request (also fills the ownership cache)."""
+    if 'authz_devices' not in g:
+        user_id = request_user_id()
+        devices = Device.query.filter_by(user_id=user_id).all() if user_id is not None else []
+        expires = time.monotonic() + DEVICE_OWNER_TTL
+        with _device_owners_lock:
+            for device in devices:
+                _device_owners[device.id] = (device.user_id, expires)
+        g.authz_devices = devices
+    return g.authz_devices
+
+
+def request_device_ids():
+    """Set of the ids of the caller's own devices, cached for the request."""
+    if 'authz_device_ids' not in g:
+        g.authz_device_ids = {device.id for device in request_devices()}
+    return g.authz_device_ids
+
+
+def request_role():
+    """The caller's role from the users table (cached), or None if the user no longer exists."""
+    if 'authz_role' not in g:
+        g.authz_role = user_role(request_user_id())
+    return g.authz_role
+
+
+def is_admin():
+    return request_role() == 'admin'
+
+
+def user_role(user_id):
+    if user_id is None:
+        return None
+    now = time.monotonic()
+    cached = _user_roles.get(user_id)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    if 'authz_user' in g and g.authz_user is not None and g.authz_user.id == user_id:
+        role = g.authz_user.role
+    else:
+        role = db.session.query(User.role).filter_by(id=user_id).scalar()
+    with _user_roles_lock:
+        _user_roles[user_id] = (role, now + USER_ROLE_TTL)
+    return role
+
+
+def invalidate_user(user_id):
+    with _user_roles_lock:
+        _user_roles.pop(user_id, None)
+
+
+def device_owners(device_ids):
+    """{device_id: owner user id} for the given ids that exist; queries only cache misses."""
+    now = time.monotonic()
+    owners = {}
+    missing = set()
+    # Devices the request already loaded for the caller need no lookup
+    own_ids = g.get('authz_device_ids', ())
+    for device_id in device_ids:
+        if device_id in own_ids:
+            owners[device_id] = request_user_id()
+            continue
+        cached = _device_owners.get(device_id)
+        if cached is not None and cached[1] > now:
+            owners[device_id] = cached[0]
+        else:
+            missing.add(device_id)
+    if missing:
+        rows = db.session.query(Device.id, Device.user_id).filter(Device.id.in_(missing)).all()
+        with _device_owners_lock:
+            for device_id, owner_id in rows:
+                _device_owners[device_id] = (owner_id, now + DEVICE_OWNER_TTL)
+                owners[device_id] = owner_id
+    return owners
+
+
+def device_owner(device_id):
+    """Owner user id of a device, or None if it does not exist."""
+    return device_owners([device_id]).get(device_id)
+
+
+def invalidate_device(device_id):
+    with _device_owners_lock:
+        _device_owners.pop(device_id, None)
+
+
+def can_access(owner_id):
+    """True if the caller owns the resource or is an admin."""
+    return owner_id == request_user_id() or is_admin()
+
+
+def device_access_error(device_id):
+    """None if the caller may access the device, else the 404 / 403 error response."""
+    owner_id = device_owner(device_id)
+    if owner_id is None:
+        return jsonify({'error': 'Device not found'}), 404
+    if not can_access(owner_id):
+        return jsonify({'error': 'Unauthorized access'}), 403
+    return None
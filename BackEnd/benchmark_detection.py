@@ -0,0 +1,209 @@
+"""
+Benchmark for /api/detect_disease.
+
+Drives create_app() in-process through the Flask test client (no running
+server needed) with several concurrent clients, using synthetic JPEGs of a few
+typical camera resolutions. For every (resolution, clients) combination it
+reports throughput, latency percentiles and the per-stage split read from the
+endpoint's Server-Timing header (decode, preprocess, inference, serialize).
+
+    python benchmark_detection.py
+    python benchmark_detection.py --clients 1,4,8 --requests 200 --output bench_onnx.json
+    ML_BACKEND=onnx ML_ONNX_QUANTIZE=true python benchmark_detection.py -o bench_int8.json
+
+ML_* environment variables are read as usual, so the same script compares
+backends, batch sizes and pool sizes. Results are written as JSON.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_RESOLUTIONS = '640x480,1280x720,1920x1080,4032x3024'
+STAGES = ('cache', 'decode', 'preprocess', 'inference', 'serialize')
+
+
+def synthetic_jpeg(width, height, seed, quality=85):
+    """Smooth gradient plus noise: compresses roughly like a real tank photo."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    img = np.empty((height, width, 3), dtype=np.float32)
+    img[..., 0] = (x * 0.3 + y * 0.2) % 256
+    img[..., 1] = (x * 0.1 + y * 0.6) % 256
+    img[..., 2] = 180 - y * 0.3
+    img += rng.normal(0, 12, img.shape)
+    buf = io.BytesIO()
+    Image.fromarray(img.clip(0, 255).astype(np.uint8)).save(buf, 'JPEG', quality=quality)
+    return buf.getvalue()
+
+
+def parse_server_timing(header):
+    timings = {}
+    for part in (header or '').split(','):
+        name, _, rest = part.strip().partition(';dur=')
+        if name and rest:
+            timings[name] = float(rest)
+    return timings
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 2) if values else None
+
+
+def summarize(latencies, stage_samples, elapsed, errors):
+    summary = {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(float(np.mean(latencies)), 2) if latencies else None,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': round(float(np.max(latencies)), 2) if latencies else None
+        },
+        'stages_ms': {}
+    }
+    for stage in STAGES:
+        values = stage_samples.get(stage)
+        if values:
+            summary['stages_ms'][stage] = {
+                'mean': round(float(np.mean(values)), 2),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95)
+            }
+    return summary
+
+
+def run_load(app, token, images, clients, total_requests):
+    """Fire total_requests requests from `clients` threads; returns the summary dict."""
+    latencies = []
+    stage_samples = {}
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def client_loop(client_id):
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            img_bytes = images[i % len(images)]
+            start = time.perf_counter()
+            response = client.post(
+                '/api/detect_disease',
+                headers=headers,
+                data={'image': (io.BytesIO(img_bytes), 'frame.jpg'), 'device_id': f'bench-{client_id}'},
+                content_type='multipart/form-data'
+            )
+            latency = (time.perf_counter() - start) * 1000
+            timings = parse_server_timing(response.headers.get('Server-Timing'))
+            with lock:
+                if response.status_code != 200:
+                    errors[0] += 1
+                    continue
+                latencies.append(latency)
+                for stage, duration in timings.items():
+                    stage_samples.setdefault(stage, []).append(duration)
+
+    threads = [threading.Thread(target=client_loop, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, stage_samples, elapsed, errors[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /api/detect_disease in-process')
+    parser.add_argument('--clients', default='1,4,8', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=100, help='requests per run')
+    parser.add_argument('--resolutions', default=DEFAULT_RESOLUTIONS, help='comma-separated WxH list')
+    parser.add_argument('--images-per-resolution', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests before each resolution')
+    parser.add_argument('--with-cache', action='store_true',
+                        help='keep the near-duplicate frame cache on (off by default so every request hits the model)')
+    parser.add_argument('--config', default='development', help='create_app config name')
+    parser.add_argument('-o', '--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    if not args.with_cache:
+        os.environ['ML_FRAME_CACHE_ENABLED'] = 'false'
+
+    from app import create_app
+    from flask_jwt_extended import create_access_token
+
+    app = create_app(args.config)
+    app.config['ML_FRAME_CACHE_ENABLED'] = args.with_cache
+    with app.app_context():
+        token = create_access_token(identity='benchmark')
+
+    import routes_ml
+    if not routes_ml.ensure_model_ready():
+        raise SystemExit('Model could not be loaded')
+
+    clients_levels = [int(c) for c in args.clients.split(',') if c.strip()]
+    resolutions = [tuple(int(v) for v in r.lower().split('x')) for r in args.resolutions.split(',') if r.strip()]
+
+    results = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'settings': {
+            'backend': routes_ml.backend_name,
+            'input_size': routes_ml.input_size,
+            'worker_pool_size': app.config.get('ML_WORKER_POOL_SIZE', 0),
+            'batch_max_size': app.config.get('ML_BATCH_MAX_SIZE'),
+            'batch_max_wait_ms': app.config.get('ML_BATCH_MAX_WAIT_MS'),
+            'frame_cache': args.with_cache,
+            'requests_per_run': args.requests
+        },
+        'runs': []
+    }
+
+    for width, height in resolutions:
+        images = [synthetic_jpeg(width, height, seed) for seed in range(args.images_per_resolution)]
+        if args.warmup:
+            run_load(app, token, images, 1, args.warmup)
+
+        for clients in clients_levels:
+            summary = run_load(app, token, images, clients, args.requests)
+            run = {
+                'resolution': f'{width}x{height}',
+                'image_kb': round(float(np.mean([len(b) for b in images])) / 1024, 1),
+                'clients': clients,
+                **summary
+            }
+            results['runs'].append(run)
+
+            latency = run['latency_ms']
+            stages = ' '.join(f"{name}={values['mean']}" for name, values in run['stages_ms'].items())
+            print(f"{run['resolution']:>10} x{clients:<3} {run['throughput_rps']:>8} req/s  "
+                  f"p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} ms  "
+                  f"errors={run['errors']}  [{stages}]")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
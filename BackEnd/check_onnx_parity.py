@@ -0,0 +1,134 @@
+"""
+Compare the ONNX Runtime backend against the original PyTorch model.
+
+Both backends see the exact same letterboxed frames. Detections are matched
+per class by IoU; the check fails (exit code 1) when a detection is missing on
+either side or a matched pair differs by more than the allowed box IoU /
+confidence tolerance.
+
+    python check_onnx_parity.py                      # FP32 ONNX, images from uploads/
+    python check_onnx_parity.py --quantize           # INT8 ONNX
+    python check_onnx_parity.py --export img1.jpg img2.jpg
+"""
+
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from frame_preprocess import FramePreprocessor
+from inference_backends import TorchBackend, OnnxBackend, export_onnx
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, 'best.pt')
+UPLOAD_DIRS = [os.path.join(BASE_DIR, 'uploads'), os.path.join(BASE_DIR, 'static', 'uploads')]
+
+
+def box_iou(a, b):
+    inter_w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    area_a = max(0.0, a[2] - a[0]) * max(0.0, a[3] - a[1])
+    area_b = max(0.0, b[2] - b[0]) * max(0.0, b[3] - b[1])
+    return inter / (area_a + area_b - inter + 1e-9)
+
+
+def compare(reference, candidate, min_iou, conf_tol):
+    """Greedy per-class matching. Returns a list of problem descriptions."""
+    problems = []
+    unmatched = list(candidate)
+    for ref in sorted(reference, key=lambda d: -d['confidence']):
+        same_class = [d for d in unmatched if d['class'] == ref['class']]
+        best = max(same_class, key=lambda d: box_iou(ref['bbox'], d['bbox']), default=None)
+        if best is None or box_iou(ref['bbox'], best['bbox']) < min_iou:
+            problems.append(f"missing {ref['class']} ({ref['confidence']:.2f})")
+            continue
+        unmatched.remove(best)
+        diff = abs(ref['confidence'] - best['confidence'])
+        if diff > conf_tol:
+            problems.append(f"{ref['class']} confidence {ref['confidence']:.3f} vs {best['confidence']:.3f}")
+    for extra in unmatched:
+        problems.append(f"extra {extra['class']} ({extra['confidence']:.2f})")
+    return problems
+
+
+def load_images(paths, limit):
+    if not paths:
+        for folder in UPLOAD_DIRS:
+            for pattern in ('*.jpg', '*.jpeg', '*.png'):
+                paths.extend(glob.glob(os.path.join(folder, '**', pattern), recursive=True))
+    images = []
+    for path in sorted(paths)[:limit]:
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read()))
+
+    if not images:
+        # No real photos around: fall back to random noise frames so the
+        # export and raw-output path is still exercised
+        print("No images found, using synthetic frames (detections will be sparse)")
+        rng = np.random.default_rng(0)
+        for i in range(min(limit, 4)):
+            buf = io.BytesIO()
+            Image.fromarray(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)).save(buf, 'JPEG')
+            images.append((f"synthetic_{i}.jpg", buf.getvalue()))
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', nargs='*', help='image files (default: uploads folders)')
+    parser.add_argument('--quantize', action='store_true', help='check the INT8 model')
+    parser.add_argument('--export', action='store_true', help='re-export even if the ONNX file is up to date')
+    parser.add_argument('--input-size', type=int, default=int(os.getenv('ML_INPUT_SIZE', '640')))
+    parser.add_argument('--limit', type=int, default=50, help='max number of images')
+    parser.add_argument('--min-iou', type=float, default=0.9, help='box IoU needed to count as the same detection')
+    parser.add_argument('--conf-tol', type=float, default=None,
+                        help='allowed confidence difference (default 0.02, 0.05 with --quantize)')
+    args = parser.parse_args()
+
+    conf_tol = args.conf_tol if args.conf_tol is not None else (0.05 if args.quantize else 0.02)
+
+    onnx_path = export_onnx(MODEL_PATH, args.input_size, quantize=args.quantize, force=args.export)
+    torch_backend = TorchBackend(MODEL_PATH, input_size=args.input_size).load()
+    onnx_backend = OnnxBackend(onnx_path, input_size=args.input_size, quantize=args.quantize).load()
+    if not onnx_backend.names:
+        onnx_backend.names = dict(torch_backend.model.names)
+
+    preprocessor = FramePreprocessor(args.input_size)
+    images = load_images(list(args.images), args.limit)
+
+    failures = 0
+    timings = {'torch': [], 'onnx': []}
+    for name, img_bytes in images:
+        frame = preprocessor.prepare(img_bytes).frame.copy()
+
+        start = time.perf_counter()
+        reference = torch_backend.predict([frame])[0]
+        timings['torch'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        candidate = onnx_backend.predict([frame])[0]
+        timings['onnx'].append(time.perf_counter() - start)
+
+        problems = compare(reference, candidate, args.min_iou, conf_tol)
+        status = 'OK  ' if not problems else 'FAIL'
+        print(f"{status} {name}: torch={len(reference)} onnx={len(candidate)}"
+              + (f" -> {'; '.join(problems)}" if problems else ''))
+        failures += bool(problems)
+
+    print()
+    print(f"Model: {os.path.basename(onnx_path)}  images: {len(images)}  mismatches: {failures}")
+    for backend_name, values in timings.items():
+        if values:
+            print(f"  {backend_name:<5} mean {np.mean(values) * 1000:.1f} ms/frame")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
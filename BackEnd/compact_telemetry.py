@@ -0,0 +1,67 @@
+"""
+Retention / compaction job for raw water telemetry.
+
+Deletes water_monitoring rows older than the retention window in small
+batches, releases the freed pages with incremental vacuum and prints what was
+removed and reclaimed. Meant to run from cron, e.g. nightly:
+
+    python compact_telemetry.py                     # TELEMETRY_RETENTION_DAYS from config
+    python compact_telemetry.py --days 30 --json
+    python compact_telemetry.py --enable-incremental-vacuum   # one-off, runs a full VACUUM
+"""
+
+import argparse
+import json
+
+from app import create_app
+from telemetry_retention import compact_telemetry, enable_incremental_vacuum
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, help='keep raw readings for this many days')
+    parser.add_argument('--batch-size', type=int, help='rows deleted per transaction')
+    parser.add_argument('--pause', type=float, default=0.05, help='seconds to sleep between batches')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='switch the database to auto_vacuum=INCREMENTAL first (full VACUUM, locks the database)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    app = create_app('development')
+    with app.app_context():
+        days = args.days if args.days is not None else app.config.get('TELEMETRY_RETENTION_DAYS', 90)
+        batch_size = args.batch_size or app.config.get('TELEMETRY_RETENTION_BATCH', 5000)
+        if days < 1:
+            parser.error('--days must be at least 1')
+
+        log = (lambda message: None) if args.json else print
+        if not args.json:
+            print("=" * 70)
+            print("TELEMETRY RETENTION / COMPACTION")
+            print("=" * 70)
+
+        if args.enable_incremental_vacuum:
+            log("📝 Switching database to incremental auto-vacuum (full VACUUM)...")
+            log("✅ Enabled" if enable_incremental_vacuum() else "✅ Already enabled")
+
+        report = compact_telemetry(days, batch_size=batch_size, pause=args.pause, log=log)
+
+        if args.json:
+            print(json.dumps(report, indent=2))
+            return
+
+        print(f"✅ Rows deleted:      {report['rows_deleted']} (remaining {report['remaining_rows']})")
+        print(f"✅ Pages freed:       {report['free_pages']} (released to disk: {report['released_pages']})")
+        print(f"✅ Bytes reclaimed:   {report['bytes_reclaimed']}")
+        if report['file_bytes_reclaimed'] is not None:
+            print(f"✅ Database file:     {report['file_bytes_before']} -> {report['file_bytes_after']} bytes")
+            print(f"✅ WAL shrunk by:     {report['wal_bytes_reclaimed']} bytes")
+        if not report['incremental_vacuum']:
+            print("📝 Incremental vacuum is off: freed pages are reused but the file does not shrink.")
+            print("   Run once with --enable-incremental-vacuum during a quiet period.")
+        print(f"✅ Done in {report['seconds']}s")
+        print("=" * 70)
+
+
+if __name__ == '__main__':
+    main()
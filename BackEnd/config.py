@@ -16,7 +16,85 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
-    
+
+    # Disease detection (YOLO) inference
+    # Frames from concurrent requests are grouped into one forward pass:
+    # a batch runs when ML_BATCH_MAX_SIZE frames are waiting or after ML_BATCH_MAX_WAIT_MS
+    ML_BATCH_MAX_SIZE = int(os.getenv('ML_BATCH_MAX_SIZE', '8'))
+    ML_BATCH_MAX_WAIT_MS = float(os.getenv('ML_BATCH_MAX_WAIT_MS', '10'))
+    ML_INFERENCE_TIMEOUT = float(os.getenv('ML_INFERENCE_TIMEOUT', '30'))  # seconds
+    ML_INPUT_SIZE = int(os.getenv('ML_INPUT_SIZE', '640'))  # model input is ML_INPUT_SIZE x ML_INPUT_SIZE
+    ML_CONF_THRESHOLD = float(os.getenv('ML_CONF_THRESHOLD', '0.25'))
+    ML_IOU_THRESHOLD = float(os.getenv('ML_IOU_THRESHOLD', '0.7'))
+
+    # Inference backend: 'torch' (ultralytics + best.pt) or 'onnx' (ONNX Runtime).
+    # The onnx backend exports best.pt to best.onnx on first load (best.int8.onnx
+    # when ML_ONNX_QUANTIZE is on). Thread counts of 0 keep ONNX Runtime defaults.
+    ML_BACKEND = os.getenv('ML_BACKEND', 'torch')
+    ML_ONNX_QUANTIZE = os.getenv('ML_ONNX_QUANTIZE', 'false').lower() in ('1', 'true', 'yes')
+    ML_ORT_INTRA_OP_THREADS = int(os.getenv('ML_ORT_INTRA_OP_THREADS', '0'))
+    ML_ORT_INTER_OP_THREADS = int(os.getenv('ML_ORT_INTER_OP_THREADS', '0'))
+
+    # Load and warm up the model in create_app instead of on the first request.
+    # /api/ml/health reports 503 until the model is hot.
+    ML_EAGER_LOAD = os.getenv('ML_EAGER_LOAD', 'false').lower() in ('1', 'true', 'yes')
+
+    # Near-duplicate frame cache (per user/device): frames whose perceptual hash is
+    # within ML_FRAME_CACHE_MAX_DISTANCE bits of a frame seen in the last
+    # ML_FRAME_CACHE_TTL seconds reuse its detections without running the model
+    ML_FRAME_CACHE_ENABLED = os.getenv('ML_FRAME_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    ML_FRAME_CACHE_MAX_DISTANCE = int(os.getenv('ML_FRAME_CACHE_MAX_DISTANCE', '4'))  # out of 64 bits
+    ML_FRAME_CACHE_TTL = float(os.getenv('ML_FRAME_CACHE_TTL', '5'))  # seconds
+    ML_FRAME_CACHE_MAX_KEYS = int(os.getenv('ML_FRAME_CACHE_MAX_KEYS', '1024'))  # LRU over user/device pairs
+
+    # Out-of-process inference pool: 0 = run the model inside each web worker,
+    # 'auto' = one inference process per CPU core. Start gunicorn with --preload
+    # so all web workers share the same pool; without it every web worker starts
+    # a pool of its own (size this per worker then).
+    _ML_WORKER_POOL_SIZE_STR = os.getenv('ML_WORKER_POOL_SIZE', '0')
+    ML_WORKER_POOL_SIZE = (os.cpu_count() or 1) if _ML_WORKER_POOL_SIZE_STR == 'auto' else int(_ML_WORKER_POOL_SIZE_STR)
+
+    # Bulk detection (/api/detect_disease/batch): limits per request
+    ML_BULK_MAX_IMAGES = int(os.getenv('ML_BULK_MAX_IMAGES', '500'))
+    ML_BULK_MAX_IMAGE_BYTES = int(os.getenv('ML_BULK_MAX_IMAGE_BYTES', str(20 * 1024 * 1024)))
+
+    # Device telemetry ingestion (/api/telemetry/water): devices send this key
+    # in the X-Device-Key header
+    DEVICE_INGEST_KEY = os.getenv('DEVICE_INGEST_KEY', 'dev-device-ingest-key')
+    TELEMETRY_MAX_BATCH = int(os.getenv('TELEMETRY_MAX_BATCH', '5000'))  # readings per request
+    TELEMETRY_EXPORT_CHUNK = int(os.getenv('TELEMETRY_EXPORT_CHUNK', '10000'))  # rows per streamed block
+
+    # Write-behind buffering of telemetry and heartbeats (ingest_buffer.py): requests
+    # are acknowledged at once and flushed in large transactions per worker process.
+    TELEMETRY_WRITE_BEHIND = os.getenv('TELEMETRY_WRITE_BEHIND', 'true').lower() in ('1', 'true', 'yes')
+    TELEMETRY_BUFFER_CAPACITY = int(os.getenv('TELEMETRY_BUFFER_CAPACITY', '50000'))  # readings held in memory
+    TELEMETRY_FLUSH_SIZE = int(os.getenv('TELEMETRY_FLUSH_SIZE', '2000'))  # flush at this many readings...
+    TELEMETRY_FLUSH_INTERVAL = float(os.getenv('TELEMETRY_FLUSH_INTERVAL', '1.0'))  # ...or after this many seconds
+    TELEMETRY_OFFER_TIMEOUT = float(os.getenv('TELEMETRY_OFFER_TIMEOUT', '0.5'))  # wait for space before 503
+    HEARTBEAT_BUFFER_CAPACITY = int(os.getenv('HEARTBEAT_BUFFER_CAPACITY', '20000'))
+    HEARTBEAT_FLUSH_SIZE = int(os.getenv('HEARTBEAT_FLUSH_SIZE', '5000'))
+    HEARTBEAT_FLUSH_INTERVAL = float(os.getenv('HEARTBEAT_FLUSH_INTERVAL', '5.0'))
+    HEARTBEAT_MIN_INTERVAL = float(os.getenv('HEARTBEAT_MIN_INTERVAL', '30'))  # unchanged pings within this are coalesced
+
+    # Forum topic / Fishpedia view counters (view_counter.py): views are counted in
+    # memory and added to the views columns in one batch per flush.
+    VIEW_WRITE_BEHIND = os.getenv('VIEW_WRITE_BEHIND', 'true').lower() in ('1', 'true', 'yes')
+    VIEW_BUFFER_CAPACITY = int(os.getenv('VIEW_BUFFER_CAPACITY', '100000'))  # views held in memory
+    VIEW_FLUSH_SIZE = int(os.getenv('VIEW_FLUSH_SIZE', '20000'))
+    VIEW_FLUSH_INTERVAL = float(os.getenv('VIEW_FLUSH_INTERVAL', '10.0'))
+
+    # Raw water readings are kept this long; older history comes from the rollups.
+    # Applied by compact_telemetry.py (run it from cron, e.g. nightly).
+    TELEMETRY_RETENTION_DAYS = int(os.getenv('TELEMETRY_RETENTION_DAYS', '90'))
+    TELEMETRY_RETENTION_BATCH = int(os.getenv('TELEMETRY_RETENTION_BATCH', '5000'))  # rows per delete transaction
+
+    # Latest-state store behind the device dashboards: a memory-mapped file shared
+    # by all workers on the host (default: instance/telemetry_state.v1.bin).
+    # Device ids >= TELEMETRY_STATE_CAPACITY fall back to database queries.
+    TELEMETRY_STATE_PATH = os.getenv('TELEMETRY_STATE_PATH')
+    TELEMETRY_STATE_CAPACITY = int(os.getenv('TELEMETRY_STATE_CAPACITY', '16384'))
+    TELEMETRY_TREND_WINDOW = int(os.getenv('TELEMETRY_TREND_WINDOW', '600'))  # seconds
+
     # Gemini AI Configuration - Support Multiple API Keys untuk High Availability
     # Format: GEMINI_API_KEYS=key1,key2,key3 (pisahkan dengan koma untuk backup keys)
     # Prioritas: GEMINI_API_KEYS (plural) > GEMINI_API_KEY (singular, backward compatibility)
@@ -0,0 +1,100 @@
+"""
+Shape-preserving downsampling of time series for charts.
+
+Both functions return the *indices* of the points to keep (sorted), so the
+caller can pick timestamps and values from any array it already has.
+
+  - lttb_indices:   Largest-Triangle-Three-Buckets. Keeps exactly `threshold`
+                    points, choosing in each bucket the point that forms the
+                    largest triangle with the previously kept point and the
+                    average of the next bucket. Preserves peaks and shape.
+  - minmax_indices: Minimum and maximum of each bucket. Never hides a spike,
+                    at the cost of a more jagged line.
+"""
+
+import numpy as np
+
+
+def _bucket_edges(n, buckets):
+    # Interior points 1..n-2 split into `buckets` nearly equal ranges
+    return np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x, y, threshold):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = _bucket_edges(n, threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bx = x[start:end]
+        by = y[start:end]
+        # Twice the triangle area; the constant factor doesn't change argmax
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def minmax_indices(x, y, threshold):
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 4:
+        # No room for a min/max pair: first point, most extreme interior point, last point
+        if threshold < 3:
+            return np.array([0, n - 1])[:max(threshold, 1)]
+        extreme = 1 + int(np.argmax(np.abs(y[1:-1] - y.mean())))
+        return np.array([0, extreme, n - 1])
+
+    # Two points per bucket, plus the first and last point
+    buckets = (threshold - 2) // 2
+    edges = _bucket_edges(n, buckets)
+    starts = edges[:-1]
+    lengths = np.diff(edges)
+    valid = lengths > 0
+    starts, lengths = starts[valid], lengths[valid]
+
+    # Pad buckets into a 2-D array so argmin/argmax run in one call
+    width = int(lengths.max())
+    offsets = np.arange(width)
+    index = starts[:, None] + offsets[None, :]
+    inside = offsets[None, :] < lengths[:, None]
+    index = np.where(inside, index, starts[:, None])
+    values = y[index]
+
+    mins = index[np.arange(len(starts)), np.argmin(np.where(inside, values, np.inf), axis=1)]
+    maxs = index[np.arange(len(starts)), np.argmax(np.where(inside, values, -np.inf), axis=1)]
+
+    return np.unique(np.concatenate(([0, n - 1], mins, maxs)))
+
+
+METHODS = {
+    'lttb': lttb_indices,
+    'minmax': minmax_indices
+}
+
+
+def downsample_indices(x, y, threshold, method='lttb'):
+    """Indices to keep for one series, ignoring points where y is NaN."""
+    y = np.asarray(y, dtype=np.float64)
+    present = np.flatnonzero(~np.isnan(y))
+    if len(present) == 0:
+        return present
+    keep = METHODS[method](np.asarray(x, dtype=np.float64)[present], y[present], threshold)
+    return present[keep]
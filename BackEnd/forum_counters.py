@@ -0,0 +1,71 @@
+"""
+Denormalized forum counters.
+
+forum_topics.like_count / reply_count and forum_replies.like_count are
+stored on the rows so listings read them as plain columns instead of
+counting likes and replies on every request. The routes that add or remove
+a like or a reply adjust the counter with a single
+``UPDATE ... SET n = n + delta`` in the same transaction as the row they
+insert or delete, so the two commit or roll back together and concurrent
+requests never lose an increment.
+
+Counters can still drift (rows deleted by scripts or by hand, seed data,
+the migration that introduced them); ``reconcile_forum_counters`` recounts
+them from the like / reply tables and repairs the rows that differ. Run it
+with reconcile_forum_counters.py.
+"""
+
+from sqlalchemy import func, text, update
+
+from models import db
+
+# counter -> (table, column, source table, foreign key in the source table)
+COUNTERS = {
+    'topic_likes': ('forum_topics', 'like_count', 'forum_topic_likes', 'topic_id'),
+    'topic_replies': ('forum_topics', 'reply_count', 'forum_replies', 'topic_id'),
+    'reply_likes': ('forum_replies', 'like_count', 'forum_reply_likes', 'reply_id')
+}
+
+
+def adjust_counter(model, row_id, column, delta):
+    """
+    Add delta to a counter column of one row inside the current transaction.
+    Returns the new value (None if the row does not exist). The caller commits.
+    """
+    counter = getattr(model, column)
+    values = {counter: func.max(func.coalesce(counter, 0) + delta, 0)}
+    if hasattr(model, 'updated_at'):
+        # A like is not an edit; keep onupdate from touching updated_at
+        values[model.updated_at] = model.updated_at
+    return db.session.execute(
+        update(model).where(model.id == row_id).values(values).returning(counter)
+    ).scalar()
+
+
+def _actual_count(table, source, key):
+    return f'(SELECT COUNT(*) FROM {source} WHERE {source}.{key} = {table}.id)'
+
+
+def counter_drift():
+    """Number of rows whose stored counter differs from the real count, per counter."""
+    drift = {}
+    for name, (table, column, source, key) in COUNTERS.items():
+        drift[name] = db.session.execute(text(
+            f'SELECT COUNT(*) FROM {table} WHERE {column} IS NOT {_actual_count(table, source, key)}'
+        )).scalar()
+    return drift
+
+
+def reconcile_forum_counters(log=print):
+    """Recount every counter from its source table and fix the rows that drifted."""
+    repaired = {}
+    for name, (table, column, source, key) in COUNTERS.items():
+        actual = _actual_count(table, source, key)
+        result = db.session.execute(text(
+            f'UPDATE {table} SET {column} = {actual} WHERE {column} IS NOT {actual}'
+        ))
+        db.session.commit()
+        repaired[name] = result.rowcount
+        if result.rowcount:
+            log(f"   {table}.{column}: {result.rowcount} rows repaired")
+    return repaired
@@ -0,0 +1,212 @@
+"""
+Full-text search over the forum (SQLite FTS5).
+
+forum_search is an FTS5 table with one document per topic (title + body)
+and one per reply (body), kept in sync with forum_topics / forum_replies by
+triggers, so every write path (routes, seed scripts, manual SQL) updates the
+index in the same transaction. Document rowids are derived from the source
+row: topic = 2 * id, reply = 2 * id + 1.
+
+Searches rank documents with bm25 (title hits weigh more than body hits),
+collapse them to the best document per topic and build highlighted snippets
+only for the page being returned. ``rebuild_index`` (also used by the
+migration and by rebuild_forum_search.py) reindexes existing data.
+
+Until migrate_add_forum_search.py has run, ``search_available`` is False and
+the forum feed falls back to LIKE filtering.
+"""
+
+import html
+import re
+
+from sqlalchemy import text
+
+from models import db, ForumTopic
+
+SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS forum_search USING fts5(
+        title, body, topic_id UNINDEXED, reply_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS forum_search_topic_ai AFTER INSERT ON forum_topics BEGIN
+        INSERT INTO forum_search (rowid, title, body, topic_id, reply_id)
+        VALUES (new.id * 2, new.title, new.content, new.id, NULL);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS forum_search_topic_au AFTER UPDATE OF title, content ON forum_topics BEGIN
+        UPDATE forum_search SET title = new.title, body = new.content WHERE rowid = new.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS forum_search_topic_ad AFTER DELETE ON forum_topics BEGIN
+        DELETE FROM forum_search WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS forum_search_reply_ai AFTER INSERT ON forum_replies BEGIN
+        INSERT INTO forum_search (rowid, title, body, topic_id, reply_id)
+        VALUES (new.id * 2 + 1, '', new.content, new.topic_id, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS forum_search_reply_au AFTER UPDATE OF content, topic_id ON forum_replies BEGIN
+        UPDATE forum_search SET body = new.content, topic_id = new.topic_id WHERE rowid = new.id * 2 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS forum_search_reply_ad AFTER DELETE ON forum_replies BEGIN
+        DELETE FROM forum_search WHERE rowid = old.id * 2 + 1;
+    END
+    """
+]
+
+# bm25 column weights: title, body
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+MAX_TERMS = 8
+
+# Snippet markers; the text is HTML-escaped afterwards and these become <mark>
+_OPEN, _CLOSE = '\x02', '\x03'
+
+_available = False
+
+
+def install_schema():
+    """Create the FTS table and its triggers (idempotent). The caller commits."""
+    global _available
+    for statement in SCHEMA:
+        db.session.execute(text(statement))
+    _available = True
+
+
+def search_available():
+    global _available
+    if not _available:
+        _available = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'forum_search'"
+        )).first() is not None
+    return _available
+
+
+def build_match(query):
+    """
+    User input -> FTS5 query: every word must match, the last one as a prefix
+    (search-as-you-type). Returns None if the input has no searchable words.
+    Words are quoted, so FTS5 operators in the input are matched literally.
+    """
+    words = re.findall(r'\w+', query.lower())[:MAX_TERMS]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def matching_topic_ids(match):
+    """Selectable of the ids of topics whose title, body or replies match."""
+    return text(
+        'SELECT topic_id FROM forum_search WHERE forum_search MATCH :match'
+    ).bindparams(match=match).columns(topic_id=db.Integer)
+
+
+def rebuild_index():
+    """Reindex every topic and reply from scratch. Returns (topics, replies) indexed."""
+    install_schema()
+    db.session.execute(text('DELETE FROM forum_search'))
+    topics = db.session.execute(text(
+        'INSERT INTO forum_search (rowid, title, body, topic_id, reply_id) '
+        'SELECT id * 2, title, content, id, NULL FROM forum_topics'
+    )).rowcount
+    replies = db.session.execute(text(
+        'INSERT INTO forum_search (rowid, title, body, topic_id, reply_id) '
+        "SELECT id * 2 + 1, '', content, topic_id, id FROM forum_replies"
+    )).rowcount
+    db.session.execute(text("INSERT INTO forum_search (forum_search) VALUES ('optimize')"))
+    db.session.commit()
+    return topics, replies
+
+
+def _highlight(snippet):
+    return html.escape(snippet).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+
+def search(query, page=1, per_page=20, category=None, current_user_id=None):
+    """
+    Ranked topic matches for query. Returns (results, total) where total is the
+    number of matching topics and each result is a ForumTopic.to_dict_many()
+    dict plus 'match': the best matching document (reply_id is None for the
+    topic itself), highlighted title / snippet HTML, bm25 score and the number
+    of matching documents in the topic.
+    """
+    match = build_match(query)
+    if match is None:
+        return [], 0
+
+    category_join = 'JOIN forum_topics ON forum_topics.id = forum_search.topic_id AND forum_topics.category = :category' \
+        if category else ''
+    params = {'match': match, 'category': category, 'limit': per_page, 'offset': (page - 1) * per_page,
+              'title_weight': TITLE_WEIGHT, 'body_weight': BODY_WEIGHT}
+
+    total = db.session.execute(text(
+        f'SELECT COUNT(DISTINCT forum_search.topic_id) FROM forum_search {category_join} '
+        'WHERE forum_search MATCH :match'
+    ), params).scalar()
+    if not total:
+        return [], 0
+
+    # Best document per topic, ranked; snippets are only built for this page
+    hits = db.session.execute(text(f'''
+        WITH hits AS (
+            SELECT forum_search.rowid AS doc, forum_search.topic_id AS topic_id,
+                   forum_search.reply_id AS reply_id,
+                   bm25(forum_search, :title_weight, :body_weight) AS score
+            FROM forum_search {category_join}
+            WHERE forum_search MATCH :match
+        ), ranked AS (
+            SELECT doc, topic_id, reply_id, score,
+                   ROW_NUMBER() OVER (PARTITION BY topic_id ORDER BY score, doc) AS n,
+                   COUNT(*) OVER (PARTITION BY topic_id) AS matches
+            FROM hits
+        )
+        SELECT doc, topic_id, reply_id, score, matches FROM ranked
+        WHERE n = 1
+        ORDER BY score, topic_id
+        LIMIT :limit OFFSET :offset
+    '''), params).all()
+    if not hits:
+        return [], total
+
+    docs = [hit.doc for hit in hits]
+    snippets = {
+        row[0]: (row[1], row[2])
+        for row in db.session.execute(text(
+            f"SELECT rowid, snippet(forum_search, 0, '{_OPEN}', '{_CLOSE}', '…', 12), "
+            f"snippet(forum_search, 1, '{_OPEN}', '{_CLOSE}', '…', 24) "
+            f"FROM forum_search WHERE forum_search MATCH :match AND rowid IN ({', '.join(map(str, docs))})"
+        ), {'match': match}).all()
+    }
+
+    topics = {topic.id: topic for topic in ForumTopic.query.filter(ForumTopic.id.in_([hit.topic_id for hit in hits])).all()}
+    ordered = [topics[hit.topic_id] for hit in hits if hit.topic_id in topics]
+    serialized = {data['id']: data for data in ForumTopic.to_dict_many(ordered, current_user_id=current_user_id)}
+
+    results = []
+    for hit in hits:
+        data = serialized.get(hit.topic_id)
+        if data is None:
+            continue
+        title_snippet, body_snippet = snippets.get(hit.doc, ('', ''))
+        data['match'] = {
+            'reply_id': hit.reply_id,
+            'title_html': _highlight(title_snippet) if hit.reply_id is None else html.escape(data['title']),
+            'snippet_html': _highlight(body_snippet),
+            'score': round(-hit.score, 4),
+            'matches': hit.matches
+        }
+        results.append(data)
+    return results, total
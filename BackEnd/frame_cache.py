@@ -0,0 +1,114 @@
+"""
+Near-duplicate frame cache for disease detection.
+
+Live capture sends a frame every second from a mostly static aquarium camera,
+so consecutive frames are often visually identical. Each frame is reduced to a
+64-bit difference hash (dHash); a new frame whose hash is within
+``max_distance`` bits of a recent frame from the same user/device reuses that
+frame's detections instead of running the model again.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+from PIL import Image
+
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+
+def dhash(img):
+    """64-bit difference hash of a PIL image (compares horizontally adjacent pixels)."""
+    small = img.convert('L').resize((HASH_WIDTH, HASH_HEIGHT), Image.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_HEIGHT):
+        offset = row * HASH_WIDTH
+        for col in range(HASH_WIDTH - 1):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hash_image_bytes(img_bytes_io):
+    """
+    Hash an encoded image. JPEGs are decoded in draft mode at a fraction of
+    their resolution, which is plenty for a 9x8 hash.
+    Returns (hash, original_size).
+    """
+    img = Image.open(img_bytes_io)
+    size = img.size
+    img.draft('L', (HASH_WIDTH * 8, HASH_HEIGHT * 8))
+    return dhash(img), size
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class FrameResultCache:
+    def __init__(self, max_keys=1024, entries_per_key=4, max_distance=4, ttl_seconds=5):
+        self.max_keys = max_keys
+        self.entries_per_key = entries_per_key
+        self.max_distance = max_distance
+        self.ttl = ttl_seconds
+
+        # key -> deque of (hash, image size, detections, stored_at); ordered for LRU eviction
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key, frame_hash, size):
+        """Return cached detections for a near-duplicate frame, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries:
+                # Drop expired entries (oldest are on the left)
+                while entries and now - entries[0][3] > self.ttl:
+                    entries.popleft()
+
+                best = None
+                for cached_hash, cached_size, detections, _ in entries:
+                    if cached_size != size:
+                        continue
+                    distance = hamming_distance(frame_hash, cached_hash)
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, detections)
+
+                if best is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return [dict(det) for det in best[1]]
+
+            self.misses += 1
+            return None
+
+    def store(self, key, frame_hash, size, detections):
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries is None:
+                entries = deque(maxlen=self.entries_per_key)
+                self._entries[key] = entries
+            entries.append((frame_hash, size, [dict(det) for det in detections], time.monotonic()))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0,
+            'evictions': self.evictions,
+            'keys': len(self._entries),
+            'max_keys': self.max_keys,
+            'max_distance': self.max_distance,
+            'ttl_seconds': self.ttl
+        }
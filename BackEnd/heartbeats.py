@@ -0,0 +1,173 @@
+"""
+Device heartbeats (last_online, battery, robot status, firmware).
+
+Devices ping POST /api/telemetry/heartbeat every few seconds. Pings are
+coalesced in two places so that thousands of devices cost one small UPDATE
+batch per flush instead of one commit per ping:
+
+  - On arrival: a ping that repeats the device's last queued battery / robot
+    status / firmware within HEARTBEAT_MIN_INTERVAL seconds is acknowledged
+    but not queued (last_online only drives the 5-minute online window).
+  - On flush: the write-behind buffer (ingest_buffer.py) hands over all
+    queued pings; the newest one per device wins and they are written with a
+    single executemany UPDATE of the devices table, then mirrored into the
+    dashboard state store.
+
+Device codes are resolved through a small in-process cache, so a ping costs
+no query at all in the common case. Both per-process maps are bounded: they
+only hold existing devices (unknown codes are never cached), entries are
+dropped once they expire and at most MAX_TRACKED_DEVICES are kept.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+from ingest_buffer import WriteBehindBuffer, register_shutdown
+from models import db, Device
+from telemetry_state import ROBOT_STATUSES, update_robot_state
+
+HEARTBEAT_FIELDS = ('battery', 'robot_status', 'firmware_version')
+
+_UPDATE_DEVICES = text(
+    'UPDATE devices SET'
+    ' last_online = MAX(COALESCE(last_online, :at), :at),'
+    ' battery_level = COALESCE(:battery, battery_level),'
+    ' robot_status = COALESCE(:robot_status, robot_status),'
+    ' firmware_version = COALESCE(:firmware_version, firmware_version)'
+    ' WHERE id = :device_id'
+)
+
+
+def coalesce_heartbeats(heartbeats):
+    """Newest heartbeat per device; fields missing from it keep older values."""
+    latest = {}
+    for heartbeat in sorted(heartbeats, key=lambda h: h['at']):
+        merged = latest.setdefault(heartbeat['device_id'], {field: None for field in HEARTBEAT_FIELDS})
+        merged['device_id'] = heartbeat['device_id']
+        merged['at'] = heartbeat['at']
+        for field in HEARTBEAT_FIELDS:
+            if heartbeat.get(field) is not None:
+                merged[field] = heartbeat[field]
+    return list(latest.values())
+
+
+def write_heartbeats(heartbeats):
+    """Persist buffered heartbeats with one UPDATE batch and one commit."""
+    rows = coalesce_heartbeats(heartbeats)
+    if not rows:
+        return 0
+    try:
+        db.session.execute(_UPDATE_DEVICES, rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for row in rows:
+        update_robot_state(row['device_id'], status=row['robot_status'], battery=row['battery'], at=row['at'])
+    return len(rows)
+
+
+# Write-behind buffer; None = write synchronously
+heartbeat_buffer = None
+min_interval = 30.0
+
+MAX_TRACKED_DEVICES = 100000
+
+# device_id -> (monotonic time, fields) of the last queued heartbeat, oldest first
+_last_queued = OrderedDict()
+_last_queued_lock = threading.Lock()
+
+# device_code -> (device_id, expires at), oldest first
+_device_codes = OrderedDict()
+_device_codes_lock = threading.Lock()
+DEVICE_CODE_TTL = 300
+
+
+def _prune(entries, expired):
+    """Drop expired entries from the old end, then the oldest ones beyond MAX_TRACKED_DEVICES."""
+    while entries:
+        oldest = next(iter(entries.values()))
+        if not expired(oldest) and len(entries) <= MAX_TRACKED_DEVICES:
+            break
+        entries.popitem(last=False)
+
+
+def init_heartbeat_buffer(app):
+    global heartbeat_buffer, min_interval
+    min_interval = float(app.config.get('HEARTBEAT_MIN_INTERVAL', 30))
+    if not app.config.get('TELEMETRY_WRITE_BEHIND', True):
+        heartbeat_buffer = None
+        return None
+    heartbeat_buffer = register_shutdown(WriteBehindBuffer(
+        'heartbeats',
+        write_heartbeats,
+        capacity=app.config.get('HEARTBEAT_BUFFER_CAPACITY', 20000),
+        flush_size=app.config.get('HEARTBEAT_FLUSH_SIZE', 5000),
+        flush_interval=app.config.get('HEARTBEAT_FLUSH_INTERVAL', 5.0),
+        offer_timeout=app.config.get('TELEMETRY_OFFER_TIMEOUT', 0.5),
+        app=app
+    ))
+    return heartbeat_buffer
+
+
+def resolve_device_ids(codes):
+    """Map device codes to ids, querying only codes missing from the cache."""
+    now = time.monotonic()
+    resolved = {}
+    missing = set()
+    for code in codes:
+        cached = _device_codes.get(code)
+        if cached is not None and cached[1] > now:
+            resolved[code] = cached[0]
+        else:
+            missing.add(code)
+    if missing:
+        rows = db.session.query(Device.device_code, Device.id).filter(Device.device_code.in_(missing)).all()
+        with _device_codes_lock:
+            for code, device_id in rows:
+                _device_codes[code] = (device_id, now + DEVICE_CODE_TTL)
+                _device_codes.move_to_end(code)
+                resolved[code] = device_id
+            _prune(_device_codes, lambda entry: entry[1] <= now)
+    return resolved
+
+
+def record_heartbeat(device_id, at, battery=None, robot_status=None, firmware_version=None):
+    """
+    Accept one heartbeat (at: naive UTC datetime). Returns False when it was
+    coalesced with a recent one, True when it was queued (or written, without
+    write-behind). May raise BufferFull under back-pressure.
+    """
+    if robot_status is not None and robot_status not in ROBOT_STATUSES:
+        raise ValueError(f"robot_status must be one of {', '.join(ROBOT_STATUSES)}")
+    fields = (battery, robot_status, firmware_version)
+
+    now = time.monotonic()
+    with _last_queued_lock:
+        previous = _last_queued.get(device_id)
+        if previous is not None and now - previous[0] < min_interval:
+            if all(new is None or new == old for new, old in zip(fields, previous[1])):
+                return False
+            fields = tuple(new if new is not None else old for new, old in zip(fields, previous[1]))
+        _last_queued[device_id] = (now, fields)
+        _last_queued.move_to_end(device_id)
+        # Older entries can no longer coalesce anything
+        _prune(_last_queued, lambda entry: now - entry[0] >= min_interval)
+
+    heartbeat = {'device_id': device_id, 'at': at, 'battery': battery,
+                 'robot_status': robot_status, 'firmware_version': firmware_version}
+    try:
+        if heartbeat_buffer is not None:
+            heartbeat_buffer.offer(heartbeat)
+        else:
+            write_heartbeats([heartbeat])
+    except Exception:
+        # Not stored, so the device's next ping must not be coalesced away
+        with _last_queued_lock:
+            _last_queued.pop(device_id, None)
+        raise
+    return True
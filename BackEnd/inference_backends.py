@@ -0,0 +1,225 @@
+"""
+Inference backends for the disease detection model.
+
+Every backend takes a list of letterboxed BGR uint8 frames
+(input_size x input_size x 3) and returns one detections list per frame,
+with boxes in frame coordinates:
+
+    [{'bbox': [x1, y1, x2, y2], 'confidence': 0.91, 'class': 'white_spot'}, ...]
+
+  - TorchBackend: the original ultralytics ``YOLO(best.pt)`` path.
+  - OnnxBackend:  ``best.pt`` exported to ONNX (optionally INT8 dynamic
+    quantized) and run with ONNX Runtime, with its own NumPy NMS. Much lighter
+    per worker on CPU-only nodes.
+
+Pick one with ML_BACKEND; check_onnx_parity.py compares the two.
+"""
+
+import ast
+import os
+
+import numpy as np
+
+
+def serialize_result(result):
+    """Convert one ultralytics Result into the detections list returned by the API."""
+    detections = []
+    for box in result.boxes:
+        # Get box coordinates
+        x1, y1, x2, y2 = box.xyxy[0].tolist()
+
+        # Get confidence
+        conf = float(box.conf[0])
+
+        # Get class name
+        cls = int(box.cls[0])
+        class_name = result.names[cls]
+
+        detections.append({
+            'bbox': [x1, y1, x2, y2],
+            'confidence': conf,
+            'class': class_name
+        })
+    return detections
+
+
+class TorchBackend:
+    name = 'torch'
+
+    def __init__(self, model_path, input_size=640, conf_threshold=0.25, iou_threshold=0.7, **kwargs):
+        self.model_path = model_path
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.model = None
+
+    def load(self):
+        from ultralytics import YOLO
+        self.model = YOLO(self.model_path)
+        return self
+
+    def predict(self, frames):
+        results = self.model(frames, imgsz=self.input_size,
+                             conf=self.conf_threshold, iou=self.iou_threshold)
+        return [serialize_result(result) for result in results]
+
+
+def onnx_path_for(model_path, quantize=False):
+    base, _ = os.path.splitext(model_path)
+    return f"{base}.int8.onnx" if quantize else f"{base}.onnx"
+
+
+def export_onnx(model_path, input_size=640, quantize=False, force=False):
+    """
+    Export best.pt to ONNX (dynamic batch axis) next to the .pt file, plus an
+    INT8 dynamically quantized copy when quantize=True. Existing exports are
+    reused unless they are older than the .pt file or force=True.
+    Returns the path of the model to serve.
+    """
+    fp32_path = onnx_path_for(model_path)
+    target_path = onnx_path_for(model_path, quantize)
+
+    def is_stale(path):
+        return (force or not os.path.exists(path)
+                or os.path.getmtime(path) < os.path.getmtime(model_path))
+
+    if is_stale(fp32_path):
+        from ultralytics import YOLO
+        print(f"Exporting {model_path} to ONNX (imgsz={input_size})...")
+        exported = YOLO(model_path).export(format='onnx', imgsz=input_size, dynamic=True)
+        if exported and os.path.abspath(exported) != os.path.abspath(fp32_path):
+            os.replace(exported, fp32_path)
+        print(f"ONNX model written to {fp32_path}")
+
+    if quantize and (is_stale(target_path) or os.path.getmtime(target_path) < os.path.getmtime(fp32_path)):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print("Quantizing ONNX model to INT8 (dynamic)...")
+        quantize_dynamic(fp32_path, target_path, weight_type=QuantType.QUInt8)
+        print(f"INT8 model written to {target_path}")
+
+    return target_path
+
+
+def _nms(boxes, scores, iou_threshold):
+    """Greedy NMS over xyxy boxes; returns kept indices sorted by score."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        rest = order[1:]
+        inter_w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        inter_h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class OnnxBackend:
+    name = 'onnx'
+    max_detections = 300
+    # Same trick as ultralytics: offset boxes per class so one NMS pass is class-aware
+    max_wh = 7680
+
+    def __init__(self, model_path, input_size=640, conf_threshold=0.25, iou_threshold=0.7,
+                 quantize=False, intra_op_threads=0, inter_op_threads=0, **kwargs):
+        self.model_path = model_path
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.quantize = quantize
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.session = None
+        self.names = {}
+
+    def load(self):
+        import onnxruntime as ort
+
+        if self.model_path.endswith('.onnx'):
+            onnx_path = self.model_path
+        else:
+            onnx_path = export_onnx(self.model_path, self.input_size, self.quantize)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads:
+            options.inter_op_num_threads = self.inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.names = self._load_names()
+        print(f"ONNX Runtime session ready: {onnx_path}")
+        return self
+
+    def _load_names(self):
+        # ultralytics stores the class names in the ONNX metadata as a dict literal
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if 'names' in metadata:
+            try:
+                return {int(k): v for k, v in ast.literal_eval(metadata['names']).items()}
+            except (ValueError, SyntaxError):
+                pass
+        if not self.model_path.endswith('.onnx'):
+            from ultralytics import YOLO
+            return dict(YOLO(self.model_path).names)
+        return {}
+
+    def predict(self, frames):
+        # BGR HWC uint8 -> RGB CHW float32 in [0, 1]
+        batch = np.stack(frames)[..., ::-1].transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+        # (N, 4 + num_classes, num_anchors), boxes as center-x, center-y, w, h
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return [self._postprocess(pred.T) for pred in output]
+
+    def _postprocess(self, pred):
+        class_scores = pred[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+        mask = scores > self.conf_threshold
+        if not mask.any():
+            return []
+        xywh, scores, class_ids = pred[mask, :4], scores[mask], class_ids[mask]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+
+        keep = _nms(boxes + class_ids[:, None] * self.max_wh, scores, self.iou_threshold)
+        keep = keep[:self.max_detections]
+
+        return [
+            {
+                'bbox': [float(v) for v in boxes[i]],
+                'confidence': float(scores[i]),
+                'class': self.names.get(int(class_ids[i]), str(int(class_ids[i])))
+            }
+            for i in keep
+        ]
+
+
+BACKENDS = {
+    'torch': TorchBackend,
+    'onnx': OnnxBackend
+}
+
+
+def create_backend(name, model_path, **settings):
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown ML backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return backend_cls(model_path, **settings)
@@ -0,0 +1,139 @@
+"""
+Dynamic micro-batching for disease detection inference.
+
+Request threads call ``InferenceBatcher.submit(frame)`` and block until their
+result is ready. A single background thread collects frames from concurrent
+requests for at most ``max_wait_ms`` (or until ``max_batch_size`` frames are
+waiting), runs one batched forward pass and hands every result back to the
+request that submitted it.
+"""
+
+import queue
+import threading
+import time
+
+
+class InferenceTimeout(Exception):
+    """Raised when a frame is not processed within the configured timeout."""
+
+
+class _PendingFrame:
+    __slots__ = ('frame', 'event', 'result', 'error')
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceBatcher:
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10, timeout=30):
+        """
+        predict_fn: callable taking a list of frames and returning a list of
+                    results in the same order (one per frame).
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout = timeout
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Simple counters for monitoring
+        self.batches_run = 0
+        self.frames_processed = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='inference-batcher', daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, frame):
+        """Queue a frame and block until its result is available."""
+        self._ensure_started()
+
+        pending = _PendingFrame(frame)
+        self._queue.put(pending)
+
+        if not pending.event.wait(self.timeout):
+            raise InferenceTimeout(f'Inference did not finish within {self.timeout}s')
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def submit_many(self, frames):
+        """
+        Queue several frames at once, so they can share forward passes, and
+        block until all results are available. Results keep the input order.
+        """
+        self._ensure_started()
+
+        pending_frames = [_PendingFrame(frame) for frame in frames]
+        for pending in pending_frames:
+            self._queue.put(pending)
+
+        deadline = time.monotonic() + self.timeout
+        results = []
+        for pending in pending_frames:
+            if not pending.event.wait(max(0.0, deadline - time.monotonic())):
+                raise InferenceTimeout(f'Inference did not finish within {self.timeout}s')
+            if pending.error is not None:
+                raise pending.error
+            results.append(pending.result)
+        return results
+
+    def _collect_batch(self):
+        # Block until at least one frame is waiting
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Window closed, but still take whatever is already queued
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                results = self.predict_fn([p.frame for p in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f'Model returned {len(results)} results for {len(batch)} frames'
+                    )
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                print(f"❌ Batched inference failed: {e}")
+                for pending in batch:
+                    pending.error = e
+            finally:
+                self.batches_run += 1
+                self.frames_processed += len(batch)
+                for pending in batch:
+                    pending.event.set()
+
+    def stats(self):
+        return {
+            'batches_run': self.batches_run,
+            'frames_processed': self.frames_processed,
+            'avg_batch_size': round(self.frames_processed / self.batches_run, 2) if self.batches_run else 0,
+            'queue_depth': self._queue.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0
+        }
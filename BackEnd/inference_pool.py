@@ -0,0 +1,276 @@
+"""
+Out-of-process YOLO inference pool.
+
+A fixed number of worker processes each load one copy of the model. Decoded
+frames are handed over through shared-memory slots instead of being pickled:
+the request thread copies its frame into a free slot, enqueues a tiny task
+descriptor (slot index, token, shape) and waits on that slot's result queue.
+Workers drain the task queue in small batches so concurrent frames still share
+a forward pass.
+
+Create the pool before the web server forks (e.g. gunicorn ``--preload``) so
+every request worker talks to the same set of inference processes. Web
+workers are forked with plain os.fork(), which copies no threads, so nothing
+they use may depend on a thread started in the parent: free slots are tracked
+with a semaphore and a shared bitmap (not a Queue, whose feeder thread would
+stay behind in the parent), and the parent never puts to the task queue
+before the fork.
+"""
+
+import atexit
+import multiprocessing as mp
+import os
+import queue
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from inference_batcher import InferenceTimeout
+
+
+def _get_context():
+    # Flask workers never load the model in pool mode, so fork is safe and
+    # avoids re-importing the app in every child. Windows only has spawn.
+    if 'fork' in mp.get_all_start_methods():
+        return mp.get_context('fork')
+    return mp.get_context('spawn')
+
+
+def _worker_main(shm_name, slot_bytes, task_queue, result_queues, model_path,
+                 backend_name, backend_settings, max_batch_size, ready_count):
+    """Entry point of one inference process."""
+    from inference_backends import create_backend
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    backend = create_backend(backend_name, model_path, **backend_settings).load()
+    input_size = backend.input_size
+
+    # Warm up with a full dummy batch before accepting work
+    backend.predict([np.zeros((input_size, input_size, 3), dtype=np.uint8) for _ in range(max_batch_size)])
+    with ready_count.get_lock():
+        ready_count.value += 1
+    print(f"Inference worker {os.getpid()} ready")
+
+    running = True
+    while running:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        tasks = [task]
+        while len(tasks) < max_batch_size:
+            try:
+                task = task_queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                running = False
+                break
+            tasks.append(task)
+
+        try:
+            # Copy out of shared memory so the slot can be reused as soon as the
+            # requester gets its answer
+            frames = [
+                np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes).copy()
+                for slot, _, shape in tasks
+            ]
+            results = backend.predict(frames)
+            for (slot, token, _), detections in zip(tasks, results):
+                result_queues[slot].put((token, detections, None))
+        except Exception as e:
+            print(f"❌ Inference worker {os.getpid()} failed: {e}")
+            for slot, token, _ in tasks:
+                result_queues[slot].put((token, None, str(e)))
+
+    shm.close()
+
+
+class InferenceWorkerPool:
+    def __init__(self, model_path, backend_name='torch', backend_settings=None, num_workers=None,
+                 max_batch_size=8, num_slots=None, timeout=30):
+        self.model_path = model_path
+        self.backend_name = backend_name
+        self.backend_settings = dict(backend_settings or {})
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.input_size = int(self.backend_settings.get('input_size', 640))
+        self.num_slots = num_slots or self.num_workers * self.max_batch_size * 2
+        # Slots one infer_many call may hold at a time, so concurrent bulk
+        # requests cannot starve each other (or single-frame requests) of slots
+        self.request_slots = max(1, self.num_slots // 2)
+        self.timeout = timeout
+
+        # Frames arrive already letterboxed to the model input size
+        self.slot_bytes = self.input_size * self.input_size * 3
+        self._owner_pid = None
+        self._shm = None
+        self._processes = []
+
+    def start(self):
+        ctx = _get_context()
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * self.num_slots)
+        self._owner_pid = os.getpid()
+
+        self._tasks = ctx.Queue()
+        self._results = [ctx.Queue() for _ in range(self.num_slots)]
+        # Free slot allocator: semaphore = number of free slots, bitmap = which
+        self._slot_count = ctx.Semaphore(self.num_slots)
+        self._slot_lock = ctx.Lock()
+        self._slot_used = ctx.RawArray('b', self.num_slots)
+        self._ready_count = ctx.Value('i', 0)
+
+        for _ in range(self.num_workers):
+            process = ctx.Process(
+                target=_worker_main,
+                args=(self._shm.name, self.slot_bytes, self._tasks, self._results,
+                      self.model_path, self.backend_name, self.backend_settings,
+                      self.max_batch_size, self._ready_count),
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+
+        atexit.register(self.shutdown)
+        print(f"Inference pool started: {self.num_workers} workers, {self.num_slots} frame slots "
+              f"({self.slot_bytes * self.num_slots / (1024 * 1024):.0f} MB shared memory)")
+        return self
+
+    def fits(self, frame):
+        return frame.dtype == np.uint8 and frame.shape == (self.input_size, self.input_size, 3)
+
+    def infer(self, frame):
+        """
+        Run detection on one letterboxed BGR uint8 frame (input_size x input_size x 3)
+        and return its detections list in frame coordinates.
+        """
+        return self._collect(*self._dispatch(frame))
+
+    def infer_many(self, frames):
+        """
+        Run detection on several frames. Frames are queued request_slots at a
+        time before waiting, so idle workers pick them up together as batches
+        while any number of frames fits in the fixed set of slots.
+        """
+        results = []
+        for start in range(0, len(frames), self.request_slots):
+            results.extend(self._infer_window(frames[start:start + self.request_slots]))
+        return results
+
+    def _infer_window(self, frames):
+        dispatched = []
+        error = None
+        try:
+            for frame in frames:
+                dispatched.append(self._dispatch(frame))
+        except Exception as e:
+            error = e
+
+        # Always collect what was dispatched so every slot is released
+        results = []
+        for slot, token in dispatched:
+            try:
+                results.append(self._collect(slot, token))
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def _acquire_slot(self):
+        if not self._slot_count.acquire(timeout=self.timeout):
+            raise InferenceTimeout('No free inference slot available')
+        with self._slot_lock:
+            for slot in range(self.num_slots):
+                if not self._slot_used[slot]:
+                    self._slot_used[slot] = 1
+                    return slot
+        # Unreachable while every acquire is paired with one release
+        self._slot_count.release()
+        raise RuntimeError('Inference slot bitmap out of sync')
+
+    def _release_slot(self, slot):
+        with self._slot_lock:
+            self._slot_used[slot] = 0
+        self._slot_count.release()
+
+    def free_slots(self):
+        with self._slot_lock:
+            return self.num_slots - sum(self._slot_used)
+
+    def _dispatch(self, frame):
+        """Copy a frame into a free shared-memory slot and queue it. Returns (slot, token)."""
+        if not self.fits(frame):
+            raise ValueError(f'Frame must be uint8 {self.input_size}x{self.input_size}x3')
+
+        slot = self._acquire_slot()
+        try:
+            view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf,
+                              offset=slot * self.slot_bytes)
+            view[...] = frame
+            del view
+
+            token = uuid.uuid4().hex
+            self._tasks.put((slot, token, frame.shape))
+        except Exception:
+            self._release_slot(slot)
+            raise
+        return slot, token
+
+    def _collect(self, slot, token):
+        """Wait for the result of a dispatched frame and release its slot."""
+        try:
+            while True:
+                try:
+                    result_token, detections, error = self._results[slot].get(timeout=self.timeout)
+                except queue.Empty:
+                    raise InferenceTimeout(f'Inference did not finish within {self.timeout}s')
+                # Results for an earlier request that timed out on this slot are stale
+                if result_token == token:
+                    break
+
+            if error:
+                raise RuntimeError(error)
+            return detections
+        finally:
+            self._release_slot(slot)
+
+    def alive_workers(self):
+        # Process.is_alive() only works in the parent, and web workers forked
+        # after the pool started are not the parent, so probe the pids instead
+        alive = 0
+        for process in self._processes:
+            try:
+                os.kill(process.pid, 0)
+                alive += 1
+            except OSError:
+                pass
+        return alive
+
+    def stats(self):
+        return {
+            'backend': self.backend_name,
+            'workers': self.num_workers,
+            'alive_workers': self.alive_workers(),
+            'ready_workers': self._ready_count.value,
+            'slots': self.num_slots,
+            'free_slots': self.free_slots(),
+            'input_size': self.input_size
+        }
+
+    def shutdown(self):
+        # Only the process that created the pool may stop it
+        if self._owner_pid != os.getpid() or self._shm is None:
+            return
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
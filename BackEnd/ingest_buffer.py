@@ -0,0 +1,214 @@
+"""
+Write-behind buffering for device traffic.
+
+SQLite has a single writer lock shared with orders, forum posts and
+everything else, so device traffic must not take it once per request.
+Requests validate their payload, put it into a bounded in-process buffer and
+are acknowledged immediately. A background thread flushes the buffer in one
+transaction when it holds ``flush_size`` items or ``flush_interval`` seconds
+after the oldest item arrived, whichever comes first.
+
+  - Memory is bounded by ``capacity`` items (readings / heartbeats). When the
+    buffer is full, ``offer`` waits up to ``offer_timeout`` seconds and then
+    raises BufferFull, which the endpoints turn into 503 + Retry-After, so
+    devices back off instead of the process growing without bound.
+  - A failed flush puts its items back at the front of the buffer and is
+    retried, up to ``max_retries`` times; after that they are dropped and
+    counted.
+  - ``close`` (registered with atexit) stops the thread and flushes whatever
+    is left, so a normal shutdown loses nothing.
+
+Each gunicorn worker has its own buffers.
+"""
+
+import atexit
+import collections
+import threading
+import time
+
+
+class BufferFull(Exception):
+    """Raised when the buffer stays full for longer than the offer timeout."""
+
+
+class WriteBehindBuffer:
+    def __init__(self, name, flush_fn, capacity=50000, flush_size=2000, flush_interval=1.0,
+                 offer_timeout=0.5, max_retries=3, weight=None, app=None):
+        """
+        flush_fn: callable taking the list of buffered items and writing them
+                  in one transaction; runs on the flush thread (inside an app
+                  context when app is given).
+        weight:   callable giving the size of an item in buffer units (e.g. len
+                  for a TelemetryBatch, which counts its readings); default 1.
+        """
+        self.name = name
+        self.flush_fn = flush_fn
+        self.capacity = max(1, int(capacity))
+        self.flush_size = max(1, min(int(flush_size), self.capacity))
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.offer_timeout = max(0.0, float(offer_timeout))
+        self.max_retries = max(0, int(max_retries))
+        self._weigh = weight or (lambda item: 1)
+        self.app = app
+
+        self._items = collections.deque()
+        self._size = 0
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._flush_lock = threading.Lock()
+
+        # Simple counters for monitoring
+        self.flushes = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.last_flush_seconds = 0.0
+
+    def _weight(self, item):
+        return max(1, int(self._weigh(item)))
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f'write-behind-{self.name}', daemon=True
+                )
+                self._thread.start()
+
+    def offer(self, item):
+        """Queue an item for the next flush. Raises BufferFull under back-pressure."""
+        weight = self._weight(item)
+        if weight > self.capacity:
+            raise BufferFull(f'{self.name}: item of {weight} exceeds buffer capacity {self.capacity}')
+        self._ensure_started()
+
+        deadline = time.monotonic() + self.offer_timeout
+        with self._cond:
+            while self._size + weight > self.capacity and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += weight
+                    raise BufferFull(f'{self.name}: write buffer is full')
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+            if self._closed:
+                raise BufferFull(f'{self.name}: write buffer is closed')
+
+            self._items.append(item)
+            self._size += weight
+            if self._oldest is None:
+                # Starts the flush_interval clock of the flush thread
+                self._oldest = time.monotonic()
+                self._cond.notify_all()
+            elif self._size >= self.flush_size:
+                self._cond.notify_all()
+        return weight
+
+    def _take(self):
+        """Remove and return everything buffered. Caller holds the condition."""
+        items = list(self._items)
+        self._items.clear()
+        self._size = 0
+        self._oldest = None
+        self._cond.notify_all()
+        return items
+
+    def _write(self, items):
+        started = time.monotonic()
+        if self.app is not None:
+            with self.app.app_context():
+                self.flush_fn(items)
+        else:
+            self.flush_fn(items)
+        self.last_flush_seconds = time.monotonic() - started
+        self.flushes += 1
+        self.flushed += sum(self._weight(item) for item in items)
+
+    def flush(self):
+        """Write everything buffered now (used on shutdown and by the flush thread)."""
+        with self._flush_lock:
+            with self._cond:
+                items = self._take()
+            if items:
+                self._write(items)
+            return len(items)
+
+    def _run(self):
+        attempts = 0
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._size >= self.flush_size:
+                        break
+                    if self._oldest is not None:
+                        remaining = self._oldest + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+
+            with self._flush_lock:
+                with self._cond:
+                    items = self._take()
+                if not items:
+                    continue
+                try:
+                    self._write(items)
+                    attempts = 0
+                    continue
+                except Exception as e:
+                    self.failed_flushes += 1
+                    attempts += 1
+                    if attempts > self.max_retries:
+                        self.dropped += sum(self._weight(item) for item in items)
+                        print(f"❌ {self.name}: dropping {len(items)} buffered items after {attempts} failed flushes: {e}")
+                        attempts = 0
+                        continue
+                    print(f"❌ {self.name}: flush failed ({e}), retrying")
+                    # Back to the front of the queue, ahead of newer items
+                    with self._cond:
+                        self._items.extendleft(reversed(items))
+                        self._size += sum(self._weight(item) for item in items)
+                        self._oldest = time.monotonic()
+            time.sleep(min(self.flush_interval, 1.0))
+
+    def close(self):
+        """Stop the flush thread and write what is left."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"❌ {self.name}: final flush failed: {e}")
+
+    def stats(self):
+        with self._cond:
+            buffered = self._size
+        return {
+            'buffered': buffered,
+            'capacity': self.capacity,
+            'flushes': self.flushes,
+            'flushed': self.flushed,
+            'failed_flushes': self.failed_flushes,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'last_flush_seconds': round(self.last_flush_seconds, 4)
+        }
+
+
+def register_shutdown(buffer):
+    atexit.register(buffer.close)
+    return buffer
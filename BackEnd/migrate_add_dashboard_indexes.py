@@ -0,0 +1,32 @@
+"""
+Migration: Add device dashboard indexes
+The aggregated device dashboard reads the newest notifications and the latest
+disease detection of one device; both are (device_id, time) lookups.
+"""
+
+from app import create_app
+from models import db, Notification, DiseaseDetection
+
+def migrate():
+    app = create_app('development')
+
+    print("=" * 70)
+    print("MIGRATION: Add device dashboard indexes")
+    print("=" * 70)
+
+    with app.app_context():
+        try:
+            for model in (Notification, DiseaseDetection):
+                for index in model.__table__.indexes:
+                    index.create(db.engine, checkfirst=True)
+                    print(f"✅ Index '{index.name}' is in place")
+
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            print(f"❌ Error during migration: {e}")
+            raise
+        finally:
+            print("=" * 70)
+
+if __name__ == '__main__':
+    migrate()
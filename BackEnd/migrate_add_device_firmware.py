@@ -0,0 +1,40 @@
+"""
+Migration: Add firmware_version field to devices table
+Devices report their firmware version with every heartbeat
+(POST /api/telemetry/heartbeat); it is stored on the device row.
+"""
+
+from sqlalchemy import text
+
+from app import create_app
+from models import db
+
+def migrate():
+    app = create_app('development')
+
+    print("=" * 70)
+    print("MIGRATION: Add firmware_version field to devices table")
+    print("=" * 70)
+
+    with app.app_context():
+        try:
+            columns = [row[1] for row in db.session.execute(text("PRAGMA table_info(devices)")).fetchall()]
+
+            if 'firmware_version' in columns:
+                print("✅ Column 'firmware_version' already exists. Skipping migration.")
+            else:
+                print("📝 Adding 'firmware_version' column to devices table...")
+                db.session.execute(text("ALTER TABLE devices ADD COLUMN firmware_version VARCHAR(50)"))
+                db.session.commit()
+                print("✅ Successfully added 'firmware_version' column")
+
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error during migration: {e}")
+            raise
+        finally:
+            print("=" * 70)
+
+if __name__ == '__main__':
+    migrate()
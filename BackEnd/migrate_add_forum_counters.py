@@ -0,0 +1,50 @@
+"""
+Migration: Add denormalized like/reply counters to forum tables
+forum_topics.like_count / reply_count and forum_replies.like_count are
+maintained by the like and reply routes; this adds the columns and fills
+them from the existing likes and replies.
+"""
+
+from sqlalchemy import text
+
+from app import create_app
+from models import db
+from forum_counters import reconcile_forum_counters
+
+COLUMNS = [
+    ('forum_topics', 'like_count'),
+    ('forum_topics', 'reply_count'),
+    ('forum_replies', 'like_count')
+]
+
+def migrate():
+    app = create_app('development')
+
+    print("=" * 70)
+    print("MIGRATION: Add like/reply counters to forum tables")
+    print("=" * 70)
+
+    with app.app_context():
+        try:
+            for table, column in COLUMNS:
+                columns = [row[1] for row in db.session.execute(text(f"PRAGMA table_info({table})")).fetchall()]
+                if column in columns:
+                    print(f"✅ Column '{table}.{column}' already exists. Skipping.")
+                    continue
+                print(f"📝 Adding '{column}' column to {table} table...")
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+                db.session.commit()
+                print(f"✅ Successfully added '{table}.{column}' column")
+
+            print("📝 Filling counters from existing likes and replies...")
+            reconcile_forum_counters()
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error during migration: {e}")
+            raise
+        finally:
+            print("=" * 70)
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,43 @@
+"""
+Migration: Add forum feed indexes
+The forum feed and "my topics" are paginated by keyset on
+(is_pinned, created_at, id) and (author_id, created_at, id). Row-value
+comparisons skip NULLs, so NULL is_pinned / created_at values are filled in
+first.
+"""
+
+from sqlalchemy import text
+
+from app import create_app
+from models import db, ForumTopic
+
+def migrate():
+    app = create_app('development')
+
+    print("=" * 70)
+    print("MIGRATION: Add forum feed indexes")
+    print("=" * 70)
+
+    with app.app_context():
+        try:
+            print("📝 Filling NULL is_pinned / created_at values...")
+            db.session.execute(text("UPDATE forum_topics SET is_pinned = 0 WHERE is_pinned IS NULL"))
+            db.session.execute(text(
+                "UPDATE forum_topics SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL"
+            ))
+            db.session.commit()
+
+            for index in ForumTopic.__table__.indexes:
+                index.create(db.engine, checkfirst=True)
+                print(f"✅ Index '{index.name}' is in place")
+
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error during migration: {e}")
+            raise
+        finally:
+            print("=" * 70)
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,38 @@
+"""
+Migration: Add forum full-text search
+Creates the forum_search FTS5 table and the triggers that keep it in sync
+with forum_topics / forum_replies, then indexes the existing posts.
+"""
+
+from app import create_app
+from models import db
+from forum_search import install_schema, rebuild_index
+
+def migrate():
+    app = create_app('development')
+
+    print("=" * 70)
+    print("MIGRATION: Add forum full-text search (FTS5)")
+    print("=" * 70)
+
+    with app.app_context():
+        try:
+            print("📝 Creating forum_search table and triggers...")
+            install_schema()
+            db.session.commit()
+            print("✅ forum_search is in place")
+
+            print("📝 Indexing existing topics and replies...")
+            topics, replies = rebuild_index()
+            print(f"✅ Indexed {topics} topics and {replies} replies")
+
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error during migration: {e}")
+            raise
+        finally:
+            print("=" * 70)
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,31 @@
+"""
+Migration: Add (device_id, timestamp) index to water_monitoring
+Telemetry ingestion makes this table grow quickly, and every read of it filters
+by device and time range.
+"""
+
+from app import create_app
+from models import db, WaterMonitoring
+
+def migrate():
+    app = create_app('development')
+
+    print("=" * 70)
+    print("MIGRATION: Add (device_id, timestamp) index to water_monitoring")
+    print("=" * 70)
+
+    with app.app_context():
+        try:
+            for index in WaterMonitoring.__table__.indexes:
+                index.create(db.engine, checkfirst=True)
+                print(f"✅ Index '{index.name}' is in place")
+
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            print(f"❌ Error during migration: {e}")
+            raise
+        finally:
+            print("=" * 70)
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,34 @@
+"""
+Migration: Add water alert tables
+Creates water_alert_rules (per-device threshold overrides) and
+water_alert_states (hysteresis level / last reading / cooldown per device and
+metric) used by water_alerts.py. Built-in default rules need no rows.
+"""
+
+from app import create_app
+from models import db, WaterAlertRule, WaterAlertState
+
+def migrate():
+    app = create_app('development')
+
+    print("=" * 70)
+    print("MIGRATION: Add water alert tables")
+    print("=" * 70)
+
+    with app.app_context():
+        try:
+            WaterAlertRule.__table__.create(db.engine, checkfirst=True)
+            print("✅ Table 'water_alert_rules' is in place")
+            WaterAlertState.__table__.create(db.engine, checkfirst=True)
+            print("✅ Table 'water_alert_states' is in place")
+
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error during migration: {e}")
+            raise
+        finally:
+            print("=" * 70)
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,37 @@
+"""
+Migration: Add water_rollups table and backfill it
+Creates the 1-minute / 1-hour / 1-day rollup table used by
+/api/devices/<id>/water-history and fills it from the existing
+water_monitoring rows. Safe to re-run: rollups are rebuilt from scratch.
+"""
+
+from app import create_app
+from models import db, WaterRollup
+from telemetry_rollups import rebuild_rollups
+
+def migrate():
+    app = create_app('development')
+
+    print("=" * 70)
+    print("MIGRATION: Add water_rollups table")
+    print("=" * 70)
+
+    with app.app_context():
+        try:
+            WaterRollup.__table__.create(db.engine, checkfirst=True)
+            print("✅ Table 'water_rollups' is in place")
+
+            print("📝 Rebuilding rollups from water_monitoring...")
+            processed = rebuild_rollups()
+            print(f"✅ Folded {processed} readings into {WaterRollup.query.count()} rollup buckets")
+
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error during migration: {e}")
+            raise
+        finally:
+            print("=" * 70)
+
+if __name__ == '__main__':
+    migrate()
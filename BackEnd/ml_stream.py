@@ -0,0 +1,174 @@
+"""
+WebSocket streaming endpoint for live disease detection.
+
+    ws://<host>/api/ml/stream?token=<JWT>&device_id=<id>
+
+The JWT is checked once when the socket opens (browsers can't set an
+Authorization header on WebSocket requests, so it travels in the query string
+or as a first text message ``{"token": "..."}``).
+
+After that the client sends binary messages, each one an encoded JPEG frame.
+The server keeps only the newest frame that has not been processed yet: if
+inference falls behind, older pending frames are dropped instead of queueing
+up. Every finished frame is answered with a JSON text message:
+
+    {"type": "detections", "seq": 12, "detections": [...], "cached": false,
+     "dropped": 3, "latency_ms": 41.7}
+
+``seq`` counts frames received on this connection and ``dropped`` is the total
+number of frames skipped so far. Errors are reported as
+``{"type": "error", "message": "..."}``.
+
+Requires the optional flask-sock package; without it the HTTP endpoint
+/api/detect_disease keeps working and this route is simply not registered.
+"""
+
+import json
+import threading
+import time
+
+from flask import current_app, request
+from flask_jwt_extended import decode_token
+
+try:
+    from flask_sock import Sock, ConnectionClosed
+except ImportError:
+    Sock = None
+
+
+class LatestFrameSlot:
+    """Single-slot mailbox with keep-latest semantics."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            self.received += 1
+            if self._frame is not None:
+                # Previous frame was never picked up by the inference thread
+                self.dropped += 1
+            self._frame = frame
+            self._seq = self.received
+            self._cond.notify()
+
+    def take(self):
+        """Block until a frame is available; returns (seq, frame) or None once closed."""
+        with self._cond:
+            while self._frame is None and not self._closed:
+                self._cond.wait()
+            if self._frame is None:
+                return None
+            frame, self._frame = self._frame, None
+            return self._seq, frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+def _authenticate(ws):
+    """Return the user identity for this socket, or None."""
+    token = request.args.get('token')
+    if not token:
+        try:
+            first = ws.receive(timeout=10)
+            token = json.loads(first).get('token') if isinstance(first, str) else None
+        except (ValueError, AttributeError):
+            token = None
+    if not token:
+        return None
+    try:
+        claims = decode_token(token)
+    except Exception as e:
+        print(f"❌ Detection stream auth failed: {e}")
+        return None
+    return claims.get(current_app.config.get('JWT_IDENTITY_CLAIM', 'sub'))
+
+
+def _inference_loop(app, ws, slot, cache_key):
+    from routes_ml import run_detection
+
+    with app.app_context():
+        while True:
+            item = slot.take()
+            if item is None:
+                return
+            seq, frame = item
+            start = time.perf_counter()
+            try:
+                detections, cached = run_detection(frame, cache_key)
+                message = {
+                    'type': 'detections',
+                    'seq': seq,
+                    'detections': detections,
+                    'cached': cached,
+                    'dropped': slot.dropped,
+                    'latency_ms': round((time.perf_counter() - start) * 1000, 1)
+                }
+            except Exception as e:
+                print(f"❌ Error during streamed inference: {e}")
+                message = {'type': 'error', 'seq': seq, 'message': str(e)}
+
+            try:
+                ws.send(json.dumps(message))
+            except Exception:
+                # Socket closed while we were busy
+                return
+
+
+def register_ml_stream(app):
+    """Attach the /api/ml/stream WebSocket route. Returns False if flask-sock is missing."""
+    if Sock is None:
+        print("WARNING: flask-sock not installed, /api/ml/stream disabled")
+        return False
+
+    sock = Sock(app)
+
+    @sock.route('/api/ml/stream')
+    def detection_stream(ws):
+        from routes_ml import ensure_model_ready
+
+        user_id = _authenticate(ws)
+        if user_id is None:
+            ws.send(json.dumps({'type': 'error', 'message': 'Invalid or missing token'}))
+            ws.close(reason=1008)
+            return
+
+        if not ensure_model_ready():
+            ws.send(json.dumps({'type': 'error', 'message': 'Model not loaded'}))
+            ws.close(reason=1011)
+            return
+
+        ws.send(json.dumps({'type': 'ready'}))
+
+        slot = LatestFrameSlot()
+        cache_key = (user_id, request.args.get('device_id'))
+        worker = threading.Thread(
+            target=_inference_loop,
+            args=(current_app._get_current_object(), ws, slot, cache_key),
+            name='detection-stream',
+            daemon=True
+        )
+        worker.start()
+
+        # This thread only receives; the worker is the only one sending results
+        try:
+            while True:
+                data = ws.receive()
+                if isinstance(data, (bytes, bytearray)):
+                    slot.put(bytes(data))
+        except ConnectionClosed:
+            pass
+        finally:
+            slot.close()
+            worker.join(timeout=5)
+
+    print("ML stream route loaded (/api/ml/stream)")
+    return True
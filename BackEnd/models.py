@@ -60,6 +60,7 @@ class Device(db.Model):
     robot_status = db.Column(db.String(20), default='idle')  # idle, cleaning, charging, error
     battery_level = db.Column(db.Integer, default=100)  # 0-100
     last_online = db.Column(db.DateTime)
+    firmware_version = db.Column(db.String(50))  # reported by heartbeats
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -78,11 +79,16 @@ class Device(db.Model):
             'robot_status': self.robot_status,
             'battery_level': self.battery_level,
             'last_online': self.last_online.isoformat() if self.last_online else None,
+            'firmware_version': self.firmware_version,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 class WaterMonitoring(db.Model):
     __tablename__ = 'water_monitoring'
+    __table_args__ = (
+        # Every telemetry read is "this device, this time range"
+        db.Index('ix_water_monitoring_device_timestamp', 'device_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), nullable=False)
@@ -105,6 +111,125 @@ class WaterMonitoring(db.Model):
             'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
 
+class WaterRollup(db.Model):
+    """
+    Per-device aggregates of water_monitoring over fixed time buckets
+    (resolution = bucket length in seconds: 60, 3600 or 86400).
+    Maintained incrementally by telemetry ingestion, see telemetry_rollups.py.
+    Mean = <metric>_sum / <metric>_count; counts exclude readings where the
+    metric was not reported.
+    """
+    __tablename__ = 'water_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('device_id', 'resolution', 'bucket_start', name='uq_water_rollup_bucket'),
+    )
+
+    METRICS = ('temperature', 'ph_level', 'turbidity', 'oxygen_level', 'ammonia_level')
+
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), nullable=False)
+    resolution = db.Column(db.Integer, nullable=False)  # seconds
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    reading_count = db.Column(db.Integer, nullable=False, default=0)
+    last_timestamp = db.Column(db.DateTime)
+
+    temperature_min = db.Column(db.Float)
+    temperature_max = db.Column(db.Float)
+    temperature_sum = db.Column(db.Float, nullable=False, default=0)
+    temperature_count = db.Column(db.Integer, nullable=False, default=0)
+    temperature_last = db.Column(db.Float)
+
+    ph_level_min = db.Column(db.Float)
+    ph_level_max = db.Column(db.Float)
+    ph_level_sum = db.Column(db.Float, nullable=False, default=0)
+    ph_level_count = db.Column(db.Integer, nullable=False, default=0)
+    ph_level_last = db.Column(db.Float)
+
+    turbidity_min = db.Column(db.Float)
+    turbidity_max = db.Column(db.Float)
+    turbidity_sum = db.Column(db.Float, nullable=False, default=0)
+    turbidity_count = db.Column(db.Integer, nullable=False, default=0)
+    turbidity_last = db.Column(db.Float)
+
+    oxygen_level_min = db.Column(db.Float)
+    oxygen_level_max = db.Column(db.Float)
+    oxygen_level_sum = db.Column(db.Float, nullable=False, default=0)
+    oxygen_level_count = db.Column(db.Integer, nullable=False, default=0)
+    oxygen_level_last = db.Column(db.Float)
+
+    ammonia_level_min = db.Column(db.Float)
+    ammonia_level_max = db.Column(db.Float)
+    ammonia_level_sum = db.Column(db.Float, nullable=False, default=0)
+    ammonia_level_count = db.Column(db.Integer, nullable=False, default=0)
+    ammonia_level_last = db.Column(db.Float)
+
+    def to_dict(self):
+        data = {
+            'timestamp': self.bucket_start.isoformat() if self.bucket_start else None,
+            'resolution': self.resolution,
+            'count': self.reading_count
+        }
+        for metric in self.METRICS:
+            count = getattr(self, f'{metric}_count')
+            data[metric] = {
+                'min': getattr(self, f'{metric}_min'),
+                'max': getattr(self, f'{metric}_max'),
+                'mean': round(getattr(self, f'{metric}_sum') / count, 4) if count else None,
+                'last': getattr(self, f'{metric}_last')
+            }
+        return data
+
+class WaterAlertRule(db.Model):
+    """
+    Alert thresholds for one water metric. device_id NULL is the default rule
+    for every device; a row with a device_id overrides it for that device.
+    low/high may be NULL (no lower/upper bound). An alert clears only after
+    the value is back inside [low + hysteresis, high - hysteresis].
+    max_rate is the largest allowed change per minute between two readings.
+    """
+    __tablename__ = 'water_alert_rules'
+    __table_args__ = (
+        db.UniqueConstraint('device_id', 'metric', name='uq_water_alert_rule'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.Integer, db.ForeignKey('devices.id'))
+    metric = db.Column(db.String(30), nullable=False)
+    low = db.Column(db.Float)
+    high = db.Column(db.Float)
+    hysteresis = db.Column(db.Float, nullable=False, default=0)
+    max_rate = db.Column(db.Float)  # per minute
+    cooldown_minutes = db.Column(db.Integer, nullable=False, default=30)
+    is_active = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'device_id': self.device_id,
+            'metric': self.metric,
+            'low': self.low,
+            'high': self.high,
+            'hysteresis': self.hysteresis,
+            'max_rate': self.max_rate,
+            'cooldown_minutes': self.cooldown_minutes,
+            'is_active': self.is_active
+        }
+
+class WaterAlertState(db.Model):
+    """
+    Alert state per device and metric, carried between ingested batches:
+    level is -1 (below low), 0 (normal) or 1 (above high).
+    """
+    __tablename__ = 'water_alert_states'
+
+    device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), primary_key=True)
+    metric = db.Column(db.String(30), primary_key=True)
+    level = db.Column(db.Integer, nullable=False, default=0)
+    last_value = db.Column(db.Float)
+    last_timestamp = db.Column(db.DateTime)
+    last_alert_at = db.Column(db.DateTime)
+
 class CleaningHistory(db.Model):
     __tablename__ = 'cleaning_history'
     
@@ -133,6 +258,10 @@ class CleaningHistory(db.Model):
 
 class DiseaseDetection(db.Model):
     __tablename__ = 'disease_detections'
+    __table_args__ = (
+        # Device dashboard: latest detection of one device
+        db.Index('ix_disease_detections_device_detected', 'device_id', 'detected_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), nullable=False)
@@ -314,6 +443,20 @@ class FishSpecies(db.Model):
             'updatedAt': self.updated_at.isoformat() if self.updated_at else None
         }
 
+# Batched lookups for ForumTopic / ForumReply.to_dict_many
+def _load_authors(posts):
+    """Load the authors of topics / replies with one query; .author then reads the identity map."""
+    author_ids = {post.author_id for post in posts if post.author_id is not None}
+    if author_ids:
+        User.query.filter(User.id.in_(author_ids)).all()
+
+def _liked_by(column, user_column, ids, user_id):
+    """The subset of ids the user has liked."""
+    if not user_id:
+        return set()
+    rows = db.session.query(column).filter(column.in_(ids), user_column == user_id).all()
+    return {row[0] for row in rows}
+
 class ForumTopic(db.Model):
     __tablename__ = 'forum_topics'
     
@@ -325,45 +468,61 @@ class ForumTopic(db.Model):
     views = db.Column(db.Integer, default=0)
     is_pinned = db.Column(db.Boolean, default=False)
     is_locked = db.Column(db.Boolean, default=False)
+    # Denormalized counters, maintained by forum_counters.adjust_counter
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reply_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     replies = db.relationship('ForumReply', backref='topic', lazy=True, cascade='all, delete-orphan')
     
+    # Keyset pagination of the feed and of "my topics" (see pagination.py)
+    __table_args__ = (
+        db.Index('ix_forum_topics_feed', 'is_pinned', 'created_at', 'id'),
+        db.Index('ix_forum_topics_author_created', 'author_id', 'created_at', 'id'),
+    )
+    
     def to_dict(self, include_replies=False, current_user_id=None):
-        # Count likes
-        like_count = ForumTopicLike.query.filter_by(topic_id=self.id).count()
-        
-        # Check if current user liked this topic
-        user_liked = False
-        if current_user_id:
-            user_liked = ForumTopicLike.query.filter_by(
-                topic_id=self.id, 
-                user_id=current_user_id
-            ).first() is not None
-        
-        data = {
-            'id': self.id,
-            'title': self.title,
-            'content': self.content,
-            'category': self.category,
-            'author': self.author.to_dict() if self.author else None,
-            'author_id': self.author_id,
-            'views': self.views,
-            'is_pinned': self.is_pinned,
-            'is_locked': self.is_locked,
-            'reply_count': len(self.replies),
-            'like_count': like_count,
-            'user_liked': user_liked,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        data = ForumTopic.to_dict_many([self], current_user_id=current_user_id)[0]
         
         if include_replies:
-            data['replies'] = [reply.to_dict(current_user_id=current_user_id) for reply in self.replies]
+            data['replies'] = ForumReply.to_dict_many(self.replies, current_user_id=current_user_id)
         
         return data
+    
+    @staticmethod
+    def to_dict_many(topics, current_user_id=None):
+        """
+        to_dict() for a list of topics in a constant number of queries: authors
+        and the current user's likes are loaded for all topics at once, like and
+        reply counts are stored on the rows.
+        """
+        topics = list(topics)
+        if not topics:
+            return []
+        
+        topic_ids = [topic.id for topic in topics]
+        _load_authors(topics)
+        liked = _liked_by(ForumTopicLike.topic_id, ForumTopicLike.user_id, topic_ids, current_user_id)
+        
+        return [{
+            'id': topic.id,
+            'title': topic.title,
+            'content': topic.content,
+            'category': topic.category,
+            'author': topic.author.to_dict() if topic.author else None,
+            'author_id': topic.author_id,
+            'views': topic.views,
+            'is_pinned': topic.is_pinned,
+            'is_locked': topic.is_locked,
+            'reply_count': topic.reply_count or 0,
+            'like_count': topic.like_count or 0,
+            'user_liked': topic.id in liked,
+            'created_at': topic.created_at.isoformat() if topic.created_at else None,
+            'updated_at': topic.updated_at.isoformat() if topic.updated_at else None
+        } for topic in topics]
+
 
 class ForumReply(db.Model):
     __tablename__ = 'forum_replies'
@@ -372,32 +531,36 @@ class ForumReply(db.Model):
     topic_id = db.Column(db.Integer, db.ForeignKey('forum_topics.id'), nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
+    # Denormalized counter, maintained by forum_counters.adjust_counter
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self, current_user_id=None):
-        # Count likes
-        like_count = ForumReplyLike.query.filter_by(reply_id=self.id).count()
+        return ForumReply.to_dict_many([self], current_user_id=current_user_id)[0]
+    
+    @staticmethod
+    def to_dict_many(replies, current_user_id=None):
+        """to_dict() for a list of replies with batched author and like lookups."""
+        replies = list(replies)
+        if not replies:
+            return []
         
-        # Check if current user liked this reply
-        user_liked = False
-        if current_user_id:
-            user_liked = ForumReplyLike.query.filter_by(
-                reply_id=self.id, 
-                user_id=current_user_id
-            ).first() is not None
+        reply_ids = [reply.id for reply in replies]
+        _load_authors(replies)
+        liked = _liked_by(ForumReplyLike.reply_id, ForumReplyLike.user_id, reply_ids, current_user_id)
         
-        return {
-            'id': self.id,
-            'topic_id': self.topic_id,
-            'author': self.author.to_dict() if self.author else None,
-            'author_id': self.author_id,
-            'content': self.content,
-            'like_count': like_count,
-            'user_liked': user_liked,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return [{
+            'id': reply.id,
+            'topic_id': reply.topic_id,
+            'author': reply.author.to_dict() if reply.author else None,
+            'author_id': reply.author_id,
+            'content': reply.content,
+            'like_count': reply.like_count or 0,
+            'user_liked': reply.id in liked,
+            'created_at': reply.created_at.isoformat() if reply.created_at else None,
+            'updated_at': reply.updated_at.isoformat() if reply.updated_at else None
+        } for reply in replies]
 
 class Order(db.Model):
     __tablename__ = 'orders'
@@ -524,6 +687,10 @@ class ForumReport(db.Model):
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Device dashboard: newest notifications of one device
+        db.Index('ix_notifications_device_created', 'device_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,55 @@
+"""
+Notification helpers shared by the HTTP routes and background jobs.
+All of them only add to the session; the caller commits.
+"""
+
+from models import db, User, Notification
+
+
+def queue_notification(user_id, title, message, notif_type='info', device_id=None):
+    """Queue a notification without committing the session."""
+    if not user_id or not title or not message:
+        return None
+
+    notification = Notification(
+        user_id=user_id,
+        device_id=device_id,
+        type=notif_type or 'info',
+        title=title[:200],
+        message=message
+    )
+    db.session.add(notification)
+    return notification
+
+
+def queue_notifications(notifications):
+    """
+    Queue many notifications with a single executemany INSERT.
+    notifications: dicts with user_id, title, message and optional type / device_id.
+    """
+    rows = [
+        {
+            'user_id': n['user_id'],
+            'device_id': n.get('device_id'),
+            'type': n.get('type') or 'info',
+            'title': n['title'][:200],
+            'message': n['message']
+        }
+        for n in notifications
+        if n.get('user_id') and n.get('title') and n.get('message')
+    ]
+    if rows:
+        db.session.execute(db.insert(Notification).execution_options(render_nulls=True), rows)
+    return len(rows)
+
+
+def notify_admins(title, message, notif_type='info'):
+    """Broadcast a notification to every active admin account."""
+    admins = User.query.filter_by(role='admin').all()
+    created = 0
+    for admin in admins:
+        if admin.is_active is False:
+            continue
+        if queue_notification(admin.id, title, message, notif_type):
+            created += 1
+    return created
@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) pagination for feeds.
+
+A page is selected with a row-value comparison on the sort key,
+``(is_pinned, created_at, id) < (:is_pinned, :created_at, :id)``, instead of
+OFFSET, so every page costs one index seek plus ``limit`` rows no matter how
+deep the client pages or how large the table grows. The sort key must be
+unique (end it with the primary key) and backed by a composite index in the
+same column order.
+
+The cursor is the sort key of the last row of a page, JSON-encoded and
+base64url'd. Clients treat it as opaque; it stays valid when rows are
+inserted or deleted before it.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from models import db
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that were not produced by encode_cursor for these columns."""
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Clamp a requested page size (None = default) to 1..MAX_PAGE_SIZE."""
+    if value is None:
+        return default
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    key = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(key, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Cursor -> list of key values typed like the given columns."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(key, list) or len(key) != len(columns):
+        raise InvalidCursor('Invalid cursor')
+
+    values = []
+    for column, value in zip(columns, key):
+        python_type = column.type.python_type
+        try:
+            if python_type is datetime:
+                values.append(datetime.fromisoformat(value))
+            elif python_type is bool:
+                values.append(bool(value))
+            else:
+                values.append(python_type(value))
+        except (ValueError, TypeError):
+            raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def keyset_page(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of query, ordered by columns descending (pass the full sort key).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises InvalidCursor for a malformed cursor.
+    """
+    if cursor:
+        query = query.filter(db.tuple_(*columns) < db.tuple_(*decode_cursor(cursor, columns)))
+    rows = query.order_by(*[column.desc() for column in columns]).limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor([getattr(last, column.key) for column in columns])
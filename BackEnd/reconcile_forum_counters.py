@@ -0,0 +1,50 @@
+"""
+Reconciliation job for the denormalized forum counters.
+
+Recounts forum_topics.like_count / reply_count and forum_replies.like_count
+from the like and reply tables and repairs rows that drifted (e.g. after
+rows were deleted by a script or by hand). Cheap enough to run from cron,
+e.g. nightly:
+
+    python reconcile_forum_counters.py
+    python reconcile_forum_counters.py --check     # report drift only
+"""
+
+import argparse
+import json
+
+from app import create_app
+from forum_counters import counter_drift, reconcile_forum_counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='only report drifted rows, change nothing')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    app = create_app('development')
+    with app.app_context():
+        log = (lambda message: None) if args.json else print
+        if not args.json:
+            print("=" * 70)
+            print("FORUM COUNTER RECONCILIATION")
+            print("=" * 70)
+
+        drift = counter_drift()
+        repaired = {name: 0 for name in drift}
+        if not args.check and any(drift.values()):
+            log("📝 Repairing drifted counters...")
+            repaired = reconcile_forum_counters(log=log)
+
+        if args.json:
+            print(json.dumps({'drift': drift, 'repaired': repaired}, indent=2))
+            return
+
+        for name, count in drift.items():
+            print(f"✅ {name:<14} drifted: {count:<6} repaired: {repaired[name]}")
+        print("=" * 70)
+
+
+if __name__ == '__main__':
+    main()
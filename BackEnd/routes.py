@@ -3,16 +3,29 @@ from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from models import db, User, Device, WaterMonitoring, CleaningHistory, DiseaseDetection
 from models import FishSpecies, ForumTopic, ForumReply, Order, Notification, ChatHistory
-from models import ForumTopicLike, ForumReplyLike, ForumReport
+from models import ForumTopicLike, ForumReplyLike, ForumReport, WaterAlertRule
 from datetime import datetime, timedelta
 from functools import wraps  # ✅ TAMBAHKAN BARIS INI
 from sqlalchemy import or_
+from notifications import queue_notification, notify_admins
+from telemetry_state import get_device_state, get_state_version, update_robot_state, clear_device_state
+from telemetry_rollups import downsample_window
+from water_alerts import rules_for_device
+from downsample import METHODS as DOWNSAMPLE_METHODS
+from authz import request_user_id, request_user, request_role, is_admin, can_access
+from authz import request_devices, device_owner, device_access_error, invalidate_device
+from forum_counters import adjust_counter
+from pagination import InvalidCursor, keyset_page, page_size
+from forum_search import build_match, matching_topic_ids, search_available, search as search_forum
+from view_counter import record_view
 import random
 import string
 from werkzeug.utils import secure_filename
 import os
 import base64
 import json
+import hashlib
+import time
 import mimetypes
 
 def admin_required(fn):
@@ -23,16 +36,10 @@ def admin_required(fn):
     @wraps(fn)
     @jwt_required()  # ← TAMBAHKAN BARIS INI
     def wrapper(*args, **kwargs):
-        # Get current user ID from JWT
-        current_user_id = get_jwt_identity()
-        # Get user from database
-        user = User.query.get(current_user_id)
-        
-        # Check if user exists and is admin
-        if not user:
+        # Role from the users table (cached for a short TTL, see authz.py)
+        if request_role() is None:
             return jsonify({'success': False, 'message': 'User not found'}), 404
-        
-        if user.role != 'admin':
+        if not is_admin():
             return jsonify({'success': False, 'message': 'Admin access required'}), 403
         
         # User is admin, proceed to endpoint
@@ -335,32 +342,6 @@ def register_routes(app):
             if value is not None and hasattr(instance, field):
                 setattr(instance, field, value)
 
-    def queue_notification(user_id, title, message, notif_type='info', device_id=None):
-        """Queue a notification without committing the session."""
-        if not user_id or not title or not message:
-            return None
-
-        notification = Notification(
-            user_id=user_id,
-            device_id=device_id,
-            type=notif_type or 'info',
-            title=title[:200],
-            message=message
-        )
-        db.session.add(notification)
-        return notification
-
-    def notify_admins(title, message, notif_type='info'):
-        """Broadcast a notification to every active admin account."""
-        admins = User.query.filter_by(role='admin').all()
-        created = 0
-        for admin in admins:
-            if admin.is_active is False:
-                continue
-            if queue_notification(admin.id, title, message, notif_type):
-                created += 1
-        return created
-
 
     # Authentication Routes
     @app.route('/api/auth/register', methods=['POST'])
@@ -480,8 +461,7 @@ def register_routes(app):
     @app.route('/api/auth/me', methods=['GET'])
     @jwt_required()
     def get_current_user():
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = request_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -492,13 +472,10 @@ def register_routes(app):
     @app.route('/api/devices', methods=['GET'])
     @jwt_required()
     def get_devices():
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if user.role == 'admin':
+        if is_admin():
             devices = Device.query.all()
         else:
-            devices = Device.query.filter_by(user_id=user_id).all()
+            devices = request_devices()
         
         return jsonify({'devices': [d.to_dict() for d in devices]}), 200
     
@@ -507,9 +484,8 @@ def register_routes(app):
     def add_device():
         """Add a new device for the current user"""
         try:
-            user_id_str = get_jwt_identity()
-            user_id = int(user_id_str)  # Convert string to int
-            user = User.query.get(user_id)
+            user_id = request_user_id()
+            user = request_user()
             
             if not user:
                 return jsonify({'error': 'User not found'}), 404
@@ -543,6 +519,10 @@ def register_routes(app):
             db.session.add(new_device)
             db.session.commit()
             
+            # SQLite can hand out the id of a deleted device again
+            clear_device_state(new_device.id)
+            invalidate_device(new_device.id)
+            
             print(f"✅ Device added successfully!")
             print(f"   User: {user.name} ({user.email})")
             print(f"   Device Name: {data['name']}")
@@ -564,14 +544,12 @@ def register_routes(app):
     @app.route('/api/devices/<int:device_id>', methods=['GET'])
     @jwt_required()
     def get_device(device_id):
-        user_id_str = get_jwt_identity()
-        user_id = int(user_id_str)  # Convert string to int
+        user_id = request_user_id()
         device = Device.query.get(device_id)
         
         print(f"🔍 GET Device Request:")
         print(f"   Device ID: {device_id}")
-        print(f"   User ID from JWT (string): {user_id_str}")
-        print(f"   User ID (converted to int): {user_id}")
+        print(f"   User ID: {user_id}")
         
         if not device:
             print(f"   ❌ Device not found")
@@ -579,10 +557,7 @@ def register_routes(app):
         
         print(f"   Device owner user_id: {device.user_id}")
         
-        user = User.query.get(user_id)
-        print(f"   User role: {user.role if user else 'None'}")
-        
-        if device.user_id != user_id and user.role != 'admin':
+        if not can_access(device.user_id):
             print(f"   ❌ Access denied: device.user_id({device.user_id}) != user_id({user_id})")
             return jsonify({'error': 'Unauthorized access'}), 403
         
@@ -594,14 +569,13 @@ def register_routes(app):
     def get_member_devices():
         """Get user's devices with formatted data for frontend"""
         try:
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
+            user = request_user()
             
             if not user:
                 return jsonify({'error': 'User not found'}), 404
             
             # Get all devices for this user
-            devices = Device.query.filter_by(user_id=user_id).all()
+            devices = request_devices()
             
             # Format devices for frontend
             formatted_devices = []
@@ -636,70 +610,238 @@ def register_routes(app):
                 'error': 'Failed to fetch devices'
             }), 500
     
-    # Device Dashboard Data Endpoints - Dummy Data with Realistic Variations
-    @app.route('/api/devices/<int:device_id>/dashboard/water-latest', methods=['GET'])
+    # Device Dashboard Data - one builder per section, shared by the per-section
+    # endpoints and the aggregated /dashboard endpoint
+    ROBOT_STATUS_TEXT = {
+        'idle': 'Siap',
+        'cleaning': 'Sedang Membersihkan',
+        'charging': 'Mengisi Daya',
+        'error': 'Error'
+    }
+    SEVERITY_TEXT = {'low': 'Ringan', 'medium': 'Sedang', 'high': 'Tinggi', 'critical': 'Darurat'}
+    NOTIFICATION_STYLE = {
+        'alert': ('alert', '#CE3939'),
+        'warning': ('alert', '#CE3939'),
+        'success': ('check', '#4AD991'),
+        'info': ('clock', '#8280FF')
+    }
+
+
+    def dashboard_water_section(device_id, state):
+        metrics = state['metrics']
+
+        def metric_value(name, digits=1):
+            value = metrics[name]['value']
+            return round(value, digits) if value is not None else None
+
+        def metric_trend(name, digits=1):
+            trend = metrics[name]['trend']
+            return round(trend, digits) if trend is not None else 0
+
+        # Status against the device's alert rules (same limits that raise notifications)
+        rules = rules_for_device(device_id)
+
+        def get_status(value, metric):
+            if value is None:
+                return 'unknown'
+            low, high = rules[metric]['low'], rules[metric]['high']
+            if low is None:
+                return 'good' if high is None or value < high else 'warning'
+            return 'optimal' if low <= value and (high is None or value <= high) else 'warning'
+
+        ph_value = metric_value('ph_level')
+        temp_value = metric_value('temperature')
+        turbidity_value = metric_value('turbidity')
+        oxygen_value = metric_value('oxygen_level')
+        ammonia_value = metric_value('ammonia_level', 2)
+
+        return {
+            'ph': {
+                'value': ph_value,
+                'unit': '',
+                'status': get_status(ph_value, 'ph_level'),
+                'trend': metric_trend('ph_level')
+            },
+            'temperature': {
+                'value': temp_value,
+                'unit': '°C',
+                'status': get_status(temp_value, 'temperature'),
+                'trend': metric_trend('temperature')
+            },
+            'turbidity': {
+                'value': turbidity_value,
+                'unit': 'NTU',
+                'status': get_status(turbidity_value, 'turbidity'),
+                'trend': metric_trend('turbidity')
+            },
+            'oxygen': {
+                'value': oxygen_value,
+                'unit': 'mg/L',
+                'status': get_status(oxygen_value, 'oxygen_level')
+            },
+            'ammonia': {
+                'value': ammonia_value,
+                'unit': 'ppm',
+                'status': get_status(ammonia_value, 'ammonia_level')
+            },
+            'timestamp': state['reading_at'].isoformat() if state['reading_at'] else None
+        }
+
+    def dashboard_robot_section(state):
+        robot_status = state['robot_status'] or 'idle'
+        last_cleaning_time = state['last_cleaning_at']
+        return {
+            'status': robot_status,
+            'status_text': ROBOT_STATUS_TEXT.get(robot_status, 'Siap'),
+            'battery': state['battery'],
+            'last_cleaning': last_cleaning_time.isoformat() if last_cleaning_time else None,
+            'last_cleaning_text': format_last_active(last_cleaning_time) if last_cleaning_time else 'Belum pernah',
+            # No cleaning schedule is stored yet
+            'next_cleaning': None,
+            'next_cleaning_text': '-'
+        }
+
+    def dashboard_disease_section(device_id):
+        """(has_detection, data) for the latest unresolved detection of the device."""
+        detection = DiseaseDetection.query.filter(
+            DiseaseDetection.device_id == device_id,
+            DiseaseDetection.status != 'resolved'
+        ).order_by(DiseaseDetection.detected_at.desc()).first()
+
+        if detection is None:
+            return False, {'message': 'Tidak ada penyakit terdeteksi'}
+
+        detail = detection.to_dict()
+        severity = (detection.severity or 'medium').lower()
+        return True, {
+            'id': detection.id,
+            'fish_type': detail.get('fish_type'),
+            'disease_name': detection.disease_name,
+            'severity': severity,
+            'severity_text': SEVERITY_TEXT.get(severity, 'Sedang'),
+            'confidence': round((detection.confidence or 0) / 100, 4),
+            'detected_at': detection.detected_at.isoformat() if detection.detected_at else None,
+            'detected_at_text': format_last_active(detection.detected_at),
+            'image_url': detail.get('image_url')
+        }
+
+    def dashboard_notifications_section(device_id, limit=5):
+        notifications = Notification.query.filter_by(device_id=device_id)\
+            .order_by(Notification.created_at.desc()).limit(limit).all()
+
+        items = []
+        for notification in notifications:
+            icon, color = NOTIFICATION_STYLE.get(notification.type, NOTIFICATION_STYLE['info'])
+            created_at = notification.created_at.isoformat() if notification.created_at else None
+            items.append({
+                'id': notification.id,
+                'type': notification.type,
+                'icon': icon,
+                'title': notification.title,
+                'message': notification.message,
+                'is_read': notification.is_read,
+                'time': created_at,
+                'created_at': created_at,
+                'time_text': format_last_active(notification.created_at),
+                'color': color
+            })
+        return items
+
+    def dashboard_version(device_id):
+        """
+        (device row, version key) of a device dashboard from one query, or
+        None if the device does not exist. The row has user_id, name and
+        device_code. The key covers the device row, the
+        state store record, the unresolved detections, the notifications and
+        the alert rules, plus the current minute for the "5 menit lalu" texts.
+        Without a state store record there is no key (the version is None).
+        """
+        def scalar(*columns, where):
+            return db.select(*columns).where(*where).scalar_subquery()
+
+        unresolved = (DiseaseDetection.device_id == device_id, DiseaseDetection.status != 'resolved')
+        notifications = (Notification.device_id == device_id,)
+        rules = (or_(WaterAlertRule.device_id.is_(None), WaterAlertRule.device_id == device_id),)
+        row = db.session.execute(db.select(
+            Device.user_id, Device.name, Device.device_code,
+            scalar(db.func.count(), where=unresolved),
+            scalar(db.func.max(DiseaseDetection.id), where=unresolved),
+            scalar(db.func.count(), where=notifications),
+            scalar(db.func.max(Notification.id), where=notifications),
+            scalar(db.func.sum(db.cast(Notification.is_read, db.Integer)), where=notifications),
+            scalar(db.func.count(), where=rules),
+            scalar(db.func.max(WaterAlertRule.updated_at), where=rules)
+        ).where(Device.id == device_id)).first()
+        if row is None:
+            return None
+
+        state_version = get_state_version(device_id)
+        if state_version is None:
+            return row, None
+        key = '|'.join(str(value) for value in (state_version, int(time.time() // 60), *row[1:]))
+        return row, hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    @app.route('/api/devices/<int:device_id>/dashboard', methods=['GET'])
     @jwt_required()
-    def get_device_water_latest(device_id):
-        """Get latest water quality readings for device dashboard (dummy data)"""
+    def get_device_dashboard(device_id):
+        """
+        Everything the member device dashboard shows, in one response:
+        water, robot, disease and notifications sections. Supports
+        If-None-Match: an unchanged dashboard is answered with 304 from the
+        version key alone, without building any section.
+        """
         try:
-            user_id_str = get_jwt_identity()
-            user_id = int(user_id_str)  # Convert string to int
-            device = Device.query.get(device_id)
-            
-            if not device:
+            version = dashboard_version(device_id)
+            if version is None:
                 return jsonify({'error': 'Device not found'}), 404
-            
-            user = User.query.get(user_id)
-            if device.user_id != user_id and user.role != 'admin':
+            device, etag = version
+            if not can_access(device.user_id):
                 return jsonify({'error': 'Unauthorized access'}), 403
-            
-            # Generate realistic dummy data with slight variations
-            import random
-            
-            # Base values ± small random variation
-            ph_value = round(7.0 + random.uniform(-0.3, 0.3), 1)
-            temp_value = round(26.0 + random.uniform(-2, 2), 1)
-            turbidity_value = round(2.0 + random.uniform(-0.5, 0.5), 1)
-            oxygen_value = round(7.0 + random.uniform(-0.5, 0.5), 1)
-            ammonia_value = round(0.02 + random.uniform(-0.01, 0.01), 2)
-            
-            # Determine status based on values
-            def get_status(value, min_val, max_val):
-                return 'optimal' if min_val <= value <= max_val else 'warning'
-            
-            return jsonify({
+
+            if etag is not None and etag in request.if_none_match:
+                response = app.response_class(status=304)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            state = get_device_state(device_id)
+            has_detection, disease = dashboard_disease_section(device_id)
+            payload = {
                 'success': True,
                 'data': {
-                    'ph': {
-                        'value': ph_value,
-                        'unit': '',
-                        'status': get_status(ph_value, 6.5, 7.5),
-                        'trend': round(random.uniform(-0.3, 0.3), 1)
-                    },
-                    'temperature': {
-                        'value': temp_value,
-                        'unit': '°C',
-                        'status': get_status(temp_value, 24, 28),
-                        'trend': round(random.uniform(-0.5, 0.5), 1)
-                    },
-                    'turbidity': {
-                        'value': turbidity_value,
-                        'unit': 'NTU',
-                        'status': 'good' if turbidity_value < 5 else 'warning',
-                        'trend': round(random.uniform(-0.2, 0.2), 1)
-                    },
-                    'oxygen': {
-                        'value': oxygen_value,
-                        'unit': 'mg/L',
-                        'status': get_status(oxygen_value, 6.0, 8.0)
-                    },
-                    'ammonia': {
-                        'value': ammonia_value,
-                        'unit': 'ppm',
-                        'status': 'good' if ammonia_value < 0.05 else 'warning'
-                    },
-                    'timestamp': datetime.utcnow().isoformat()
+                    'device': {'id': device_id, 'name': device.name, 'device_code': device.device_code},
+                    'water': dashboard_water_section(device_id, state),
+                    'robot': dashboard_robot_section(state),
+                    'disease': {'has_detection': has_detection, 'data': disease},
+                    'notifications': dashboard_notifications_section(device_id)
                 }
+            }
+
+            body = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+            response = app.response_class(body, mimetype='application/json')
+            # Devices outside the state store get an ETag of the payload instead
+            response.set_etag(etag or hashlib.sha1(body.encode('utf-8')).hexdigest())
+            # Browsers must revalidate every time, which is what makes the ETag useful
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response.make_conditional(request)
+
+        except Exception as e:
+            print(f"❌ Error fetching device dashboard: {e}")
+            return jsonify({'success': False, 'error': 'Failed to fetch dashboard'}), 500
+
+    @app.route('/api/devices/<int:device_id>/dashboard/water-latest', methods=['GET'])
+    @jwt_required()
+    def get_device_water_latest(device_id):
+        """Get latest water quality readings for device dashboard"""
+        try:
+            error = device_access_error(device_id)
+            if error:
+                return error
+
+            state = get_device_state(device_id)
+            return jsonify({
+                'success': True,
+                'data': dashboard_water_section(device_id, state)
             }), 200
             
         except Exception as e:
@@ -709,53 +851,16 @@ def register_routes(app):
     @app.route('/api/devices/<int:device_id>/dashboard/robot-status', methods=['GET'])
     @jwt_required()
     def get_device_robot_status(device_id):
-        """Get robot status for device dashboard (dummy data)"""
+        """Get robot status for device dashboard"""
         try:
-            user_id_str = get_jwt_identity()
-            user_id = int(user_id_str)  # Convert string to int
-            device = Device.query.get(device_id)
-            
-            if not device:
-                return jsonify({'error': 'Device not found'}), 404
-            
-            user = User.query.get(user_id)
-            if device.user_id != user_id and user.role != 'admin':
-                return jsonify({'error': 'Unauthorized access'}), 403
-            
-            import random
-            
-            # Random robot status
-            statuses = ['idle', 'idle', 'idle', 'cleaning', 'charging']  # Mostly idle
-            robot_status = random.choice(statuses)
-            
-            # Battery level (higher when charging, lower when cleaning)
-            if robot_status == 'charging':
-                battery = random.randint(85, 100)
-            elif robot_status == 'cleaning':
-                battery = random.randint(60, 85)
-            else:  # idle
-                battery = random.randint(75, 95)
-            
-            # Generate times
-            from datetime import datetime, timedelta
-            last_cleaning_time = datetime.utcnow() - timedelta(hours=random.randint(1, 6))
-            next_cleaning_time = datetime.utcnow() + timedelta(hours=random.randint(1, 12))
-            
+            error = device_access_error(device_id)
+            if error:
+                return error
+
+            state = get_device_state(device_id)
             return jsonify({
                 'success': True,
-                'data': {
-                    'status': robot_status,
-                    'status_text': {
-                        'idle': 'Siap',
-                        'cleaning': 'Sedang Membersihkan',
-                        'charging': 'Mengisi Daya'
-                    }.get(robot_status, 'Siap'),
-                    'battery': battery,
-                    'last_cleaning': last_cleaning_time.isoformat(),
-                    'last_cleaning_text': format_last_active(last_cleaning_time),
-                    'next_cleaning': next_cleaning_time.isoformat(),
-                    'next_cleaning_text': f"Hari ini, {next_cleaning_time.strftime('%H:%M')}"
-                }
+                'data': dashboard_robot_section(state)
             }), 200
             
         except Exception as e:
@@ -765,62 +870,18 @@ def register_routes(app):
     @app.route('/api/devices/<int:device_id>/dashboard/disease-latest', methods=['GET'])
     @jwt_required()
     def get_device_disease_latest(device_id):
-        """Get latest disease detection for device dashboard (dummy data)"""
+        """Get latest disease detection for device dashboard"""
         try:
-            user_id_str = get_jwt_identity()
-            user_id = int(user_id_str)  # Convert string to int
-            device = Device.query.get(device_id)
-            
-            if not device:
-                return jsonify({'error': 'Device not found'}), 404
-            
-            user = User.query.get(user_id)
-            if device.user_id != user_id and user.role != 'admin':
-                return jsonify({'error': 'Unauthorized access'}), 403
-            
-            import random
-            
-            # 70% chance no disease, 30% chance disease detected
-            has_disease = random.random() < 0.3
-            
-            if has_disease:
-                diseases = [
-                    {'name': 'White Spot', 'severity': 'medium', 'fish': 'Ikan Koi'},
-                    {'name': 'Fin Rot', 'severity': 'low', 'fish': 'Ikan Mas'},
-                    {'name': 'Ich', 'severity': 'medium', 'fish': 'Ikan Koi'},
-                    {'name': 'Fungal Infection', 'severity': 'high', 'fish': 'Ikan Nila'}
-                ]
-                disease = random.choice(diseases)
-                
-                detection_time = datetime.utcnow() - timedelta(hours=random.randint(1, 5))
-                
-                return jsonify({
-                    'success': True,
-                    'has_detection': True,
-                    'data': {
-                        'fish_type': disease['fish'],
-                        'disease_name': disease['name'],
-                        'severity': disease['severity'],
-                        'severity_text': {
-                            'low': 'Ringan',
-                            'medium': 'Sedang',
-                            'high': 'Tinggi'
-                        }.get(disease['severity'], 'Sedang'),
-                        'confidence': round(random.uniform(0.75, 0.95), 2),
-                        'detected_at': detection_time.isoformat(),
-                        'detected_at_text': format_last_active(detection_time),
-                        'image_url': 'https://images.unsplash.com/photo-1718632496269-6c0fd71dc29c?crop=entropy&cs=tinysrgb&fit=max&fm=jpg&q=80'
-                    }
-                }), 200
-            else:
-                return jsonify({
-                    'success': True,
-                    'has_detection': False,
-                    'data': {
-                        'message': 'Tidak ada penyakit terdeteksi',
-                        'last_check': datetime.utcnow().isoformat()
-                    }
-                }), 200
+            error = device_access_error(device_id)
+            if error:
+                return error
+
+            has_detection, data = dashboard_disease_section(device_id)
+            return jsonify({
+                'success': True,
+                'has_detection': has_detection,
+                'data': data
+            }), 200
                 
         except Exception as e:
             print(f"❌ Error fetching disease detection: {e}")
@@ -829,57 +890,15 @@ def register_routes(app):
     @app.route('/api/devices/<int:device_id>/dashboard/notifications-recent', methods=['GET'])
     @jwt_required()
     def get_device_notifications_recent(device_id):
-        """Get recent notifications for device dashboard (dummy data)"""
+        """Get recent notifications for device dashboard"""
         try:
-            user_id_str = get_jwt_identity()
-            user_id = int(user_id_str)  # Convert string to int
-            device = Device.query.get(device_id)
-            
-            if not device:
-                return jsonify({'error': 'Device not found'}), 404
-            
-            user = User.query.get(user_id)
-            if device.user_id != user_id and user.role != 'admin':
-                return jsonify({'error': 'Unauthorized access'}), 403
-            
-            import random
-            
-            # Generate 3-5 recent notifications
-            notification_templates = [
-                {'type': 'info', 'icon': 'clock', 'message': 'Pembersihan otomatis dijadwalkan pada {time}', 'color': '#8280FF'},
-                {'type': 'success', 'icon': 'check', 'message': 'Kualitas air dalam kondisi optimal', 'color': '#4AD991'},
-                {'type': 'warning', 'icon': 'alert', 'message': 'Terdeteksi gejala awal penyakit pada Ikan Koi', 'color': '#CE3939'},
-                {'type': 'info', 'icon': 'droplet', 'message': 'pH air stabil di level optimal', 'color': '#4880FF'},
-                {'type': 'success', 'icon': 'check', 'message': 'Pembersihan selesai dilakukan', 'color': '#4AD991'},
-                {'type': 'info', 'icon': 'battery', 'message': 'Baterai robot terisi penuh', 'color': '#8280FF'},
-            ]
-            
-            num_notifications = random.randint(3, 5)
-            selected = random.sample(notification_templates, num_notifications)
-            
-            notifications = []
-            for i, template in enumerate(selected):
-                hours_ago = i + 1
-                notif_time = datetime.utcnow() - timedelta(hours=hours_ago)
-                
-                message = template['message']
-                if '{time}' in message:
-                    scheduled = datetime.utcnow() + timedelta(hours=random.randint(2, 8))
-                    message = message.format(time=scheduled.strftime('%H:%M'))
-                
-                notifications.append({
-                    'id': i + 1,
-                    'type': template['type'],
-                    'icon': template['icon'],
-                    'message': message,
-                    'time': notif_time.isoformat(),
-                    'time_text': f"{hours_ago} jam yang lalu",
-                    'color': template['color']
-                })
-            
+            error = device_access_error(device_id)
+            if error:
+                return error
+
             return jsonify({
                 'success': True,
-                'data': notifications
+                'data': dashboard_notifications_section(device_id)
             }), 200
             
         except Exception as e:
@@ -890,21 +909,31 @@ def register_routes(app):
     @app.route('/api/devices/<int:device_id>/water-data', methods=['GET'])
     @jwt_required()
     def get_water_data(device_id):
-        user_id = get_jwt_identity()
-        device = Device.query.get(device_id)
-        
-        if not device:
-            return jsonify({'error': 'Device not found'}), 404
-        
-        user = User.query.get(user_id)
-        if device.user_id != user_id and user.role != 'admin':
-            return jsonify({'error': 'Unauthorized access'}), 403
+        error = device_access_error(device_id)
+        if error:
+            return error
         
         # Get query parameters for filtering
         hours = request.args.get('hours', default=24, type=int)
         limit = request.args.get('limit', default=100, type=int)
         
         time_threshold = datetime.utcnow() - timedelta(hours=hours)
+        
+        # ?points=N: whole window, downsampled per metric for charting
+        points = request.args.get('points', type=int)
+        if points is not None:
+            method = request.args.get('method', 'lttb')
+            if method not in DOWNSAMPLE_METHODS:
+                return jsonify({'error': f"method must be one of {', '.join(DOWNSAMPLE_METHODS)}"}), 400
+            points = max(3, min(points, 5000))
+            total, series = downsample_window(device_id, time_threshold, datetime.utcnow(), points, method)
+            return jsonify({
+                'series': series,
+                'count': total,
+                'points': points,
+                'method': method
+            }), 200
+        
         water_data = WaterMonitoring.query.filter(
             WaterMonitoring.device_id == device_id,
             WaterMonitoring.timestamp >= time_threshold
@@ -918,15 +947,9 @@ def register_routes(app):
     @app.route('/api/devices/<int:device_id>/cleaning-history', methods=['GET'])
     @jwt_required()
     def get_cleaning_history(device_id):
-        user_id = get_jwt_identity()
-        device = Device.query.get(device_id)
-        
-        if not device:
-            return jsonify({'error': 'Device not found'}), 404
-        
-        user = User.query.get(user_id)
-        if device.user_id != user_id and user.role != 'admin':
-            return jsonify({'error': 'Unauthorized access'}), 403
+        error = device_access_error(device_id)
+        if error:
+            return error
         
         limit = request.args.get('limit', default=50, type=int)
         history = CleaningHistory.query.filter_by(device_id=device_id)\
@@ -940,14 +963,12 @@ def register_routes(app):
     @app.route('/api/devices/<int:device_id>/start-cleaning', methods=['POST'])
     @jwt_required()
     def start_cleaning(device_id):
-        user_id = get_jwt_identity()
         device = Device.query.get(device_id)
         
         if not device:
             return jsonify({'error': 'Device not found'}), 404
         
-        user = User.query.get(user_id)
-        if device.user_id != user_id and user.role != 'admin':
+        if not can_access(device.user_id):
             return jsonify({'error': 'Unauthorized access'}), 403
         
         data = request.get_json() or {}
@@ -973,6 +994,7 @@ def register_routes(app):
         
         db.session.add(cleaning)
         db.session.commit()
+        update_robot_state(device_id, status='cleaning')
         
         return jsonify({
             'message': 'Cleaning started successfully',
@@ -982,14 +1004,12 @@ def register_routes(app):
     @app.route('/api/devices/<int:device_id>/stop-cleaning', methods=['POST'])
     @jwt_required()
     def stop_cleaning(device_id):
-        user_id = get_jwt_identity()
         device = Device.query.get(device_id)
         
         if not device:
             return jsonify({'error': 'Device not found'}), 404
         
-        user = User.query.get(user_id)
-        if device.user_id != user_id and user.role != 'admin':
+        if not can_access(device.user_id):
             return jsonify({'error': 'Unauthorized access'}), 403
         
         active_cleaning = CleaningHistory.query.filter_by(
@@ -1012,6 +1032,7 @@ def register_routes(app):
         device.last_online = datetime.utcnow()
         
         db.session.commit()
+        update_robot_state(device_id, status='idle', last_cleaning_at=active_cleaning.completed_at)
         
         return jsonify({
             'message': 'Cleaning stopped successfully',
@@ -1022,15 +1043,9 @@ def register_routes(app):
     @app.route('/api/devices/<int:device_id>/disease-detections', methods=['GET'])
     @jwt_required()
     def get_disease_detections(device_id):
-        user_id = get_jwt_identity()
-        device = Device.query.get(device_id)
-        
-        if not device:
-            return jsonify({'error': 'Device not found'}), 404
-        
-        user = User.query.get(user_id)
-        if device.user_id != user_id and user.role != 'admin':
-            return jsonify({'error': 'Unauthorized access'}), 403
+        error = device_access_error(device_id)
+        if error:
+            return error
         
         limit = request.args.get('limit', default=50, type=int)
         detections = DiseaseDetection.query.filter_by(device_id=device_id)\
@@ -1044,16 +1059,12 @@ def register_routes(app):
     @app.route('/api/disease-detections/<int:detection_id>', methods=['PUT'])
     @jwt_required()
     def update_disease_detection(detection_id):
-        user_id = get_jwt_identity()
         detection = DiseaseDetection.query.get(detection_id)
         
         if not detection:
             return jsonify({'error': 'Detection not found'}), 404
         
-        device = Device.query.get(detection.device_id)
-        user = User.query.get(user_id)
-        
-        if device.user_id != user_id and user.role != 'admin':
+        if not can_access(device_owner(detection.device_id)):
             return jsonify({'error': 'Unauthorized access'}), 403
         
         data = request.get_json()
@@ -1104,6 +1115,7 @@ def register_routes(app):
         if not species:
             return jsonify({'success': False, 'message': 'Species not found'}), 404
         
+        record_view('fish', species_id)
         return jsonify({'success': True, 'fish': species.to_dict()}), 200
 
     @app.route('/api/fishpedia/images/<path:filename>', methods=['GET'])
@@ -1298,7 +1310,11 @@ def register_routes(app):
 
     @app.route('/api/forum/topics', methods=['GET'])
     def get_forum_topics():
-        """Get all forum topics"""
+        """
+        Forum topics, one page at a time: pinned first, then newest.
+        Query params: category, search, limit (default 20, max 100) and
+        cursor (next_cursor of the previous page).
+        """
         try:
             # Get filters
             category = request.args.get('category')
@@ -1310,7 +1326,12 @@ def register_routes(app):
             if category:
                 query = query.filter_by(category=category)
             
-            if search:
+            if search and search_available():
+                # Full-text index (titles, bodies and replies)
+                match = build_match(search)
+                if match:
+                    query = query.filter(ForumTopic.id.in_(matching_topic_ids(match)))
+            elif search:
                 query = query.filter(
                     db.or_(
                         ForumTopic.title.ilike(f'%{search}%'),
@@ -1318,11 +1339,16 @@ def register_routes(app):
                     )
                 )
             
-            # Order by: pinned first, then by created_at desc
-            topics = query.order_by(
-                ForumTopic.is_pinned.desc(),
-                ForumTopic.created_at.desc()
-            ).all()
+            # Order by: pinned first, then by created_at desc (keyset on ix_forum_topics_feed)
+            try:
+                topics, next_cursor = keyset_page(
+                    query,
+                    [ForumTopic.is_pinned, ForumTopic.created_at, ForumTopic.id],
+                    cursor=request.args.get('cursor'),
+                    limit=page_size(request.args.get('limit', type=int))
+                )
+            except InvalidCursor as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
             
             # Get current user if authenticated
             current_user_id = None
@@ -1335,8 +1361,10 @@ def register_routes(app):
             
             return jsonify({
                 'success': True,
-                'topics': [topic.to_dict(current_user_id=current_user_id) for topic in topics],
-                'count': len(topics)
+                'topics': ForumTopic.to_dict_many(topics, current_user_id=current_user_id),
+                'count': len(topics),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }), 200
             
         except Exception as e:
@@ -1350,8 +1378,8 @@ def register_routes(app):
     def create_forum_topic():
         """Create a new forum topic"""
         try:
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
+            user_id = request_user_id()
+            user = request_user()
             
             if not user:
                 return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -1399,22 +1427,81 @@ def register_routes(app):
             db.session.rollback()
             return jsonify({'success': False, 'error': str(e)}), 500
     
+    @app.route('/api/forum/search', methods=['GET'])
+    def search_forum_topics():
+        """
+        Ranked full-text search over topic titles, bodies and replies.
+        Query params: q, category, page (default 1), per_page (default 20, max 100).
+        Each topic appears once, with its best match highlighted.
+        """
+        try:
+            q = request.args.get('q', '').strip()
+            category = request.args.get('category') or None
+            page = max(1, request.args.get('page', default=1, type=int))
+            per_page = page_size(request.args.get('per_page', type=int))
+            
+            if not q:
+                return jsonify({'success': False, 'error': 'q is required'}), 400
+            if not search_available():
+                return jsonify({'success': False, 'error': 'Forum search index is not installed'}), 503
+            
+            current_user_id = None
+            try:
+                from flask_jwt_extended import verify_jwt_in_request
+                verify_jwt_in_request(optional=True)
+                current_user_id = get_jwt_identity()
+            except Exception:
+                pass
+            
+            results, total = search_forum(q, page=page, per_page=per_page, category=category,
+                                          current_user_id=current_user_id)
+            
+            return jsonify({
+                'success': True,
+                'query': q,
+                'results': results,
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': total,
+                    'pages': (total + per_page - 1) // per_page
+                }
+            }), 200
+            
+        except Exception as e:
+            print(f"❌ Error searching forum: {e}")
+            import traceback
+            traceback.print_exc()
+            return jsonify({'success': False, 'error': str(e)}), 500
+    
     @app.route('/api/forum/my-topics', methods=['GET'])
     @jwt_required()
     def get_my_forum_topics():
-        """Get topics created by current user"""
+        """
+        Get topics created by current user, newest first (limit / cursor as for
+        /api/forum/topics). total is the number of all the user's topics.
+        """
         try:
-            user_id = get_jwt_identity()
+            user_id = request_user_id()
+            query = ForumTopic.query.filter_by(author_id=user_id)
             
-            # Get all topics by current user
-            topics = ForumTopic.query.filter_by(author_id=user_id).order_by(
-                ForumTopic.created_at.desc()
-            ).all()
+            try:
+                topics, next_cursor = keyset_page(
+                    query,
+                    [ForumTopic.created_at, ForumTopic.id],
+                    cursor=request.args.get('cursor'),
+                    limit=page_size(request.args.get('limit', type=int))
+                )
+            except InvalidCursor as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
             
             return jsonify({
                 'success': True,
-                'topics': [topic.to_dict(current_user_id=user_id) for topic in topics],
-                'count': len(topics)
+                'topics': ForumTopic.to_dict_many(topics, current_user_id=user_id),
+                'count': len(topics),
+                'total': query.count(),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }), 200
             
         except Exception as e:
@@ -1430,18 +1517,8 @@ def register_routes(app):
         if not topic:
             return jsonify({'error': 'Topic not found'}), 404
         
-        # Increment views
-        # topic.views += 1
-        # db.session.commit()
-        # ✅ OPSI 2: Try-Except dengan Rollback
-        # try:
-        #     topic.views += 1
-        #     db.session.commit()
-        # except Exception as e:
-        #     db.session.rollback()
-        #     print(f"⚠️ Could not update views: {e}")
-    # Tetap return topic meski views tidak ter-update
-
+        # Counted write-behind (view_counter.py), no commit on this read
+        record_view('topic', topic_id)
         
         # Get current user if authenticated
         current_user_id = None
@@ -1462,15 +1539,14 @@ def register_routes(app):
     def delete_forum_topic(topic_id):
         """Delete a forum topic"""
         try:
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
+            user_id = request_user_id()
             topic = ForumTopic.query.get(topic_id)
             
             if not topic:
                 return jsonify({'success': False, 'error': 'Topic not found'}), 404
             
             # Check permission: only author or admin can delete
-            if topic.author_id != user_id and user.role != 'admin':
+            if not can_access(topic.author_id):
                 return jsonify({'success': False, 'error': 'Unauthorized: Only topic author or admin can delete'}), 403
             
             # Delete topic (cascade will delete replies and likes)
@@ -1496,15 +1572,14 @@ def register_routes(app):
     def update_forum_topic(topic_id):
         """Update a forum topic"""
         try:
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
+            user_id = request_user_id()
             topic = ForumTopic.query.get(topic_id)
             
             if not topic:
                 return jsonify({'success': False, 'error': 'Topic not found'}), 404
             
             # Check permission: only author or admin can update
-            if topic.author_id != user_id and user.role != 'admin':
+            if not can_access(topic.author_id):
                 return jsonify({'success': False, 'error': 'Unauthorized: Only topic author or admin can update'}), 403
             
             data = request.get_json()
@@ -1559,8 +1634,10 @@ def register_routes(app):
                 content=data['content']
             )
             
-            # ✅ HANYA CREATE REPLY, TANPA UPDATE TOPIC
+            # ✅ HANYA CREATE REPLY, TANPA UPDATE TOPIC (selain counter balasan)
             db.session.add(reply)
+            db.session.flush()
+            adjust_counter(ForumTopic, topic_id, 'reply_count', 1)
             db.session.commit()
             
             return jsonify({
@@ -1578,14 +1655,12 @@ def register_routes(app):
     @app.route('/api/forum/replies/<int:reply_id>', methods=['PUT'])
     @jwt_required()
     def update_forum_reply(reply_id):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         reply = ForumReply.query.get(reply_id)
         
         if not reply:
             return jsonify({'error': 'Reply not found'}), 404
         
-        if reply.author_id != user_id and user.role != 'admin':
+        if not can_access(reply.author_id):
             return jsonify({'error': 'Unauthorized access'}), 403
         
         data = request.get_json()
@@ -1625,11 +1700,10 @@ def register_routes(app):
             if existing_like:
                 # Unlike
                 db.session.delete(existing_like)
+                db.session.flush()
+                like_count = adjust_counter(ForumTopic, topic_id, 'like_count', -1)
                 db.session.commit()
                 
-                # Get new like count
-                like_count = ForumTopicLike.query.filter_by(topic_id=topic_id).count()
-                
                 return jsonify({
                     'success': True,
                     'message': 'Topic unliked',
@@ -1643,11 +1717,10 @@ def register_routes(app):
                     user_id=current_user_id
                 )
                 db.session.add(new_like)
+                db.session.flush()
+                like_count = adjust_counter(ForumTopic, topic_id, 'like_count', 1)
                 db.session.commit()
                 
-                # Get new like count
-                like_count = ForumTopicLike.query.filter_by(topic_id=topic_id).count()
-                
                 return jsonify({
                     'success': True,
                     'message': 'Topic liked',
@@ -1684,11 +1757,10 @@ def register_routes(app):
             if existing_like:
                 # Unlike
                 db.session.delete(existing_like)
+                db.session.flush()
+                like_count = adjust_counter(ForumReply, reply_id, 'like_count', -1)
                 db.session.commit()
                 
-                # Get new like count
-                like_count = ForumReplyLike.query.filter_by(reply_id=reply_id).count()
-                
                 return jsonify({
                     'success': True,
                     'message': 'Reply unliked',
@@ -1702,11 +1774,10 @@ def register_routes(app):
                     user_id=current_user_id
                 )
                 db.session.add(new_like)
+                db.session.flush()
+                like_count = adjust_counter(ForumReply, reply_id, 'like_count', 1)
                 db.session.commit()
                 
-                # Get new like count
-                like_count = ForumReplyLike.query.filter_by(reply_id=reply_id).count()
-                
                 return jsonify({
                     'success': True,
                     'message': 'Reply liked',
@@ -1782,10 +1853,7 @@ def register_routes(app):
     def admin_get_forum_reports():
         """Get all forum reports (Admin only)"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            
-            if current_user.role != 'admin':
+            if not is_admin():
                 return jsonify({'error': 'Unauthorized'}), 403
             
             # Get status filter
@@ -1818,13 +1886,12 @@ def register_routes(app):
     def admin_approve_report(report_id):
         """Approve report and delete topic (Admin only)"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
+            current_user_id = request_user_id()
             
-            print(f"🔍 Admin {current_user.name} approving report {report_id}")
+            print(f"🔍 Admin {current_user_id} approving report {report_id}")
             
-            if current_user.role != 'admin':
-                print(f"❌ User {current_user.name} is not admin")
+            if not is_admin():
+                print(f"❌ User {current_user_id} is not admin")
                 return jsonify({'error': 'Unauthorized'}), 403
             
             # Get report
@@ -1874,13 +1941,12 @@ def register_routes(app):
     def admin_reject_report(report_id):
         """Reject report and keep topic (Admin only)"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
+            current_user_id = request_user_id()
             
-            print(f"🔍 Admin {current_user.name} rejecting report {report_id}")
+            print(f"🔍 Admin {current_user_id} rejecting report {report_id}")
             
-            if current_user.role != 'admin':
-                print(f"❌ User {current_user.name} is not admin")
+            if not is_admin():
+                print(f"❌ User {current_user_id} is not admin")
                 return jsonify({'error': 'Unauthorized'}), 403
             
             # Get report
@@ -1921,8 +1987,7 @@ def register_routes(app):
     @app.route('/api/users/profile', methods=['GET'])
     @jwt_required()
     def get_user_profile():
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = request_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -1938,8 +2003,8 @@ def register_routes(app):
     @jwt_required()
     def create_order():
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
+            current_user_id = request_user_id()
+            current_user = request_user()
 
             data = request.get_json() or {}
 
@@ -1996,10 +2061,9 @@ def register_routes(app):
     @app.route('/api/orders', methods=['GET'])
     @jwt_required()
     def get_orders():
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user_id = request_user_id()
         
-        if user.role == 'admin':
+        if is_admin():
             orders = Order.query.order_by(Order.created_at.desc()).all()
         else:
             orders = Order.query.filter_by(user_id=user_id)\
@@ -2013,20 +2077,18 @@ def register_routes(app):
     @app.route('/api/orders/<int:order_id>', methods=['PUT'])
     @jwt_required()
     def update_order(order_id):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         order = Order.query.get(order_id)
         
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
-        if order.user_id != user_id and user.role != 'admin':
+        if not can_access(order.user_id):
             return jsonify({'error': 'Unauthorized access'}), 403
         
         data = request.get_json()
         
         # Users can only update certain fields
-        if user.role != 'admin':
+        if not is_admin():
             if 'notes' in data:
                 order.notes = data['notes']
         else:
@@ -2078,15 +2140,12 @@ def register_routes(app):
     def get_order_detail(order_id):
         """Get order detail"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            
             order = Order.query.get(order_id)
             if not order:
                 return jsonify({'error': 'Order not found'}), 404
             
             # Member can only see their own orders
-            if current_user.role != 'admin' and order.user_id != int(current_user_id):
+            if not can_access(order.user_id):
                 return jsonify({'error': 'Unauthorized'}), 403
             
             return jsonify({
@@ -2108,8 +2167,8 @@ def register_routes(app):
             return '', 200
         
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
+            current_user_id = request_user_id()
+            current_user = request_user()
             
             # Get order and verify ownership
             order = Order.query.filter_by(id=order_id, user_id=current_user_id).first()
@@ -2206,11 +2265,10 @@ def register_routes(app):
     def get_payment_proof(order_id):
         """Get payment proof image for an order"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
+            current_user_id = request_user_id()
             
             # Admin can view any order, member can only view their own
-            if current_user.role == 'admin':
+            if is_admin():
                 order = Order.query.get(order_id)
             else:
                 order = Order.query.filter_by(id=order_id, user_id=current_user_id).first()
@@ -2257,11 +2315,10 @@ def register_routes(app):
     def serve_payment_proof(order_id):
         """Serve payment proof file directly"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
+            current_user_id = request_user_id()
             
             # Admin can view any order, member can only view their own
-            if current_user.role == 'admin':
+            if is_admin():
                 order = Order.query.get(order_id)
             else:
                 order = Order.query.filter_by(id=order_id, user_id=current_user_id).first()
@@ -2320,10 +2377,7 @@ def register_routes(app):
     def admin_get_all_orders():
         """Get all orders (Admin only) with filters and pagination"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            
-            if current_user.role != 'admin':
+            if not is_admin():
                 return jsonify({'error': 'Unauthorized'}), 403
             
             # Get query parameters
@@ -2380,10 +2434,7 @@ def register_routes(app):
     def admin_update_order_status(order_id):
         """Update order status (Admin only)"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            
-            if current_user.role != 'admin':
+            if not is_admin():
                 return jsonify({'error': 'Unauthorized'}), 403
             
             data = request.get_json()
@@ -2437,10 +2488,7 @@ def register_routes(app):
     def admin_update_payment_status(order_id):
         """Update payment status (Admin only)"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            
-            if current_user.role != 'admin':
+            if not is_admin():
                 return jsonify({'error': 'Unauthorized'}), 403
             
             data = request.get_json()
@@ -2478,10 +2526,7 @@ def register_routes(app):
     def admin_get_order_stats():
         """Get order statistics (Admin only)"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            
-            if current_user.role != 'admin':
+            if not is_admin():
                 return jsonify({'error': 'Unauthorized'}), 403
             
             # Total orders
@@ -2542,10 +2587,7 @@ def register_routes(app):
     def admin_get_order_analytics():
         """Get order analytics data for charts (Admin only)"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            
-            if current_user.role != 'admin':
+            if not is_admin():
                 return jsonify({'error': 'Unauthorized'}), 403
             
             # Get orders from last 7 days
@@ -2853,10 +2895,7 @@ def register_routes(app):
     @app.route('/api/admin/users', methods=['GET'])
     @jwt_required()
     def get_all_users():
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if user.role != 'admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         users = User.query.all()
@@ -2872,10 +2911,7 @@ def register_routes(app):
     def update_user(user_id):
         """Admin: Update user data"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            
-            if current_user.role != 'admin':
+            if not is_admin():
                 return jsonify({'success': False, 'message': 'Admin access required'}), 403
             
             user_to_update = User.query.get(user_id)
@@ -2929,10 +2965,7 @@ def register_routes(app):
     def toggle_user_status(user_id):
         """Admin: Toggle user active status"""
         try:
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            
-            if current_user.role != 'admin':
+            if not is_admin():
                 return jsonify({'success': False, 'message': 'Admin access required'}), 403
             
             user_to_toggle = User.query.get(user_id)
@@ -2976,10 +3009,7 @@ def register_routes(app):
     @app.route('/api/admin/stats', methods=['GET'])
     @jwt_required()
     def get_admin_stats():
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if user.role != 'admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         stats = {
@@ -3002,10 +3032,7 @@ def register_routes(app):
     @app.route('/api/admin/disease-trends', methods=['GET'])
     @jwt_required()
     def get_disease_trends():
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if user.role != 'admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         days = request.args.get('days', default=30, type=int)
@@ -3045,8 +3072,8 @@ def register_routes(app):
             from config import config
             import base64
             
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
+            user_id = request_user_id()
+            user = request_user()
             
             if not user:
                 return jsonify({'error': 'User not found'}), 404
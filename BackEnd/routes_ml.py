@@ -1,9 +1,20 @@
-from flask import Blueprint, request, jsonify
-from ultralytics import YOLO
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 import os
-from PIL import Image
 import io
+import threading
+import multiprocessing
+import time
+from datetime import datetime
+import json
+import zipfile
+from werkzeug.utils import secure_filename
 import numpy as np
+from models import db, DiseaseDetection
+from inference_batcher import InferenceBatcher, InferenceTimeout
+from inference_pool import InferenceWorkerPool
+from frame_cache import FrameResultCache, hash_image_bytes
+from frame_preprocess import FramePreprocessor
+from inference_backends import create_backend
 
 ml_bp = Blueprint('ml', __name__)
 
@@ -11,34 +22,232 @@ ml_bp = Blueprint('ml', __name__)
 # Model file now lives directly inside BackEnd for easier hosting.
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'best.pt')
 
-model = None
+backend = None
+batcher = None
+pool = None
+frame_cache = None
+_batcher_lock = threading.Lock()
+_load_lock = threading.Lock()
+_background_load = None
+
+# Square model input size, overridden from ML_INPUT_SIZE in init_ml
+input_size = 640
+preprocessor = FramePreprocessor(input_size)
+
+# Backend choice and settings, filled from ML_* config in init_ml
+backend_name = 'torch'
+backend_settings = {'input_size': input_size}
+
+# Load/warm-up timings reported by /api/ml/health
+model_status = {
+    'loaded_at': None,
+    'load_time_ms': None,
+    'warmup_ms': None,
+    'warmed_up': False
+}
 
 def load_model():
-    global model
-    if model is None:
+    global backend
+    with _load_lock:
+        if backend is not None:
+            return
         try:
             print(f"DEBUG: Current __file__: {__file__}")
             print(f"DEBUG: Calculated MODEL_PATH: {MODEL_PATH}")
             print(f"DEBUG: Checking if file exists: {os.path.exists(MODEL_PATH)}")
-            
-            print(f"Loading model from: {MODEL_PATH}")
-            model = YOLO(MODEL_PATH)
-            print("Model loaded successfully")
+
+            print(f"Loading model from: {MODEL_PATH} (backend: {backend_name})")
+            start = time.perf_counter()
+            backend = create_backend(backend_name, MODEL_PATH, **backend_settings).load()
+            model_status['load_time_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            model_status['loaded_at'] = datetime.utcnow().isoformat()
+            print(f"Model loaded successfully in {model_status['load_time_ms']} ms")
         except Exception as e:
             print(f"Error loading model: {e}")
             import traceback
             traceback.print_exc()
 
-from flask_jwt_extended import jwt_required
+def start_background_load():
+    """Load the model on a background thread (once at a time); used by the health probe in lazy mode."""
+    global _background_load
+    with _batcher_lock:
+        if backend is None and (_background_load is None or not _background_load.is_alive()):
+            _background_load = threading.Thread(target=load_model, name='ml-model-load', daemon=True)
+            _background_load.start()
+
+def warm_up_model(batch_size=1):
+    """Run a dummy batch so the first real request doesn't pay for allocation/compilation."""
+    if backend is None:
+        return
+    frames = [np.zeros((input_size, input_size, 3), dtype=np.uint8) for _ in range(max(1, batch_size))]
+    start = time.perf_counter()
+    backend.predict(frames)
+    model_status['warmup_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    model_status['warmed_up'] = True
+    print(f"Model warmed up with a batch of {len(frames)} in {model_status['warmup_ms']} ms")
+
+def predict_batch(frames):
+    """Run one forward pass over a list of frames on the global backend."""
+    return backend.predict(frames)
+
+def get_batcher():
+    """Return the process-wide batcher, creating it on first use."""
+    global batcher
+    if batcher is None:
+        with _batcher_lock:
+            if batcher is None:
+                batcher = InferenceBatcher(
+                    predict_batch,
+                    max_batch_size=current_app.config.get('ML_BATCH_MAX_SIZE', 8),
+                    max_wait_ms=current_app.config.get('ML_BATCH_MAX_WAIT_MS', 10),
+                    timeout=current_app.config.get('ML_INFERENCE_TIMEOUT', 30)
+                )
+    return batcher
+
+def get_frame_cache():
+    """Return the process-wide near-duplicate frame cache, or None if disabled."""
+    global frame_cache
+    if frame_cache is None and current_app.config.get('ML_FRAME_CACHE_ENABLED', True):
+        with _batcher_lock:
+            if frame_cache is None:
+                frame_cache = FrameResultCache(
+                    max_keys=current_app.config.get('ML_FRAME_CACHE_MAX_KEYS', 1024),
+                    max_distance=current_app.config.get('ML_FRAME_CACHE_MAX_DISTANCE', 4),
+                    ttl_seconds=current_app.config.get('ML_FRAME_CACHE_TTL', 5)
+                )
+    return frame_cache
+
+def init_ml(app):
+    """
+    Prepare inference at startup: start the out-of-process pool when
+    ML_WORKER_POOL_SIZE is set, otherwise load and warm up the in-process model
+    when ML_EAGER_LOAD is enabled.
+    """
+    global pool, input_size, preprocessor, backend_name, backend_settings
+    input_size = app.config.get('ML_INPUT_SIZE', 640)
+    if preprocessor.input_size != input_size:
+        preprocessor = FramePreprocessor(input_size)
+
+    backend_name = app.config.get('ML_BACKEND', 'torch')
+    backend_settings = {
+        'input_size': input_size,
+        'conf_threshold': app.config.get('ML_CONF_THRESHOLD', 0.25),
+        'iou_threshold': app.config.get('ML_IOU_THRESHOLD', 0.7),
+        'quantize': app.config.get('ML_ONNX_QUANTIZE', False),
+        'intra_op_threads': app.config.get('ML_ORT_INTRA_OP_THREADS', 0),
+        'inter_op_threads': app.config.get('ML_ORT_INTER_OP_THREADS', 0)
+    }
+
+    # Never start anything from inside one of the pool's own child processes
+    if multiprocessing.parent_process() is not None:
+        return
+
+    pool_size = app.config.get('ML_WORKER_POOL_SIZE', 0)
+    if pool_size > 0:
+        if pool is None:
+            # Pool workers always load and warm up their model at startup
+            pool = InferenceWorkerPool(
+                MODEL_PATH,
+                backend_name=backend_name,
+                backend_settings=backend_settings,
+                num_workers=pool_size,
+                max_batch_size=app.config.get('ML_BATCH_MAX_SIZE', 8),
+                timeout=app.config.get('ML_INFERENCE_TIMEOUT', 30)
+            ).start()
+        return
+
+    if app.config.get('ML_EAGER_LOAD'):
+        load_model()
+        try:
+            warm_up_model(app.config.get('ML_BATCH_MAX_SIZE', 8))
+        except Exception as e:
+            print(f"Error warming up model: {e}")
+
+def ensure_model_ready():
+    """Make sure something can serve inference (pool or in-process model)."""
+    if pool is not None:
+        return True
+    if backend is None:
+        load_model()
+    return backend is not None
+
+def run_detection(img_bytes, cache_key=None, timings=None):
+    """
+    Full detection pipeline for one encoded image: near-duplicate cache,
+    preprocessing and (batched or pooled) inference.
+    Returns (detections, cached). Must run inside an app context.
+    If a timings dict is given, per-stage durations (ms) are recorded in it.
+    """
+    # Near-duplicate of a recent frame from the same user/device? Reuse its result
+    cache = get_frame_cache() if cache_key is not None else None
+    if cache is not None:
+        start = time.perf_counter()
+        frame_hash, frame_size = hash_image_bytes(io.BytesIO(img_bytes))
+        cached = cache.lookup(cache_key, frame_hash, frame_size)
+        if timings is not None:
+            timings['cache'] = (time.perf_counter() - start) * 1000
+        if cached is not None:
+            return cached, True
+
+    # Decode + letterbox straight to the model input size
+    prepared = preprocessor.prepare(img_bytes, timings)
+
+    start = time.perf_counter()
+    if pool is not None:
+        # Hand the frame to the inference processes via shared memory
+        detections = pool.infer(prepared.frame)
+    else:
+        # Run inference (batched together with frames from concurrent requests)
+        detections = get_batcher().submit(prepared.frame)
+    if timings is not None:
+        timings['inference'] = (time.perf_counter() - start) * 1000
+
+    preprocessor.map_detections(detections, prepared)
+
+    if cache is not None:
+        cache.store(cache_key, frame_hash, frame_size, detections)
+
+    return detections, False
+
+def run_detection_batch(images):
+    """
+    Detect on a list of encoded images in one go (no frame cache).
+    Returns one (detections, error) pair per image, in input order.
+    """
+    results = [(None, None)] * len(images)
+    prepared_frames = []
+    for index, img_bytes in enumerate(images):
+        try:
+            prepared = preprocessor.prepare(img_bytes)
+            # The preprocessor reuses one buffer per thread, so keep a copy
+            prepared.frame = prepared.frame.copy()
+            prepared_frames.append((index, prepared))
+        except Exception:
+            results[index] = (None, 'Could not decode image')
+
+    if prepared_frames:
+        frames = [prepared.frame for _, prepared in prepared_frames]
+        if pool is not None:
+            batch_detections = pool.infer_many(frames)
+        else:
+            batch_detections = get_batcher().submit_many(frames)
+
+        for (index, prepared), detections in zip(prepared_frames, batch_detections):
+            results[index] = (preprocessor.map_detections(detections, prepared), None)
+
+    return results
+
+def server_timing_header(timings):
+    """Format stage durations as a Server-Timing header value."""
+    return ', '.join(f"{name};dur={duration:.2f}" for name, duration in timings.items())
+
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from authz import device_owner, request_user_id
 
 @ml_bp.route('/detect_disease', methods=['POST'])
 @jwt_required()
 def detect_disease():
-    global model
-    if model is None:
-        load_model()
-    
-    if model is None:
+    if not ensure_model_ready():
         return jsonify({'error': 'Model not loaded'}), 500
 
     if 'image' not in request.files:
@@ -51,36 +260,235 @@ def detect_disease():
     try:
         # Read image
         img_bytes = file.read()
-        img = Image.open(io.BytesIO(img_bytes))
-        
-        # Run inference
-        results = model(img)
-        
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # Get box coordinates
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                
-                # Get confidence
-                conf = float(box.conf[0])
-                
-                # Get class name
-                cls = int(box.cls[0])
-                class_name = result.names[cls]
-                
-                detections.append({
-                    'bbox': [x1, y1, x2, y2],
-                    'confidence': conf,
-                    'class': class_name
-                })
-        
-        return jsonify({
+
+        timings = {}
+        cache_key = (get_jwt_identity(), request.form.get('device_id'))
+        detections, cached = run_detection(img_bytes, cache_key, timings)
+
+        start = time.perf_counter()
+        payload = {
             'success': True,
             'detections': detections
-        })
+        }
+        if cached:
+            payload['cached'] = True
+        response = jsonify(payload)
+        timings['serialize'] = (time.perf_counter() - start) * 1000
+
+        # Per-stage timings for benchmark_detection.py and browser devtools
+        response.headers['Server-Timing'] = server_timing_header(timings)
+        return response
+
+    except InferenceTimeout as e:
+        print(f"Inference timed out: {e}")
+        return jsonify({'error': str(e)}), 503
 
     except Exception as e:
         print(f"Error during inference: {e}")
         return jsonify({'error': str(e)}), 500
+
+BULK_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def _bulk_inputs():
+    """
+    List the images of a bulk request as (filename, loader) pairs, from the
+    'images' files and/or a ZIP uploaded as 'archive'. Loaders read lazily so
+    only one batch of images is in memory at a time.
+    """
+    max_bytes = current_app.config.get('ML_BULK_MAX_IMAGE_BYTES', 20 * 1024 * 1024)
+    inputs = []
+
+    for file in request.files.getlist('images'):
+        if file and file.filename:
+            inputs.append((file.filename, file.read))
+
+    archive = request.files.get('archive')
+    if archive and archive.filename:
+        try:
+            zf = zipfile.ZipFile(archive.stream)
+        except zipfile.BadZipFile:
+            raise ValueError('archive is not a valid ZIP file')
+        for info in zf.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith('__MACOSX/') or not name.lower().endswith(BULK_IMAGE_EXTENSIONS):
+                continue
+            if info.file_size > max_bytes:
+                raise ValueError(f'{name} is larger than {max_bytes} bytes')
+            inputs.append((name, lambda info=info: zf.read(info)))
+
+    return inputs
+
+def _severity_for(confidence):
+    # Same thresholds as the live detection page
+    if confidence >= 0.75:
+        return 'high'
+    if confidence >= 0.5:
+        return 'medium'
+    return 'low'
+
+def _save_bulk_image(device_id, index, img_bytes):
+    filename = secure_filename(f"detection_{device_id}_{int(datetime.utcnow().timestamp())}_{index}.jpg")
+    upload_folder = os.path.join('static', 'uploads', 'detections')
+    os.makedirs(upload_folder, exist_ok=True)
+    with open(os.path.join(upload_folder, filename), 'wb') as f:
+        f.write(img_bytes)
+    return f"/static/uploads/detections/{filename}"
+
+def _detection_row(device_id, filename, image_url, detection):
+    label = detection['class']
+    is_healthy = 'healthy' in label.lower()
+    return {
+        'device_id': device_id,
+        'disease_name': label,
+        'confidence': round(detection['confidence'] * 100, 2),
+        'severity': _severity_for(detection['confidence']),
+        'image_url': image_url,
+        'detected_at': datetime.utcnow(),
+        'status': 'resolved' if is_healthy else 'detected',
+        'notes': json.dumps({
+            'notes': 'Bulk screening',
+            'fish_type': label,
+            'source_file': filename
+        })
+    }
+
+@ml_bp.route('/detect_disease/batch', methods=['POST'])
+@jwt_required()
+def detect_disease_batch():
+    """
+    Screen many images in one request. Accepts multiple 'images' files and/or a
+    ZIP as 'archive'. Results stream back as NDJSON, one line per image as each
+    model batch finishes, followed by a summary line.
+
+    Optional form fields:
+      save=true + device_id   store the top detection of every image as a
+                              DiseaseDetection row (one bulk insert at the end)
+      min_confidence          only save detections at or above this (default 0.5)
+      batch_size              images per model batch (default ML_BATCH_MAX_SIZE)
+    """
+    if not ensure_model_ready():
+        return jsonify({'error': 'Model not loaded'}), 500
+
+    try:
+        inputs = _bulk_inputs()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not inputs:
+        return jsonify({'error': 'No images provided'}), 400
+
+    max_images = current_app.config.get('ML_BULK_MAX_IMAGES', 500)
+    if len(inputs) > max_images:
+        return jsonify({'error': f'Too many images ({len(inputs)}), limit is {max_images}'}), 400
+
+    save = request.form.get('save', 'false').lower() in ('1', 'true', 'yes')
+    device_id = request.form.get('device_id', type=int)
+    if save:
+        if device_id is None:
+            return jsonify({'error': 'device_id is required when save=true'}), 400
+        if device_owner(device_id) != request_user_id():
+            return jsonify({'success': False, 'message': 'Device not found or unauthorized'}), 404
+
+    min_confidence = request.form.get('min_confidence', 0.5, type=float)
+    batch_size = request.form.get('batch_size', current_app.config.get('ML_BATCH_MAX_SIZE', 8), type=int)
+    batch_size = max(1, min(batch_size, 64))
+
+    def generate():
+        rows = []
+        processed = failed = total_detections = 0
+        start = time.perf_counter()
+
+        for offset in range(0, len(inputs), batch_size):
+            chunk = inputs[offset:offset + batch_size]
+            images = []
+            for filename, load in chunk:
+                try:
+                    images.append(load())
+                except Exception as e:
+                    print(f"Could not read {filename}: {e}")
+                    images.append(b'')
+
+            try:
+                results = run_detection_batch(images)
+            except Exception as e:
+                print(f"Error during bulk inference: {e}")
+                results = [(None, str(e))] * len(chunk)
+
+            for i, ((filename, _), (detections, error)) in enumerate(zip(chunk, results)):
+                index = offset + i
+                if error is not None:
+                    failed += 1
+                    yield json.dumps({'type': 'error', 'index': index, 'filename': filename, 'error': error}) + '\n'
+                    continue
+
+                processed += 1
+                total_detections += len(detections)
+                yield json.dumps({'type': 'result', 'index': index, 'filename': filename,
+                                  'detections': detections}) + '\n'
+
+                if save and detections:
+                    top = max(detections, key=lambda d: d['confidence'])
+                    if top['confidence'] >= min_confidence:
+                        image_url = _save_bulk_image(device_id, index, images[i])
+                        rows.append(_detection_row(device_id, filename, image_url, top))
+
+        saved = 0
+        save_error = None
+        if rows:
+            try:
+                db.session.execute(db.insert(DiseaseDetection), rows)
+                db.session.commit()
+                saved = len(rows)
+            except Exception as e:
+                db.session.rollback()
+                save_error = str(e)
+                print(f"❌ Error saving bulk detections: {e}")
+
+        summary = {
+            'type': 'summary',
+            'images': len(inputs),
+            'processed': processed,
+            'failed': failed,
+            'detections': total_detections,
+            'saved': saved,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+        }
+        if save_error:
+            summary['save_error'] = save_error
+        yield json.dumps(summary) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@ml_bp.route('/ml/health', methods=['GET'])
+def ml_health():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 otherwise."""
+    if pool is not None:
+        pool_stats = pool.stats()
+        ready = pool_stats['ready_workers'] > 0 and pool_stats['alive_workers'] == pool_stats['workers']
+        data = {'mode': 'pool', 'pool': pool_stats}
+    else:
+        # In lazy mode the first real request warms the model, so loaded is enough.
+        # Nothing loads it before traffic arrives, though, and a load balancer waits
+        # for readiness first: the first probe starts the load in the background.
+        warm_required = current_app.config.get('ML_EAGER_LOAD', False)
+        if backend is None and not warm_required:
+            start_background_load()
+        ready = backend is not None and (model_status['warmed_up'] or not warm_required)
+        data = {
+            'mode': 'in_process',
+            'loaded': backend is not None,
+            **model_status,
+            'batcher': batcher.stats() if batcher else None
+        }
+
+    data['frame_cache'] = frame_cache.stats() if frame_cache else None
+
+    data['backend'] = backend_name
+    data['input_shape'] = [1, 3, input_size, input_size]
+
+    return jsonify({
+        'success': True,
+        'status': 'ready' if ready else 'loading',
+        'ready': ready,
+        'data': data
+    }), 200 if ready else 503
@@ -0,0 +1,329 @@
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from flask_jwt_extended import jwt_required
+from functools import wraps
+from datetime import datetime, timedelta, timezone
+import hmac
+import math
+
+from models import db, WaterAlertRule
+from ingest_buffer import BufferFull
+from telemetry import ingest_readings
+from heartbeats import record_heartbeat, resolve_device_ids
+from telemetry_rollups import RESOLUTIONS, query_history
+from telemetry_export import MIMETYPES, available_formats, export_readings
+from water_alerts import METRICS as ALERT_METRICS, RULE_FIELDS, rules_for_device
+from authz import can_access, device_access_error, device_owners
+
+telemetry_bp = Blueprint('telemetry', __name__)
+
+# Rejections echoed back per request; the counts are always complete
+MAX_REPORTED_ERRORS = 100
+MAX_HISTORY_HOURS = 24 * 366 * 10
+
+
+def device_key_required(fn):
+    """Devices authenticate with the shared ingestion key in X-Device-Key."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        expected = current_app.config.get('DEVICE_INGEST_KEY')
+        provided = request.headers.get('X-Device-Key', '')
+        # compare_digest only takes ASCII str, so compare bytes
+        if not expected or not hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8')):
+            return jsonify({'success': False, 'message': 'Invalid device key'}), 401
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def _busy_response():
+    """Back-pressure: the write buffer is full, the device should retry later."""
+    retry_after = max(1, math.ceil(current_app.config.get('TELEMETRY_FLUSH_INTERVAL', 1.0)))
+    response = jsonify({'success': False, 'message': 'Ingestion is busy, retry later'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+
+@telemetry_bp.route('/telemetry/water', methods=['POST'])
+@device_key_required
+def ingest_water_telemetry():
+    """
+    Ingest a batch of water quality readings from one or more devices.
+    Body: {"readings": [...]} (each reading with its own device_code) or
+    {"device_code": "...", "readings": [...]} for a single device.
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        data = {'readings': data}
+    if not isinstance(data, dict) or not isinstance(data.get('readings'), list):
+        return jsonify({'success': False, 'message': 'Body must contain a readings list'}), 400
+
+    readings = data['readings']
+    max_batch = current_app.config.get('TELEMETRY_MAX_BATCH', 5000)
+    if len(readings) > max_batch:
+        return jsonify({
+            'success': False,
+            'message': f'Too many readings ({len(readings)}), limit is {max_batch} per request'
+        }), 413
+
+    try:
+        batch = ingest_readings(readings, default_device_code=data.get('device_code'))
+    except BufferFull:
+        return _busy_response()
+    except Exception as e:
+        print(f"❌ Error ingesting telemetry: {e}")
+        return jsonify({'success': False, 'message': 'Failed to store readings'}), 500
+
+    return jsonify({
+        'success': True,
+        'queued': batch.queued,
+        'received': batch.received,
+        'accepted': len(batch),
+        'rejected': len(batch.errors),
+        'devices': len(set(batch.device_ids.tolist())),
+        'errors': batch.errors[:MAX_REPORTED_ERRORS]
+    }), 202 if batch.queued else 200
+
+
+def _heartbeat_fields(heartbeat):
+    """Validated optional fields of one heartbeat; raises ValueError."""
+    battery = heartbeat.get('battery', heartbeat.get('battery_level'))
+    if battery is not None:
+        if isinstance(battery, bool) or not isinstance(battery, (int, float)) or not 0 <= battery <= 100:
+            raise ValueError('battery must be a number between 0 and 100')
+        battery = int(round(battery))
+    robot_status = heartbeat.get('robot_status')
+    firmware_version = heartbeat.get('firmware_version', heartbeat.get('firmware'))
+    if firmware_version is not None:
+        firmware_version = str(firmware_version)[:50]
+    return {'battery': battery, 'robot_status': robot_status, 'firmware_version': firmware_version}
+
+
+@telemetry_bp.route('/telemetry/heartbeat', methods=['POST'])
+@device_key_required
+def device_heartbeat():
+    """
+    Device liveness ping. Body: {"device_code": "...", "battery": 87,
+    "robot_status": "idle", "firmware_version": "1.4.2"} (all but device_code
+    optional), or {"heartbeats": [...]} from a gateway relaying many devices.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Body must be a JSON object'}), 400
+    heartbeats = data['heartbeats'] if isinstance(data.get('heartbeats'), list) else [data]
+
+    max_batch = current_app.config.get('TELEMETRY_MAX_BATCH', 5000)
+    if len(heartbeats) > max_batch:
+        return jsonify({
+            'success': False,
+            'message': f'Too many heartbeats ({len(heartbeats)}), limit is {max_batch} per request'
+        }), 413
+
+    codes = [h.get('device_code') if isinstance(h, dict) and isinstance(h.get('device_code'), str) else None
+             for h in heartbeats]
+    device_ids = resolve_device_ids({code for code in codes if code is not None})
+    now = datetime.utcnow()
+    queued = coalesced = 0
+    errors = []
+    for index, (heartbeat, code) in enumerate(zip(heartbeats, codes)):
+        device_id = device_ids.get(code) if code is not None else None
+        if device_id is None:
+            errors.append({'index': index, 'error': 'unknown device_code'})
+            continue
+        try:
+            if record_heartbeat(device_id, now, **_heartbeat_fields(heartbeat)):
+                queued += 1
+            else:
+                coalesced += 1
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+        except BufferFull:
+            return _busy_response()
+
+    if errors and not (queued or coalesced):
+        return jsonify({'success': False, 'message': 'No valid heartbeats', 'errors': errors[:MAX_REPORTED_ERRORS]}), 400
+
+    return jsonify({
+        'success': True,
+        'queued': queued,
+        'coalesced': coalesced,
+        'rejected': len(errors),
+        'errors': errors[:MAX_REPORTED_ERRORS],
+        'server_time': now.isoformat(),
+        # Pings closer together than this are coalesced anyway
+        'interval': current_app.config.get('HEARTBEAT_MIN_INTERVAL', 30)
+    }), 202
+
+
+def _parse_time(value):
+    """ISO 8601 string -> naive UTC datetime."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@telemetry_bp.route('/devices/<int:device_id>/water-history', methods=['GET'])
+@jwt_required()
+def get_water_history(device_id):
+    """
+    Water quality history from the rollup tables.
+    Query params: hours (default 24) or start/end (ISO 8601, UTC),
+    max_points (default 500), resolution = auto | 1m | 1h | 1d.
+    """
+    error = device_access_error(device_id)
+    if error:
+        return error
+
+    resolution = request.args.get('resolution', 'auto')
+    if resolution != 'auto' and resolution not in RESOLUTIONS:
+        return jsonify({'error': f"resolution must be auto or one of {', '.join(RESOLUTIONS)}"}), 400
+
+    max_points = max(1, min(request.args.get('max_points', default=500, type=int), 5000))
+
+    try:
+        end = _parse_time(request.args['end']) if 'end' in request.args else datetime.utcnow()
+        if 'start' in request.args:
+            start = _parse_time(request.args['start'])
+        else:
+            hours = max(1, min(request.args.get('hours', default=24, type=int), MAX_HISTORY_HOURS))
+            start = end - timedelta(hours=hours)
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'start/end must be ISO 8601 timestamps'}), 400
+
+    if start >= end:
+        return jsonify({'error': 'start must be before end'}), 400
+
+    resolution, data = query_history(device_id, start, end, max_points, resolution)
+
+    return jsonify({
+        'success': True,
+        'resolution': resolution,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'data': data,
+        'count': len(data)
+    }), 200
+
+
+@telemetry_bp.route('/telemetry/water/export', methods=['GET'])
+@jwt_required()
+def export_water_telemetry():
+    """
+    Stream raw water readings for one or more devices.
+    Query params: device_ids (comma separated), start/end (ISO 8601, UTC;
+    default the last 24 hours) and format = csv | npz | arrow.
+    """
+    fmt = request.args.get('format', 'csv')
+    formats = available_formats()
+    if fmt not in formats:
+        return jsonify({'error': f"format must be one of {', '.join(formats)}"}), 400
+
+    try:
+        device_ids = sorted({int(part) for part in request.args.get('device_ids', '').split(',') if part.strip()})
+    except ValueError:
+        return jsonify({'error': 'device_ids must be a comma separated list of ids'}), 400
+    if not device_ids:
+        return jsonify({'error': 'device_ids is required'}), 400
+
+    owners = device_owners(device_ids)
+    if len(owners) != len(device_ids):
+        return jsonify({'error': 'Device not found'}), 404
+    if not all(can_access(owner_id) for owner_id in owners.values()):
+        return jsonify({'error': 'Unauthorized access'}), 403
+
+    try:
+        end = _parse_time(request.args['end']) if 'end' in request.args else datetime.utcnow()
+        start = _parse_time(request.args['start']) if 'start' in request.args else end - timedelta(hours=24)
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'start/end must be ISO 8601 timestamps'}), 400
+
+    if start >= end:
+        return jsonify({'error': 'start must be before end'}), 400
+
+    chunks = export_readings(db.engine, device_ids, start, end, fmt,
+                             chunk_size=current_app.config.get('TELEMETRY_EXPORT_CHUNK', 10000))
+    filename = f"water_{'-'.join(map(str, device_ids))}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.{fmt}"
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+@telemetry_bp.route('/devices/<int:device_id>/alert-rules', methods=['GET'])
+@jwt_required()
+def get_alert_rules(device_id):
+    """Effective water alert rules of a device (device overrides or defaults)."""
+    error = device_access_error(device_id)
+    if error:
+        return error
+
+    overridden = {rule.metric for rule in WaterAlertRule.query.filter_by(device_id=device_id).all()}
+    rules = rules_for_device(device_id)
+    return jsonify({
+        'success': True,
+        'data': {
+            metric: dict(rule, source='device' if metric in overridden else 'default')
+            for metric, rule in rules.items()
+        }
+    }), 200
+
+
+@telemetry_bp.route('/devices/<int:device_id>/alert-rules', methods=['PUT'])
+@jwt_required()
+def update_alert_rules(device_id):
+    """
+    Override alert rules for a device.
+    Body: {"rules": {"ph_level": {"low": 6.8, "high": 7.4, "hysteresis": 0.1,
+    "max_rate": 0.5, "cooldown_minutes": 30, "is_active": true}, "turbidity": null}}
+    A null rule removes the override and falls back to the default.
+    """
+    error = device_access_error(device_id)
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    changes = data.get('rules')
+    if not isinstance(changes, dict):
+        return jsonify({'error': 'Body must contain a rules object'}), 400
+
+    unknown = sorted(set(changes) - set(ALERT_METRICS))
+    if unknown:
+        return jsonify({'error': f"Unknown metrics: {', '.join(unknown)}"}), 400
+
+    current = rules_for_device(device_id)
+    existing = {rule.metric: rule for rule in WaterAlertRule.query.filter_by(device_id=device_id).all()}
+
+    for metric, values in changes.items():
+        if values is None:
+            if metric in existing:
+                db.session.delete(existing[metric])
+            continue
+        if not isinstance(values, dict):
+            return jsonify({'error': f'Rule for {metric} must be an object or null'}), 400
+
+        merged = {field: values.get(field, current[metric][field]) for field in RULE_FIELDS}
+        try:
+            for field in ('low', 'high', 'max_rate'):
+                merged[field] = float(merged[field]) if merged[field] is not None else None
+            merged['hysteresis'] = float(merged['hysteresis'] or 0)
+            merged['cooldown_minutes'] = int(merged['cooldown_minutes'] or 0)
+        except (TypeError, ValueError, OverflowError):
+            return jsonify({'error': f'Rule values for {metric} must be numbers'}), 400
+        # NaN would silently disable the rule (every comparison with it is false)
+        if not all(math.isfinite(merged[field]) for field in ('low', 'high', 'max_rate', 'hysteresis')
+                   if merged[field] is not None):
+            return jsonify({'error': f'Rule values for {metric} must be finite numbers'}), 400
+        if merged['low'] is not None and merged['high'] is not None and merged['low'] >= merged['high']:
+            return jsonify({'error': f'{metric}: low must be below high'}), 400
+        if merged['hysteresis'] < 0 or merged['cooldown_minutes'] < 0:
+            return jsonify({'error': f'{metric}: hysteresis and cooldown_minutes cannot be negative'}), 400
+
+        rule = existing.get(metric) or WaterAlertRule(device_id=device_id, metric=metric)
+        for field, value in merged.items():
+            setattr(rule, field, value)
+        rule.is_active = bool(values.get('is_active', current[metric]['is_active']))
+        db.session.add(rule)
+
+    db.session.commit()
+    return get_alert_rules(device_id)
@@ -0,0 +1,325 @@
+"""
+Water telemetry ingestion.
+
+Devices post batches of readings (possibly from many devices at once):
+
+    {"readings": [
+        {"device_code": "TMK-001", "timestamp": "2026-01-01T10:00:00Z",
+         "temperature": 26.1, "ph_level": 7.0, "turbidity": 1.8,
+         "oxygen_level": 7.2, "ammonia_level": 0.02},
+        ...
+    ]}
+
+The batch is validated column-wise with NumPy (one array per field instead of
+per-reading Python checks). Accepted readings go to water_monitoring with a
+single executemany INSERT, the 1m/1h/1d rollups are updated from the same
+batch (telemetry_rollups.py), and every reporting device gets its last_online
+touched once, all in one transaction per batch. The committed batch is then
+checked against the water alert rules (water_alerts.py).
+
+With TELEMETRY_WRITE_BEHIND (the default) validated batches are acknowledged
+right away and written by the flush thread of a write-behind buffer
+(ingest_buffer.py), many requests per transaction.
+"""
+
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+from ingest_buffer import WriteBehindBuffer, register_shutdown
+from models import db, Device, WaterMonitoring
+from telemetry_rollups import apply_rollups
+from telemetry_state import update_device_state
+from water_alerts import process_alerts
+
+TELEMETRY_FIELDS = ('temperature', 'ph_level', 'turbidity', 'oxygen_level', 'ammonia_level')
+
+# Short names some device firmware uses
+FIELD_ALIASES = {
+    'temp': 'temperature',
+    'ph': 'ph_level',
+    'oxygen': 'oxygen_level',
+    'ammonia': 'ammonia_level'
+}
+
+# Physically possible sensor values; anything outside is a sensor or transport fault
+VALID_RANGES = {
+    'temperature': (0.0, 50.0),     # °C
+    'ph_level': (0.0, 14.0),
+    'turbidity': (0.0, 3000.0),     # NTU
+    'oxygen_level': (0.0, 25.0),    # mg/L
+    'ammonia_level': (0.0, 50.0)    # ppm
+}
+
+MAX_FUTURE_SKEW = timedelta(minutes=5)
+MAX_AGE = timedelta(days=7)
+
+
+class TelemetryBatch:
+    """Accepted readings of one request, stored column-wise."""
+
+    def __init__(self, device_ids, timestamps, values, errors, received):
+        self.device_ids = device_ids    # int64 array
+        self.timestamps = timestamps    # float64 array, UTC epoch seconds
+        self.values = values            # field -> float64 array (NaN = not reported)
+        self.errors = errors            # [{'index': i, 'error': '...'}]
+        self.received = received
+        self.queued = False             # accepted into the write-behind buffer, not yet written
+
+    def __len__(self):
+        return len(self.device_ids)
+
+    @classmethod
+    def concat(cls, batches):
+        """One batch holding the readings of several (e.g. buffered) batches."""
+        batches = [batch for batch in batches if len(batch)]
+        if len(batches) == 1:
+            return batches[0]
+        if not batches:
+            return cls(np.empty(0, dtype=np.int64), np.empty(0), {f: np.empty(0) for f in TELEMETRY_FIELDS}, [], 0)
+        return cls(
+            device_ids=np.concatenate([batch.device_ids for batch in batches]),
+            timestamps=np.concatenate([batch.timestamps for batch in batches]),
+            values={field: np.concatenate([batch.values[field] for batch in batches]) for field in TELEMETRY_FIELDS},
+            errors=[],
+            received=sum(batch.received for batch in batches)
+        )
+
+    def datetimes(self):
+        """Timestamps as naive UTC datetimes, like the rest of the schema."""
+        micros = np.round(self.timestamps * 1e6).astype('int64')
+        return micros.astype('datetime64[us]').tolist()
+
+    def rows(self):
+        """Insert parameters for water_monitoring, one dict per reading."""
+        columns = {
+            field: np.where(np.isnan(values), None, values).tolist()
+            for field, values in self.values.items()
+        }
+        device_ids = self.device_ids.tolist()
+        timestamps = self.datetimes()
+        return [
+            {
+                'device_id': device_ids[i],
+                'timestamp': timestamps[i],
+                **{field: columns[field][i] for field in TELEMETRY_FIELDS}
+            }
+            for i in range(len(device_ids))
+        ]
+
+
+def _float_column(values):
+    """Array of floats (None -> NaN) plus a mask of entries that are not numbers."""
+    try:
+        column = np.array(values, dtype=np.float64)
+        return column, np.zeros(len(values), dtype=bool)
+    except (TypeError, ValueError):
+        pass
+
+    column = np.full(len(values), np.nan)
+    bad = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        try:
+            column[i] = float(value)
+        except (TypeError, ValueError):
+            bad[i] = True
+    return column, bad
+
+
+def _timestamp_column(values, now):
+    """
+    Epoch seconds for each reading. Accepts epoch seconds/milliseconds or ISO
+    8601 strings; missing timestamps mean "now".
+    """
+    column = np.full(len(values), now)
+    bad = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            try:
+                column[i] = value
+            except OverflowError:
+                bad[i] = True
+            continue
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            column[i] = parsed.timestamp()
+        except ValueError:
+            bad[i] = True
+
+    # Millisecond epochs are common on microcontrollers
+    millis = column > 1e11
+    column[millis] /= 1000.0
+    return column, bad
+
+
+def validate_readings(readings, device_codes=None, default_device_code=None):
+    """
+    Validate a list of reading dicts in one vectorized pass.
+
+    device_codes maps device_code -> device id; when omitted the codes in the
+    batch are resolved with a single query. Returns a TelemetryBatch with only
+    the accepted readings.
+    """
+    count = len(readings)
+    now = datetime.now(timezone.utc).timestamp()
+    reasons = np.full(count, None, dtype=object)
+
+    def reject(mask, reason):
+        # First failing check wins
+        reasons[mask & (reasons == None)] = reason  # noqa: E711
+
+    not_object = np.array([not isinstance(r, dict) for r in readings], dtype=bool)
+    readings = [r if isinstance(r, dict) else {} for r in readings]
+    reject(not_object, 'reading must be an object')
+
+    # Device
+    codes = [r.get('device_code', default_device_code) for r in readings]
+    if device_codes is None:
+        device_codes = resolve_device_codes(codes)
+    device_ids = np.array([device_codes.get(code, -1) if isinstance(code, str) else -1 for code in codes],
+                          dtype=np.int64)
+    reject(device_ids < 0, 'unknown device_code')
+
+    # Timestamp
+    timestamps, bad_timestamp = _timestamp_column([r.get('timestamp') for r in readings], now)
+    reject(bad_timestamp, 'invalid timestamp')
+    # NaN / Infinity (JSON allows them) would slip through both range checks
+    reject(~np.isfinite(timestamps), 'invalid timestamp')
+    reject(timestamps > now + MAX_FUTURE_SKEW.total_seconds(), 'timestamp is in the future')
+    reject(timestamps < now - MAX_AGE.total_seconds(), 'timestamp is too old')
+
+    # Measurements
+    values = {}
+    reported = np.zeros(count, dtype=bool)
+    for field in TELEMETRY_FIELDS:
+        aliases = [alias for alias, target in FIELD_ALIASES.items() if target == field]
+        raw = []
+        for r in readings:
+            value = r.get(field)
+            if value is None:
+                for alias in aliases:
+                    value = r.get(alias)
+                    if value is not None:
+                        break
+            raw.append(value)
+
+        column, bad = _float_column(raw)
+        low, high = VALID_RANGES[field]
+        present = ~np.isnan(column)
+        reject(bad | (present & ~np.isfinite(column)), f'{field} is not a number')
+        with np.errstate(invalid='ignore'):
+            reject(present & ((column < low) | (column > high)), f'{field} out of range [{low}, {high}]')
+        reported |= present
+        values[field] = column
+    reject(~reported, 'reading has no measurements')
+
+    accepted = reasons == None  # noqa: E711
+    errors = [{'index': int(i), 'error': reasons[i]} for i in np.flatnonzero(~accepted)]
+
+    return TelemetryBatch(
+        device_ids=device_ids[accepted],
+        timestamps=timestamps[accepted],
+        values={field: column[accepted] for field, column in values.items()},
+        errors=errors,
+        received=count
+    )
+
+
+def resolve_device_codes(codes):
+    """Map device codes to device ids with one query."""
+    unique = {code for code in codes if isinstance(code, str)}
+    if not unique:
+        return {}
+    rows = db.session.query(Device.device_code, Device.id).filter(Device.device_code.in_(unique)).all()
+    return {code: device_id for code, device_id in rows}
+
+
+def write_batch(batch):
+    """
+    Store a validated batch: one bulk INSERT for the readings, the rollup
+    upserts and one UPDATE for last_online of every reporting device, all
+    committed together.
+    """
+    if not len(batch):
+        return 0
+
+    # render_nulls keeps one parameter set shape, so a batch with gaps is still one executemany
+    db.session.execute(db.insert(WaterMonitoring).execution_options(render_nulls=True), batch.rows())
+    apply_rollups(batch.device_ids, batch.timestamps, batch.values)
+
+    device_ids = np.unique(batch.device_ids).tolist()
+    Device.query.filter(Device.id.in_(device_ids)).update(
+        {Device.last_online: datetime.utcnow()}, synchronize_session=False
+    )
+
+    db.session.commit()
+
+    # Dashboards read the latest values from the shared state store
+    update_device_state(batch)
+
+    # Alerting runs in its own transaction so a failing rule never loses readings
+    try:
+        process_alerts(batch)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error evaluating water alerts: {e}")
+    return len(batch)
+
+
+def write_batches(batches):
+    """Flush handler of the write-behind buffer: all buffered batches in one transaction."""
+    try:
+        write_batch(TelemetryBatch.concat(batches))
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+# Write-behind buffer (see ingest_buffer.py); None = write synchronously
+telemetry_buffer = None
+
+
+def init_telemetry_buffer(app):
+    global telemetry_buffer
+    if not app.config.get('TELEMETRY_WRITE_BEHIND', True):
+        telemetry_buffer = None
+        return None
+    telemetry_buffer = register_shutdown(WriteBehindBuffer(
+        'telemetry',
+        write_batches,
+        capacity=app.config.get('TELEMETRY_BUFFER_CAPACITY', 50000),
+        flush_size=app.config.get('TELEMETRY_FLUSH_SIZE', 2000),
+        flush_interval=app.config.get('TELEMETRY_FLUSH_INTERVAL', 1.0),
+        offer_timeout=app.config.get('TELEMETRY_OFFER_TIMEOUT', 0.5),
+        weight=len,
+        app=app
+    ))
+    return telemetry_buffer
+
+
+def ingest_readings(readings, default_device_code=None):
+    """
+    Validate a batch of readings and store it, through the write-behind
+    buffer when enabled (raises BufferFull under back-pressure) or directly.
+    Returns the TelemetryBatch.
+    """
+    batch = validate_readings(readings, default_device_code=default_device_code)
+    if not len(batch):
+        return batch
+    if telemetry_buffer is not None:
+        telemetry_buffer.offer(batch)
+        batch.queued = True
+        return batch
+    try:
+        write_batch(batch)
+    except Exception:
+        db.session.rollback()
+        raise
+    return batch
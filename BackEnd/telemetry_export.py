@@ -0,0 +1,147 @@
+"""
+Streaming export of raw water telemetry.
+
+Readings are read with a server-side cursor (``yield_per``) in chunks of
+TELEMETRY_EXPORT_CHUNK rows, turned into NumPy columns and encoded chunk by
+chunk, so memory stays flat no matter how long the requested range is.
+
+Formats:
+  - csv:   one header line, then one line per reading (empty cell = not reported)
+  - npz:   a single NumPy .npz archive written as a stream; every chunk is a
+           block of arrays named ``<block>/<column>.npy`` (block = 00000,
+           00001, ...). ``np.load`` reads it like any other .npz file.
+  - arrow: Arrow IPC stream, one record batch per chunk (requires pyarrow)
+"""
+
+import csv
+import importlib.util
+import io
+import zipfile
+
+import numpy as np
+from sqlalchemy import select
+
+from models import WaterMonitoring
+from telemetry import TELEMETRY_FIELDS
+
+COLUMNS = ('device_id', 'timestamp') + TELEMETRY_FIELDS
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'npz': 'application/octet-stream',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+
+def available_formats():
+    formats = ['csv', 'npz']
+    if importlib.util.find_spec('pyarrow') is not None:
+        formats.append('arrow')
+    return formats
+
+
+def iter_chunks(engine, device_ids, start, end, chunk_size=10000):
+    """
+    Yield readings of the given devices in [start, end) as dicts of NumPy
+    columns (timestamp as datetime64[us], metrics as float64 with NaN),
+    ordered by device and time. Uses its own connection, closed when the
+    generator finishes or is closed.
+    """
+    table = WaterMonitoring.__table__
+    stmt = select(*[table.c[name] for name in COLUMNS]).where(
+        table.c.device_id.in_(device_ids),
+        table.c.timestamp >= start,
+        table.c.timestamp < end
+    ).order_by(table.c.device_id, table.c.timestamp)
+
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(stmt)
+        for rows in result.partitions():
+            columns = list(zip(*rows))
+            chunk = {
+                'device_id': np.array(columns[0], dtype=np.int64),
+                'timestamp': np.array(columns[1], dtype='datetime64[us]')
+            }
+            for name, values in zip(TELEMETRY_FIELDS, columns[2:]):
+                chunk[name] = np.array(values, dtype=np.float64)
+            yield chunk
+
+
+def _pop(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def encode_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield _pop(buffer).encode('utf-8')
+
+    for chunk in chunks:
+        columns = [chunk['device_id'].tolist(), np.datetime_as_string(chunk['timestamp'], unit='us').tolist()]
+        for name in TELEMETRY_FIELDS:
+            values = chunk[name]
+            columns.append(np.where(np.isnan(values), '', values.astype(str)).tolist())
+        writer.writerows(zip(*columns))
+        yield _pop(buffer).encode('utf-8')
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only, non-seekable file that collects bytes until they are popped."""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def pop(self):
+        return _pop(self._buffer)
+
+
+def encode_npz(chunks):
+    sink = _StreamSink()
+    # Stored, not deflated: float columns barely compress and this keeps CPU low
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for block, chunk in enumerate(chunks):
+            for name in COLUMNS:
+                with archive.open(f'{block:05d}/{name}.npy', mode='w', force_zip64=True) as member:
+                    np.lib.format.write_array(member, chunk[name], allow_pickle=False)
+            yield sink.pop()
+    yield sink.pop()
+
+
+def encode_arrow(chunks):
+    import pyarrow as pa
+
+    schema = pa.schema(
+        [('device_id', pa.int64()), ('timestamp', pa.timestamp('us'))]
+        + [(name, pa.float64()) for name in TELEMETRY_FIELDS]
+    )
+    sink = _StreamSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema) as writer:
+        for chunk in chunks:
+            arrays = [pa.array(chunk['device_id']), pa.array(chunk['timestamp'])]
+            # NaN -> null, so "not reported" survives the round trip
+            arrays += [pa.array(chunk[name], from_pandas=True) for name in TELEMETRY_FIELDS]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield sink.pop()
+    yield sink.pop()
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'npz': encode_npz,
+    'arrow': encode_arrow
+}
+
+
+def export_readings(engine, device_ids, start, end, fmt='csv', chunk_size=10000):
+    """Generator of encoded bytes for the requested readings."""
+    return ENCODERS[fmt](iter_chunks(engine, device_ids, start, end, chunk_size))
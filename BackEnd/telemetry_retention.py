@@ -0,0 +1,160 @@
+"""
+Retention and compaction of raw water telemetry.
+
+Raw water_monitoring rows older than TELEMETRY_RETENTION_DAYS are deleted;
+history beyond that point is served from water_rollups (1m / 1h / 1d), which
+are kept. Deletes run per device through ix_water_monitoring_device_timestamp
+in batches of TELEMETRY_RETENTION_BATCH rows, each in its own short
+transaction with a pause in between, so ingestion and the web app never wait
+long for the write lock.
+
+Freed pages are returned to the filesystem with PRAGMA incremental_vacuum,
+also in small steps. That requires the database to be in auto_vacuum =
+INCREMENTAL mode; switching an existing file needs one full VACUUM
+(``enable_incremental_vacuum``), which locks the database while it runs.
+Without it, freed pages stay in the file and are reused by new rows.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from models import db, WaterMonitoring
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _pragma(name):
+    return db.session.execute(text(f'PRAGMA {name}')).scalar()
+
+
+def database_stats():
+    """Page counts and on-disk sizes of the main database file and its WAL."""
+    page_size = _pragma('page_size')
+    stats = {
+        'page_size': page_size,
+        'page_count': _pragma('page_count'),
+        'freelist_count': _pragma('freelist_count'),
+        'auto_vacuum': _pragma('auto_vacuum'),
+        'file_bytes': None,
+        'wal_bytes': None
+    }
+    path = db.engine.url.database
+    if path and path != ':memory:' and os.path.exists(path):
+        stats['file_bytes'] = os.path.getsize(path)
+        wal = path + '-wal'
+        stats['wal_bytes'] = os.path.getsize(wal) if os.path.exists(wal) else 0
+    return stats
+
+
+def delete_expired_readings(cutoff, batch_size=5000, pause=0.05, log=print):
+    """
+    Delete raw readings with timestamp < cutoff, device by device in batches.
+    Every batch is committed separately. Returns the number of rows deleted.
+    """
+    delete = text(
+        'DELETE FROM water_monitoring WHERE id IN ('
+        ' SELECT id FROM water_monitoring'
+        ' WHERE device_id = :device_id AND timestamp < :cutoff'
+        ' LIMIT :batch)'
+    )
+    device_ids = [row[0] for row in db.session.query(WaterMonitoring.device_id).distinct().all()]
+
+    deleted = 0
+    for device_id in device_ids:
+        device_deleted = 0
+        while True:
+            result = db.session.execute(delete, {'device_id': device_id, 'cutoff': cutoff, 'batch': batch_size})
+            db.session.commit()
+            device_deleted += result.rowcount
+            if result.rowcount < batch_size:
+                break
+            time.sleep(pause)
+        if device_deleted:
+            log(f"   device {device_id}: {device_deleted} rows")
+        deleted += device_deleted
+    return deleted
+
+
+def incremental_vacuum(step_pages=1000, pause=0.05):
+    """Release free pages to the filesystem in steps. Returns the number of pages released."""
+    if _pragma('auto_vacuum') != AUTO_VACUUM_INCREMENTAL:
+        return 0
+
+    released = 0
+    while True:
+        before = _pragma('freelist_count')
+        if not before:
+            break
+        # The pragma frees one page per step and returns no columns, so
+        # sqlite3's execute() would step it only once; executescript() runs it
+        # to completion
+        db.session.commit()
+        raw = db.session.connection().connection.driver_connection
+        raw.executescript(f'PRAGMA incremental_vacuum({int(step_pages)})')
+        db.session.commit()
+        after = _pragma('freelist_count')
+        if after >= before:
+            break
+        released += before - after
+        time.sleep(pause)
+    return released
+
+
+def enable_incremental_vacuum():
+    """Switch the database to auto_vacuum = INCREMENTAL (runs a full VACUUM once)."""
+    if _pragma('auto_vacuum') == AUTO_VACUUM_INCREMENTAL:
+        return False
+    db.session.commit()
+    with db.engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        conn.execute(text('PRAGMA auto_vacuum = INCREMENTAL'))
+        conn.execute(text('VACUUM'))
+    return True
+
+
+def checkpoint_wal():
+    """Fold the WAL back into the database and truncate it."""
+    db.session.commit()
+    with db.engine.connect() as conn:
+        conn.execution_options(isolation_level='AUTOCOMMIT').execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+
+
+def compact_telemetry(retention_days, batch_size=5000, pause=0.05, vacuum_step_pages=1000, log=print):
+    """
+    Apply the retention policy and compact the database.
+    Returns a report with rows removed and space reclaimed.
+    """
+    started = time.monotonic()
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    before = database_stats()
+
+    log(f"📝 Deleting raw readings older than {cutoff.isoformat()} ({retention_days} days)...")
+    deleted = delete_expired_readings(cutoff, batch_size=batch_size, pause=pause, log=log)
+
+    freed_pages = _pragma('freelist_count')
+    released_pages = incremental_vacuum(step_pages=vacuum_step_pages, pause=pause)
+    checkpoint_wal()
+    after = database_stats()
+
+    def reclaimed(key):
+        if before[key] is None or after[key] is None:
+            return None
+        return before[key] - after[key]
+
+    return {
+        'cutoff': cutoff.isoformat(),
+        'rows_deleted': deleted,
+        'remaining_rows': WaterMonitoring.query.count(),
+        'free_pages': freed_pages,
+        'released_pages': released_pages,
+        'bytes_reclaimed': released_pages * after['page_size'],
+        'file_bytes_before': before['file_bytes'],
+        'file_bytes_after': after['file_bytes'],
+        'file_bytes_reclaimed': reclaimed('file_bytes'),
+        'wal_bytes_reclaimed': reclaimed('wal_bytes'),
+        'incremental_vacuum': after['auto_vacuum'] == AUTO_VACUUM_INCREMENTAL,
+        'seconds': round(time.monotonic() - started, 2)
+    }
@@ -0,0 +1,249 @@
+"""
+Time-bucketed rollups of water telemetry.
+
+For every device, readings are folded into 1-minute, 1-hour and 1-day buckets
+(water_rollups) keeping min / max / sum / count / last per metric. Ingestion
+calls ``apply_rollups`` with each accepted batch: the batch is aggregated with
+NumPy and merged into the stored buckets with one INSERT ... ON CONFLICT DO
+UPDATE per resolution, in the same transaction as the raw INSERT.
+
+History queries go through ``query_history``, which serves a time window from
+the finest resolution that fits the caller's point budget, so a 7-day or
+30-day chart costs a few hundred rows no matter how many raw readings exist.
+``downsample_window`` instead reduces the raw readings of a window to a
+shape-preserving subset per metric (LTTB or min/max, see downsample.py).
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import and_, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, WaterMonitoring, WaterRollup
+from downsample import downsample_indices
+
+# Finest first
+RESOLUTIONS = OrderedDict([
+    ('1m', 60),
+    ('1h', 3600),
+    ('1d', 86400)
+])
+
+METRICS = WaterRollup.METRICS
+
+
+def _epoch_to_datetimes(seconds):
+    return (np.asarray(seconds, dtype=np.float64) * 1e6).round().astype('int64').astype('datetime64[us]').tolist()
+
+
+def aggregate(device_ids, timestamps, values, resolution):
+    """
+    Aggregate readings into buckets of `resolution` seconds.
+
+    device_ids / timestamps (UTC epoch seconds) are 1-D arrays and values maps
+    metric -> float array with NaN for "not reported". Returns a list of row
+    dicts for water_rollups, one per (device, bucket).
+    """
+    if len(device_ids) == 0:
+        return []
+
+    # Sort by time so "last" is simply the highest position in each group
+    order = np.argsort(timestamps, kind='stable')
+    device_ids = np.asarray(device_ids, dtype=np.int64)[order]
+    timestamps = np.asarray(timestamps, dtype=np.float64)[order]
+
+    buckets = (np.floor(timestamps / resolution) * resolution).astype(np.int64)
+    keys, groups = np.unique(np.stack([device_ids, buckets], axis=1), axis=0, return_inverse=True)
+    groups = groups.ravel()
+    n = len(keys)
+
+    last_ts = np.full(n, -np.inf)
+    np.maximum.at(last_ts, groups, timestamps)
+
+    columns = {
+        'device_id': keys[:, 0].tolist(),
+        'resolution': [resolution] * n,
+        'bucket_start': _epoch_to_datetimes(keys[:, 1]),
+        'reading_count': np.bincount(groups, minlength=n).tolist(),
+        'last_timestamp': _epoch_to_datetimes(last_ts)
+    }
+
+    for metric in METRICS:
+        column = np.asarray(values[metric], dtype=np.float64)[order]
+        valid = ~np.isnan(column)
+        positions = np.flatnonzero(valid)
+        idx = groups[valid]
+        metric_values = column[valid]
+
+        count = np.bincount(idx, minlength=n)
+        total = np.bincount(idx, weights=metric_values, minlength=n)
+        low = np.full(n, np.inf)
+        np.minimum.at(low, idx, metric_values)
+        high = np.full(n, -np.inf)
+        np.maximum.at(high, idx, metric_values)
+        last_pos = np.full(n, -1, dtype=np.int64)
+        np.maximum.at(last_pos, idx, positions)
+
+        has_value = count > 0
+        columns[f'{metric}_min'] = np.where(has_value, low, None).tolist()
+        columns[f'{metric}_max'] = np.where(has_value, high, None).tolist()
+        columns[f'{metric}_sum'] = total.tolist()
+        columns[f'{metric}_count'] = count.tolist()
+        columns[f'{metric}_last'] = np.where(has_value, column[np.maximum(last_pos, 0)], None).tolist()
+
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def _upsert_statement():
+    table = WaterRollup.__table__
+    stmt = sqlite_insert(table)
+    excluded = stmt.excluded
+    c = table.c
+
+    newer = excluded.last_timestamp >= c.last_timestamp
+    updates = {
+        'reading_count': c.reading_count + excluded.reading_count,
+        'last_timestamp': func.max(c.last_timestamp, excluded.last_timestamp)
+    }
+    for metric in METRICS:
+        old_min, new_min = c[f'{metric}_min'], excluded[f'{metric}_min']
+        old_max, new_max = c[f'{metric}_max'], excluded[f'{metric}_max']
+        old_last, new_last = c[f'{metric}_last'], excluded[f'{metric}_last']
+        # SQLite's scalar min()/max() return NULL if any argument is NULL
+        updates[f'{metric}_min'] = func.min(func.coalesce(old_min, new_min), func.coalesce(new_min, old_min))
+        updates[f'{metric}_max'] = func.max(func.coalesce(old_max, new_max), func.coalesce(new_max, old_max))
+        updates[f'{metric}_sum'] = c[f'{metric}_sum'] + excluded[f'{metric}_sum']
+        updates[f'{metric}_count'] = c[f'{metric}_count'] + excluded[f'{metric}_count']
+        updates[f'{metric}_last'] = db.case(
+            (and_(newer, new_last.isnot(None)), new_last),
+            else_=func.coalesce(old_last, new_last)
+        )
+
+    return stmt.on_conflict_do_update(
+        index_elements=['device_id', 'resolution', 'bucket_start'],
+        set_=updates
+    )
+
+
+def apply_rollups(device_ids, timestamps, values):
+    """
+    Merge a batch of readings into every rollup resolution. Runs in the
+    caller's transaction; the caller commits.
+    """
+    if len(device_ids) == 0:
+        return 0
+    stmt = _upsert_statement()
+    touched = 0
+    for resolution in RESOLUTIONS.values():
+        rows = aggregate(device_ids, timestamps, values, resolution)
+        if rows:
+            db.session.execute(stmt, rows)
+            touched += len(rows)
+    return touched
+
+
+def pick_resolution(window_seconds, max_points):
+    """Finest rollup resolution that covers the window in at most max_points buckets."""
+    for name, seconds in RESOLUTIONS.items():
+        if window_seconds / seconds <= max_points:
+            return name
+    return next(reversed(RESOLUTIONS))
+
+
+def query_history(device_id, start, end, max_points=500, resolution='auto'):
+    """
+    Rollup buckets for one device between start and end (naive UTC datetimes).
+    resolution is '1m', '1h', '1d' or 'auto' (chosen from the point budget).
+    Returns (resolution name, list of bucket dicts).
+    """
+    if resolution == 'auto':
+        resolution = pick_resolution((end - start).total_seconds(), max_points)
+    seconds = RESOLUTIONS[resolution]
+
+    # Include the bucket that contains `start`
+    epoch = datetime(1970, 1, 1)
+    first_bucket = epoch + timedelta(seconds=((start - epoch).total_seconds() // seconds) * seconds)
+
+    rows = WaterRollup.query.filter(
+        WaterRollup.device_id == device_id,
+        WaterRollup.resolution == seconds,
+        WaterRollup.bucket_start >= first_bucket,
+        WaterRollup.bucket_start < end
+    ).order_by(WaterRollup.bucket_start).all()
+
+    return resolution, [row.to_dict() for row in rows]
+
+
+def downsample_window(device_id, start, end, points, method='lttb'):
+    """
+    Raw readings of one device between start and end, reduced to about
+    `points` points per metric. Each metric is downsampled on its own (readings
+    that did not report it are skipped), so every series keeps its peaks.
+    Returns (number of raw readings, {metric: {'timestamps': [...], 'values': [...]}}).
+    """
+    columns = [WaterMonitoring.timestamp] + [getattr(WaterMonitoring, metric) for metric in METRICS]
+    rows = db.session.query(*columns).filter(
+        WaterMonitoring.device_id == device_id,
+        WaterMonitoring.timestamp >= start,
+        WaterMonitoring.timestamp < end
+    ).order_by(WaterMonitoring.timestamp).all()
+
+    if not rows:
+        return 0, {metric: {'timestamps': [], 'values': []} for metric in METRICS}
+
+    series = {}
+    stamps = np.array([row[0] for row in rows], dtype='datetime64[us]')
+    x = stamps.astype('int64') / 1e6
+    for position, metric in enumerate(METRICS, start=1):
+        y = np.array([row[position] for row in rows], dtype=np.float64)
+        keep = downsample_indices(x, y, points, method)
+        series[metric] = {
+            'timestamps': [stamp.isoformat() for stamp in stamps[keep].tolist()],
+            'values': y[keep].tolist()
+        }
+
+    return len(rows), series
+
+
+def rebuild_rollups(device_id=None, chunk_size=50000):
+    """
+    Recompute rollups from raw water_monitoring rows (all devices, or one).
+    Streams the raw table in id order so memory stays bounded.
+    Returns the number of raw readings processed.
+    """
+    delete = WaterRollup.query
+    if device_id is not None:
+        delete = delete.filter(WaterRollup.device_id == device_id)
+    delete.delete(synchronize_session=False)
+
+    columns = [WaterMonitoring.id, WaterMonitoring.device_id, WaterMonitoring.timestamp]
+    columns += [getattr(WaterMonitoring, metric) for metric in METRICS]
+
+    processed = 0
+    last_id = 0
+    while True:
+        query = db.session.query(*columns).filter(WaterMonitoring.id > last_id)
+        if device_id is not None:
+            query = query.filter(WaterMonitoring.device_id == device_id)
+        rows = query.order_by(WaterMonitoring.id).limit(chunk_size).all()
+        if not rows:
+            break
+
+        last_id = rows[-1].id
+        rows = [row for row in rows if row.timestamp is not None]
+        if rows:
+            stamps = np.array([row.timestamp for row in rows], dtype='datetime64[us]')
+            timestamps = stamps.astype('int64') / 1e6
+            device_ids = np.array([row.device_id for row in rows], dtype=np.int64)
+            values = {
+                metric: np.array([getattr(row, metric) for row in rows], dtype=np.float64)
+                for metric in METRICS
+            }
+            apply_rollups(device_ids, timestamps, values)
+            processed += len(rows)
+        db.session.commit()
+
+    return processed
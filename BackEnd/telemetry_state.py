@@ -0,0 +1,489 @@
+"""
+Latest-state store for device dashboards.
+
+One fixed-size record per device id (latest value and trend of every water
+metric, robot status, battery, last cleaning) lives in a memory-mapped file,
+so every gunicorn worker on the host sees the same state without any SQL.
+
+  - Writers (telemetry ingestion, cleaning start/stop) serialize on a file
+    lock (flock, msvcrt.locking on Windows) plus a thread lock and bump a
+    per-record sequence number around each write (odd = write in progress).
+  - Readers never lock: they copy the record and retry if the sequence number
+    was odd or changed meanwhile (a seqlock).
+
+Trend = latest value minus the mean of the previous trend window
+(TELEMETRY_TREND_WINDOW seconds, 10 minutes by default).
+
+Devices that have no record yet (fresh file, or state created before the
+device reported through ingestion) are seeded from the database once.
+Without a usable file lock the store is disabled and dashboards read from the
+database.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+from models import Device, WaterMonitoring, CleaningHistory, WaterRollup
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    # msvcrt locks bytes from the current position; LK_LOCK gives up after ~10 s
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.01)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+METRICS = WaterRollup.METRICS
+ROBOT_STATUSES = ('idle', 'cleaning', 'charging', 'error')
+
+# Bump when the record layout changes; the file name carries it
+LAYOUT_VERSION = 1
+
+FLAG_WATER = 1   # water metrics initialised (from ingestion or the database)
+FLAG_ROBOT = 2   # robot fields initialised
+
+
+def _record_dtype():
+    fields = [
+        ('seq', 'u8'),
+        ('flags', 'u8'),
+        ('reading_at', 'f8'),       # epoch seconds of the newest reading
+        ('window_start', 'f8'),     # start of the current trend window
+        ('robot_status', 'i8'),     # index into ROBOT_STATUSES, -1 = unknown
+        ('battery', 'i8'),          # percent, -1 = unknown
+        ('robot_at', 'f8'),
+        ('last_cleaning_at', 'f8')
+    ]
+    for metric in METRICS:
+        fields += [
+            (metric, 'f8'),                 # latest value
+            (f'{metric}_window_sum', 'f8'),
+            (f'{metric}_window_count', 'f8'),
+            (f'{metric}_prev_mean', 'f8')   # mean of the previous window
+        ]
+    return np.dtype(fields)
+
+
+RECORD = _record_dtype()
+
+
+def _to_datetime(epoch):
+    if not epoch or np.isnan(epoch):
+        return None
+    return datetime.fromtimestamp(float(epoch), timezone.utc).replace(tzinfo=None)
+
+
+def _to_epoch(value):
+    if value is None:
+        return np.nan
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class DeviceStateStore:
+    def __init__(self, path, capacity=16384, trend_window=600):
+        self.path = path
+        self.capacity = int(capacity)
+        self.trend_window = float(trend_window)
+        self._thread_lock = threading.Lock()
+        self._lock_file = None
+        self._lock_pid = None
+        self._records = None
+
+    # --- setup -------------------------------------------------------------
+
+    def open(self):
+        if fcntl is None and msvcrt is None:
+            raise OSError('no file locking available on this platform')
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        size = self.capacity * RECORD.itemsize
+        with self._write_lock():
+            if not os.path.exists(self.path) or os.path.getsize(self.path) != size:
+                # Sparse zero-filled file; a zero record means "no state"
+                with open(self.path, 'wb') as f:
+                    f.truncate(size)
+        self._records = np.memmap(self.path, dtype=RECORD, mode='r+', shape=(self.capacity,))
+        return self
+
+    @contextmanager
+    def _write_lock(self):
+        # File locks are per open file: forked workers must not share the parent's descriptor
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self.path + '.lock', 'a+')
+            self._lock_pid = os.getpid()
+        with self._thread_lock:
+            _lock_file(self._lock_file)
+            try:
+                yield
+            finally:
+                _unlock_file(self._lock_file)
+
+    def _begin(self, index):
+        self._records['seq'][index] += 1
+
+    def _end(self, index):
+        self._records['seq'][index] += 1
+
+    def in_range(self, device_id):
+        return 0 < device_id < self.capacity
+
+    # --- reads -------------------------------------------------------------
+
+    def _snapshot(self, index, retries=100):
+        seq = self._records['seq']
+        for _ in range(retries):
+            before = int(seq[index])
+            if before % 2:
+                continue
+            record = self._records[index].copy()
+            if int(seq[index]) == before:
+                return record
+        # A writer kept the record busy; take it under the lock instead
+        with self._write_lock():
+            return self._records[index].copy()
+
+    def version(self, device_id):
+        """
+        Sequence number of a complete record, or None. It changes with every
+        write, so it is a cheap version of the device's state (for ETags).
+        """
+        if not self.in_range(device_id):
+            return None
+        record = self._snapshot(device_id)
+        if int(record['flags']) & (FLAG_WATER | FLAG_ROBOT) != FLAG_WATER | FLAG_ROBOT:
+            return None
+        return int(record['seq'])
+
+    def read(self, device_id):
+        """Dashboard state of one device, or None if nothing is stored for it."""
+        if not self.in_range(device_id):
+            return None
+        record = self._snapshot(device_id)
+        flags = int(record['flags'])
+        if not flags:
+            return None
+
+        metrics = {}
+        for metric in METRICS:
+            value = float(record[metric])
+            prev = float(record[f'{metric}_prev_mean'])
+            metrics[metric] = {
+                'value': None if np.isnan(value) else value,
+                'trend': None if np.isnan(value) or np.isnan(prev) else value - prev
+            }
+
+        status_index = int(record['robot_status'])
+        battery = int(record['battery'])
+        return {
+            'device_id': device_id,
+            'has_water': bool(flags & FLAG_WATER),
+            'has_robot': bool(flags & FLAG_ROBOT),
+            'reading_at': _to_datetime(record['reading_at']),
+            'metrics': metrics,
+            'robot_status': ROBOT_STATUSES[status_index] if 0 <= status_index < len(ROBOT_STATUSES) else None,
+            'battery': battery if battery >= 0 else None,
+            'robot_at': _to_datetime(record['robot_at']),
+            'last_cleaning_at': _to_datetime(record['last_cleaning_at'])
+        }
+
+    # --- writes ------------------------------------------------------------
+
+    def _init_record(self, index):
+        record = self._records[index]
+        if int(record['flags']) == 0:
+            record['reading_at'] = np.nan
+            record['window_start'] = np.nan
+            record['robot_status'] = -1
+            record['battery'] = -1
+            record['robot_at'] = np.nan
+            record['last_cleaning_at'] = np.nan
+            for metric in METRICS:
+                record[metric] = np.nan
+                record[f'{metric}_window_sum'] = 0.0
+                record[f'{metric}_window_count'] = 0.0
+                record[f'{metric}_prev_mean'] = np.nan
+        return record
+
+    def apply_readings(self, device_ids, timestamps, values):
+        """
+        Fold a batch of readings (arrays as produced by telemetry validation)
+        into the per-device state. Readings are grouped per device and trend
+        window with NumPy; only the per-device merge is a Python loop.
+        """
+        if len(device_ids) == 0:
+            return
+        device_ids = np.asarray(device_ids, dtype=np.int64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        order = np.lexsort((timestamps, device_ids))
+        device_ids, timestamps = device_ids[order], timestamps[order]
+        columns = {metric: np.asarray(values[metric], dtype=np.float64)[order] for metric in METRICS}
+        windows = np.floor(timestamps / self.trend_window) * self.trend_window
+
+        # Contiguous slices per device, and per (device, window) inside them
+        device_starts = np.flatnonzero(np.r_[True, device_ids[1:] != device_ids[:-1]])
+        device_ends = np.r_[device_starts[1:], len(device_ids)]
+        window_starts = np.flatnonzero(np.r_[True, (device_ids[1:] != device_ids[:-1]) | (windows[1:] != windows[:-1])])
+        window_sums = {}
+        window_counts = {}
+        for metric, column in columns.items():
+            valid = ~np.isnan(column)
+            window_sums[metric] = np.add.reduceat(np.where(valid, column, 0.0), window_starts)
+            window_counts[metric] = np.add.reduceat(valid.astype(np.float64), window_starts)
+        window_index = {start: i for i, start in enumerate(window_starts.tolist())}
+
+        with self._write_lock():
+            for start, end in zip(device_starts.tolist(), device_ends.tolist()):
+                device_id = int(device_ids[start])
+                if not self.in_range(device_id):
+                    continue
+                self._begin(device_id)
+                try:
+                    record = self._init_record(device_id)
+                    self._merge_device(record, start, end, timestamps, windows, columns,
+                                       window_index, window_sums, window_counts)
+                finally:
+                    self._end(device_id)
+
+    def _merge_device(self, record, start, end, timestamps, windows, columns,
+                      window_index, window_sums, window_counts):
+        # Latest values (ignore batches older than what is already stored)
+        newest = timestamps[end - 1]
+        reading_at = float(record['reading_at'])
+        if np.isnan(reading_at) or newest >= reading_at:
+            record['reading_at'] = newest
+            for metric, column in columns.items():
+                valid = np.flatnonzero(~np.isnan(column[start:end]))
+                if len(valid):
+                    record[metric] = column[start + valid[-1]]
+
+        # Trend windows, oldest first
+        for position in range(start, end):
+            if position != start and windows[position] == windows[position - 1]:
+                continue
+            window = windows[position]
+            current = float(record['window_start'])
+            i = window_index[position]
+            if np.isnan(current) or window > current:
+                # New window: the current one becomes "previous"
+                for metric in METRICS:
+                    count = float(record[f'{metric}_window_count'])
+                    if count:
+                        record[f'{metric}_prev_mean'] = record[f'{metric}_window_sum'] / count
+                    record[f'{metric}_window_sum'] = window_sums[metric][i]
+                    record[f'{metric}_window_count'] = window_counts[metric][i]
+                record['window_start'] = window
+            elif window == current:
+                for metric in METRICS:
+                    record[f'{metric}_window_sum'] += window_sums[metric][i]
+                    record[f'{metric}_window_count'] += window_counts[metric][i]
+            # Windows older than the current one no longer affect the trend
+
+        record['flags'] = int(record['flags']) | FLAG_WATER
+
+    def set_robot(self, device_id, status=None, battery=None, last_cleaning_at=None, at=None):
+        """Update robot fields of one device; None leaves a field unchanged."""
+        if not self.in_range(device_id):
+            return
+        with self._write_lock():
+            self._begin(device_id)
+            try:
+                record = self._init_record(device_id)
+                if status is not None:
+                    record['robot_status'] = ROBOT_STATUSES.index(status) if status in ROBOT_STATUSES else -1
+                if battery is not None:
+                    record['battery'] = int(battery)
+                if last_cleaning_at is not None:
+                    record['last_cleaning_at'] = _to_epoch(last_cleaning_at)
+                record['robot_at'] = _to_epoch(at or datetime.utcnow())
+                record['flags'] = int(record['flags']) | FLAG_ROBOT
+            finally:
+                self._end(device_id)
+
+    def seed(self, device_id, latest_reading=None, previous_mean=None, robot_status=None,
+             battery=None, last_cleaning_at=None):
+        """Initialise a device from the database (only fields not set yet)."""
+        if not self.in_range(device_id):
+            return
+        with self._write_lock():
+            self._begin(device_id)
+            try:
+                record = self._init_record(device_id)
+                flags = int(record['flags'])
+                if not flags & FLAG_WATER:
+                    if latest_reading is not None:
+                        record['reading_at'] = _to_epoch(latest_reading.timestamp)
+                        for metric in METRICS:
+                            value = getattr(latest_reading, metric)
+                            record[metric] = np.nan if value is None else value
+                            mean = (previous_mean or {}).get(metric)
+                            record[f'{metric}_prev_mean'] = np.nan if mean is None else mean
+                    flags |= FLAG_WATER
+                if not flags & FLAG_ROBOT:
+                    record['robot_status'] = ROBOT_STATUSES.index(robot_status) if robot_status in ROBOT_STATUSES else -1
+                    record['battery'] = -1 if battery is None else int(battery)
+                    record['last_cleaning_at'] = _to_epoch(last_cleaning_at)
+                    flags |= FLAG_ROBOT
+                record['flags'] = flags
+            finally:
+                self._end(device_id)
+
+    def clear(self, device_id):
+        """Forget a device (e.g. its id was reused by a new device)."""
+        if not self.in_range(device_id):
+            return
+        with self._write_lock():
+            self._begin(device_id)
+            try:
+                seq = int(self._records['seq'][device_id])
+                self._records[device_id] = np.zeros((), dtype=RECORD)
+                self._records['seq'][device_id] = seq
+            finally:
+                self._end(device_id)
+
+
+state_store = None
+
+
+def init_state_store(app):
+    global state_store
+    path = app.config.get('TELEMETRY_STATE_PATH') or os.path.join(
+        app.instance_path, f'telemetry_state.v{LAYOUT_VERSION}.bin')
+    try:
+        state_store = DeviceStateStore(
+            path,
+            capacity=app.config.get('TELEMETRY_STATE_CAPACITY', 16384),
+            trend_window=app.config.get('TELEMETRY_TREND_WINDOW', 600)
+        ).open()
+    except OSError as e:
+        print(f"WARNING: Device state store unavailable ({e}), dashboards will query the database")
+        state_store = None
+    return state_store
+
+
+def _state_from_database(device_id):
+    """Build the dashboard state with SQL (cold start / no store)."""
+    device = Device.query.get(device_id)
+    latest = WaterMonitoring.query.filter_by(device_id=device_id)\
+        .order_by(WaterMonitoring.timestamp.desc()).first()
+    last_cleaning = CleaningHistory.query.filter(
+        CleaningHistory.device_id == device_id,
+        CleaningHistory.completed_at.isnot(None)
+    ).order_by(CleaningHistory.completed_at.desc()).first()
+
+    previous_mean = {}
+    if latest is not None:
+        # Mean of the 1-minute buckets in the previous trend window
+        from telemetry_rollups import RESOLUTIONS
+        window = state_store.trend_window if state_store else 600
+        window_start = _to_epoch(latest.timestamp) // window * window
+        rows = WaterRollup.query.filter(
+            WaterRollup.device_id == device_id,
+            WaterRollup.resolution == RESOLUTIONS['1m'],
+            WaterRollup.bucket_start >= _to_datetime(window_start - window),
+            WaterRollup.bucket_start < _to_datetime(window_start)
+        ).all()
+        for metric in METRICS:
+            total = sum(getattr(row, f'{metric}_sum') for row in rows)
+            count = sum(getattr(row, f'{metric}_count') for row in rows)
+            previous_mean[metric] = total / count if count else None
+
+    return device, latest, previous_mean, last_cleaning.completed_at if last_cleaning else None
+
+
+def get_state_version(device_id):
+    """Version of the stored dashboard state of a device; None when it is not in the store."""
+    if state_store is None:
+        return None
+    return state_store.version(device_id)
+
+
+def get_device_state(device_id):
+    """
+    Dashboard state of a device: from the shared store, seeding it from the
+    database the first time a device is seen.
+    """
+    if state_store is not None:
+        state = state_store.read(device_id)
+        if state is not None and state['has_water'] and state['has_robot']:
+            return state
+
+    device, latest, previous_mean, last_cleaning_at = _state_from_database(device_id)
+    if device is None:
+        return None
+
+    if state_store is not None and state_store.in_range(device_id):
+        state_store.seed(device_id, latest, previous_mean, device.robot_status,
+                         device.battery_level, last_cleaning_at)
+        return state_store.read(device_id)
+
+    # Outside the store's capacity: answer straight from the database
+    metrics = {}
+    for metric in METRICS:
+        value = getattr(latest, metric) if latest is not None else None
+        prev = previous_mean.get(metric)
+        metrics[metric] = {
+            'value': value,
+            'trend': value - prev if value is not None and prev is not None else None
+        }
+    return {
+        'device_id': device_id,
+        'has_water': True,
+        'has_robot': True,
+        'reading_at': latest.timestamp if latest is not None else None,
+        'metrics': metrics,
+        'robot_status': device.robot_status,
+        'battery': device.battery_level,
+        'robot_at': None,
+        'last_cleaning_at': last_cleaning_at
+    }
+
+
+def update_device_state(batch):
+    """Push an ingested TelemetryBatch into the shared store (best effort)."""
+    if state_store is None:
+        return
+    try:
+        state_store.apply_readings(batch.device_ids, batch.timestamps, batch.values)
+    except Exception as e:
+        print(f"❌ Error updating device state: {e}")
+
+
+def update_robot_state(device_id, **fields):
+    if state_store is None:
+        return
+    try:
+        state_store.set_robot(device_id, **fields)
+    except Exception as e:
+        print(f"❌ Error updating robot state: {e}")
+
+
+def clear_device_state(device_id):
+    if state_store is not None:
+        state_store.clear(device_id)
@@ -0,0 +1,87 @@
+"""Test InferenceWorkerPool with more frames than shared-memory slots, in-process and from forked workers"""
+import os
+
+import numpy as np
+
+import inference_backends
+from inference_pool import InferenceWorkerPool
+
+
+class EchoBackend:
+    """Stand-in model: one detection per frame whose confidence is the frame's first pixel."""
+    name = 'echo'
+
+    def __init__(self, model_path, input_size=32, **kwargs):
+        self.input_size = input_size
+
+    def load(self):
+        return self
+
+    def predict(self, frames):
+        return [[{'bbox': [0, 0, 1, 1], 'confidence': float(frame[0, 0, 0]), 'class': 'echo'}]
+                for frame in frames]
+
+
+# Registered before the pool forks its workers, so they see it too
+inference_backends.BACKENDS['echo'] = EchoBackend
+
+
+def start_pool():
+    return InferenceWorkerPool(None, backend_name='echo', backend_settings={'input_size': 32},
+                               num_workers=1, max_batch_size=2, num_slots=4, timeout=2).start()
+
+
+def run_frames(pool, count=40):
+    frames = [np.full((32, 32, 3), i, dtype=np.uint8) for i in range(count)]
+    assert len(frames) > pool.num_slots
+
+    results = pool.infer_many(frames)
+    assert [detections[0]['confidence'] for detections in results] == list(range(count))
+
+    # One frame at a time, as /api/detect_disease does
+    for i in range(count):
+        assert pool.infer(frames[i])[0]['confidence'] == i
+
+
+def run_in_fork(pool):
+    """Run run_frames in an os.fork() child, the way gunicorn --preload workers use the pool."""
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            run_frames(pool)
+            code = 0
+        except BaseException as e:
+            print(f"✗ Forked worker failed: {e!r}")
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+
+def test_infer_many_more_frames_than_slots():
+    pool = start_pool()
+    try:
+        run_frames(pool)
+        # Every slot was released again
+        assert pool.free_slots() == pool.num_slots
+    finally:
+        pool.shutdown()
+
+
+def test_forked_workers_release_slots():
+    pool = start_pool()
+    try:
+        # Two workers one after the other: slots released in the first must be usable by the second
+        assert run_in_fork(pool) == 0
+        assert run_in_fork(pool) == 0
+        assert pool.free_slots() == pool.num_slots
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    test_infer_many_more_frames_than_slots()
+    print("✅ infer_many handled more frames than slots")
+    test_forked_workers_release_slots()
+    print("✅ Forked workers released every slot")
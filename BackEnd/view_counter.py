@@ -0,0 +1,87 @@
+"""
+Write-behind page view counters (forum topics, Fishpedia articles).
+
+Incrementing ``views`` and committing on every page view took SQLite's
+single writer lock once per read, which under load made reads fail with
+"database is locked" (so the forum stopped counting views altogether).
+Instead, a view is queued in a write-behind buffer (ingest_buffer.py) and
+the flush thread aggregates the queued views per row and writes them with
+one executemany ``UPDATE ... SET views = views + :delta`` per table and one
+commit, every VIEW_FLUSH_INTERVAL seconds or VIEW_FLUSH_SIZE views.
+
+Views are best effort: when the buffer is full the view is dropped (counted
+in the buffer's ``rejected``) rather than failing or slowing the page, and
+views still buffered when a worker is killed without a normal shutdown are
+lost. The UPDATE is plain SQL, so counting a view does not touch updated_at.
+"""
+
+from collections import Counter
+
+from sqlalchemy import text
+
+from ingest_buffer import BufferFull, WriteBehindBuffer, register_shutdown
+from models import db
+
+# kind -> table with a views column
+VIEW_TABLES = {
+    'topic': 'forum_topics',
+    'fish': 'fish_species'
+}
+
+_UPDATES = {
+    kind: text(f'UPDATE {table} SET views = COALESCE(views, 0) + :delta WHERE id = :id')
+    for kind, table in VIEW_TABLES.items()
+}
+
+# Write-behind buffer; None = write synchronously
+view_buffer = None
+
+
+def write_views(views):
+    """Persist queued (kind, row id) views: one UPDATE batch per table, one commit."""
+    counts = Counter(views)
+    if not counts:
+        return 0
+    try:
+        for kind, statement in _UPDATES.items():
+            rows = [{'id': row_id, 'delta': delta} for (view_kind, row_id), delta in counts.items()
+                    if view_kind == kind]
+            if rows:
+                db.session.execute(statement, rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(counts)
+
+
+def init_view_buffer(app):
+    global view_buffer
+    if not app.config.get('VIEW_WRITE_BEHIND', True):
+        view_buffer = None
+        return None
+    view_buffer = register_shutdown(WriteBehindBuffer(
+        'views',
+        write_views,
+        capacity=app.config.get('VIEW_BUFFER_CAPACITY', 100000),
+        flush_size=app.config.get('VIEW_FLUSH_SIZE', 20000),
+        flush_interval=app.config.get('VIEW_FLUSH_INTERVAL', 10.0),
+        offer_timeout=0,
+        app=app
+    ))
+    return view_buffer
+
+
+def record_view(kind, row_id):
+    """Count one view of a topic / article. Never raises; a failed count is logged."""
+    if kind not in VIEW_TABLES:
+        raise ValueError(f"kind must be one of {', '.join(VIEW_TABLES)}")
+    try:
+        if view_buffer is not None:
+            view_buffer.offer((kind, row_id))
+        else:
+            write_views([(kind, row_id)])
+    except BufferFull:
+        pass
+    except Exception as e:
+        print(f"⚠️ Could not update views: {e}")
@@ -0,0 +1,304 @@
+"""
+Water-quality alerting for ingested telemetry.
+
+Every accepted batch is evaluated against the alert rules of its devices
+(water_alert_rules: built-in defaults below, overridden by a default row with
+device_id NULL, overridden again per device). Per metric the batch is sorted
+by (device, time) once and all rules are applied as array operations:
+
+  - thresholds with hysteresis: a reading above `high` (below `low`) raises
+    the level; it only returns to normal once a reading is back inside
+    [low + hysteresis, high - hysteresis]. Readings in between keep the level.
+    The level at every row is a forward fill of these events within the
+    device's group, seeded with the level stored from the previous batch.
+  - rate of change: |delta value / delta minutes| between consecutive readings
+    of a device (the first one compared with the stored last reading) above
+    `max_rate`.
+
+A device/metric alerts at most once per batch and not again within its rule's
+cooldown. Levels, last readings and alert times are stored in
+water_alert_states, and the resulting Notification rows for the device owners
+are inserted in bulk through notifications.queue_notifications.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, Device, WaterAlertRule, WaterAlertState
+from notifications import queue_notifications
+
+METRICS = ('temperature', 'ph_level', 'turbidity', 'oxygen_level', 'ammonia_level')
+
+# Same ranges the device dashboard has always shown as optimal
+DEFAULT_RULES = {
+    'ph_level': {'low': 6.5, 'high': 7.5, 'hysteresis': 0.1, 'max_rate': 0.5, 'cooldown_minutes': 30},
+    'temperature': {'low': 24.0, 'high': 28.0, 'hysteresis': 0.5, 'max_rate': 1.0, 'cooldown_minutes': 30},
+    'turbidity': {'low': None, 'high': 5.0, 'hysteresis': 0.5, 'max_rate': None, 'cooldown_minutes': 60},
+    'oxygen_level': {'low': 6.0, 'high': 8.0, 'hysteresis': 0.2, 'max_rate': None, 'cooldown_minutes': 30},
+    'ammonia_level': {'low': None, 'high': 0.05, 'hysteresis': 0.01, 'max_rate': None, 'cooldown_minutes': 60}
+}
+
+METRIC_LABELS = {
+    'ph_level': ('pH', ''),
+    'temperature': ('Suhu', '°C'),
+    'turbidity': ('Kekeruhan', ' NTU'),
+    'oxygen_level': ('Oksigen terlarut', ' mg/L'),
+    'ammonia_level': ('Amonia', ' ppm')
+}
+
+RULE_FIELDS = ('low', 'high', 'hysteresis', 'max_rate', 'cooldown_minutes')
+
+# Level event codes
+_NO_EVENT = -2
+
+
+def load_rules(device_ids):
+    """
+    Effective rules for the given devices with one query.
+    Returns {device_id: {metric: rule dict}}.
+    """
+    device_ids = list(device_ids)
+    stored = WaterAlertRule.query.filter(
+        or_(WaterAlertRule.device_id.is_(None), WaterAlertRule.device_id.in_(device_ids))
+    ).all()
+
+    defaults = {metric: dict(rule, is_active=True) for metric, rule in DEFAULT_RULES.items()}
+    overrides = {}
+    for rule in stored:
+        if rule.metric not in defaults:
+            continue
+        values = {field: getattr(rule, field) for field in RULE_FIELDS}
+        values['is_active'] = rule.is_active is not False
+        if rule.device_id is None:
+            defaults[rule.metric] = values
+        else:
+            overrides[(rule.device_id, rule.metric)] = values
+
+    return {
+        device_id: {metric: overrides.get((device_id, metric), defaults[metric]) for metric in METRICS}
+        for device_id in device_ids
+    }
+
+
+def rules_for_device(device_id):
+    return load_rules([device_id])[device_id]
+
+
+def _epoch(value):
+    return (value - datetime(1970, 1, 1)).total_seconds() if value else np.nan
+
+
+def _rule_column(rules, devices, metric, field, missing):
+    column = np.array([rules[d][metric][field] if rules[d][metric]['is_active'] else None
+                       for d in devices], dtype=object)
+    return np.where(column == None, missing, column).astype(np.float64)  # noqa: E711
+
+
+def _shift(values, first, seed):
+    """values moved one row down within each device group; group starts take seed."""
+    shifted = np.empty_like(values)
+    shifted[1:] = values[:-1]
+    shifted[first] = seed[first]
+    return shifted
+
+
+def evaluate(device_ids, timestamps, values, rules, states):
+    """
+    Evaluate one batch. device_ids / timestamps (epoch seconds) are arrays,
+    values maps metric -> float array (NaN = not reported), rules comes from
+    load_rules and states maps (device_id, metric) -> dict with level,
+    last_value, last_timestamp (epoch) and last_alert_at (epoch).
+
+    Returns (alerts, new_states): alerts is a list of dicts (device_id, metric,
+    kind = high / low / rate, value, limit, timestamp); new_states has the same
+    shape as states for every device/metric seen in the batch.
+    """
+    order = np.lexsort((timestamps, device_ids))
+    device_ids = np.asarray(device_ids, dtype=np.int64)[order]
+    timestamps = np.asarray(timestamps, dtype=np.float64)[order]
+
+    alerts = []
+    new_states = {}
+    for metric in METRICS:
+        v = np.asarray(values[metric], dtype=np.float64)[order]
+        present = ~np.isnan(v)
+        if not present.any():
+            continue
+        dev, t, v = device_ids[present], timestamps[present], v[present]
+        n = len(v)
+        index = np.arange(n)
+        first = np.ones(n, dtype=bool)
+        first[1:] = dev[1:] != dev[:-1]
+        last = np.ones(n, dtype=bool)
+        last[:-1] = first[1:]
+
+        # Per-device rule and state, broadcast to rows
+        devices, inverse = np.unique(dev, return_inverse=True)
+        low = _rule_column(rules, devices, metric, 'low', -np.inf)[inverse]
+        high = _rule_column(rules, devices, metric, 'high', np.inf)[inverse]
+        hysteresis = _rule_column(rules, devices, metric, 'hysteresis', 0.0)[inverse]
+        max_rate = _rule_column(rules, devices, metric, 'max_rate', np.inf)[inverse]
+        cooldown = _rule_column(rules, devices, metric, 'cooldown_minutes', 0.0)[inverse] * 60
+
+        stored = [states.get((int(d), metric), {}) for d in devices]
+        seed_level = np.array([s.get('level') or 0 for s in stored], dtype=np.int64)[inverse]
+        seed_value = np.array([s.get('last_value', np.nan) for s in stored], dtype=np.float64)[inverse]
+        seed_time = np.array([s.get('last_timestamp', np.nan) for s in stored], dtype=np.float64)[inverse]
+        last_alert = np.array([s.get('last_alert_at', np.nan) for s in stored], dtype=np.float64)[inverse]
+
+        # Hysteresis: events, then forward fill within each device group
+        event = np.full(n, _NO_EVENT, dtype=np.int64)
+        event[(v >= low + hysteresis) & (v <= high - hysteresis)] = 0
+        event[v > high] = 1
+        event[v < low] = -1
+        group_start = np.maximum.accumulate(np.where(first, index, 0))
+        filled = np.maximum.accumulate(np.where(event != _NO_EVENT, index, -1))
+        level = np.where(filled >= group_start, event[np.maximum(filled, 0)], seed_level)
+        previous_level = _shift(level, first, seed_level)
+        threshold_hit = (level != 0) & (level != previous_level)
+
+        # Rate of change per minute against the previous reading of the device
+        previous_value = _shift(v, first, seed_value)
+        previous_time = _shift(t, first, seed_time)
+        minutes = (t - previous_time) / 60.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.where(minutes > 0, (v - previous_value) / minutes, np.nan)
+            rate_hit = np.abs(rate) > max_rate
+
+        # First hit per device, unless that device/metric is still cooling down
+        hit = threshold_hit | rate_hit
+        hit_rows = np.flatnonzero(hit)
+        if len(hit_rows):
+            first_hit = np.ones(len(hit_rows), dtype=bool)
+            first_hit[1:] = dev[hit_rows[1:]] != dev[hit_rows[:-1]]
+            hit_rows = hit_rows[first_hit]
+            cooling = t[hit_rows] < last_alert[hit_rows] + cooldown[hit_rows]
+            hit_rows = hit_rows[~cooling]
+
+        alerted_at = {}
+        for row in hit_rows.tolist():
+            device_id = int(dev[row])
+            if threshold_hit[row]:
+                kind = 'high' if level[row] > 0 else 'low'
+                limit = high[row] if kind == 'high' else low[row]
+            else:
+                kind = 'rate'
+                limit = max_rate[row]
+            alerts.append({
+                'device_id': device_id,
+                'metric': metric,
+                'kind': kind,
+                'value': float(v[row]),
+                'rate': float(rate[row]) if kind == 'rate' else None,
+                'limit': float(limit),
+                'timestamp': float(t[row])
+            })
+            alerted_at[device_id] = float(t[row])
+
+        for row in np.flatnonzero(last).tolist():
+            device_id = int(dev[row])
+            previous_alert = last_alert[row]
+            new_states[(device_id, metric)] = {
+                'level': int(level[row]),
+                'last_value': float(v[row]),
+                'last_timestamp': float(t[row]),
+                'last_alert_at': alerted_at.get(device_id, None if np.isnan(previous_alert) else float(previous_alert))
+            }
+
+    return alerts, new_states
+
+
+def _load_states(device_ids):
+    rows = WaterAlertState.query.filter(WaterAlertState.device_id.in_(list(device_ids))).all()
+    return {
+        (row.device_id, row.metric): {
+            'level': row.level,
+            'last_value': row.last_value if row.last_value is not None else np.nan,
+            'last_timestamp': _epoch(row.last_timestamp),
+            'last_alert_at': _epoch(row.last_alert_at)
+        }
+        for row in rows
+    }
+
+
+def _save_states(new_states):
+    def to_datetime(seconds):
+        return datetime(1970, 1, 1) + timedelta(seconds=seconds) if seconds is not None else None
+
+    rows = [
+        {
+            'device_id': device_id,
+            'metric': metric,
+            'level': state['level'],
+            'last_value': state['last_value'],
+            'last_timestamp': to_datetime(state['last_timestamp']),
+            'last_alert_at': to_datetime(state['last_alert_at'])
+        }
+        for (device_id, metric), state in new_states.items()
+    ]
+    if not rows:
+        return
+    stmt = sqlite_insert(WaterAlertState.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['device_id', 'metric'],
+        set_={name: stmt.excluded[name] for name in ('level', 'last_value', 'last_timestamp', 'last_alert_at')}
+    )
+    db.session.execute(stmt, rows)
+
+
+def _describe(alert, device_name):
+    label, unit = METRIC_LABELS[alert['metric']]
+    if alert['kind'] == 'rate':
+        return (
+            'warning',
+            f'{label} Berubah Cepat',
+            f"{label} pada perangkat {device_name} berubah {alert['rate']:+.2f}{unit} per menit "
+            f"(batas {alert['limit']:g}{unit} per menit). Nilai terakhir {alert['value']:.2f}{unit}."
+        )
+    direction = 'di atas batas maksimum' if alert['kind'] == 'high' else 'di bawah batas minimum'
+    return (
+        'alert',
+        f'Peringatan Kualitas Air: {label}',
+        f"{label} pada perangkat {device_name} {alert['value']:.2f}{unit}, {direction} {alert['limit']:g}{unit}."
+    )
+
+
+def process_alerts(batch):
+    """
+    Evaluate an accepted TelemetryBatch, store the alert states and queue one
+    Notification per alert for the device owner. The caller commits.
+    Returns the alerts.
+    """
+    if not len(batch):
+        return []
+
+    device_ids = np.unique(batch.device_ids).tolist()
+    rules = load_rules(device_ids)
+    states = _load_states(device_ids)
+    alerts, new_states = evaluate(batch.device_ids, batch.timestamps, batch.values, rules, states)
+    _save_states(new_states)
+
+    if alerts:
+        devices = {
+            device.id: device
+            for device in Device.query.filter(Device.id.in_({a['device_id'] for a in alerts})).all()
+        }
+        notifications = []
+        for alert in alerts:
+            device = devices.get(alert['device_id'])
+            if device is None:
+                continue
+            notif_type, title, message = _describe(alert, device.name)
+            notifications.append({
+                'user_id': device.user_id,
+                'device_id': device.id,
+                'type': notif_type,
+                'title': title,
+                'message': message
+            })
+        queue_notifications(notifications)
+
+    return alerts
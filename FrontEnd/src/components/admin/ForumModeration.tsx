@@ -59,9 +59,13 @@ interface Topic {
 export default function ForumModeration() {
   const [activeTab, setActiveTab] = useState('topics');
   const [topics, setTopics] = useState<Topic[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [reports, setReports] = useState<Report[]>([]);
   const [loading, setLoading] = useState(true);
   const [searchQuery, setSearchQuery] = useState('');
+  // searchQuery after typing pauses; topics are searched on the server
+  const [topicSearch, setTopicSearch] = useState('');
   const [statusFilter, setStatusFilter] = useState('Pending');
   const [categoryFilter, setCategoryFilter] = useState('Semua');
   const [showDetailModal, setShowDetailModal] = useState(false);
@@ -85,16 +89,27 @@ export default function ForumModeration() {
     } else {
       loadReports();
     }
-  }, [activeTab, statusFilter, categoryFilter]);
+  }, [activeTab, statusFilter, categoryFilter, topicSearch]);
 
-  // Load topics
-  const loadTopics = async () => {
+  useEffect(() => {
+    const timer = setTimeout(() => setTopicSearch(searchQuery.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
+  // Load topics (one page; cursor = next_cursor of the previous page appends the next one)
+  const loadTopics = async (cursor?: string) => {
     try {
-      setLoading(true);
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
       const category = categoryFilter === 'Semua' ? undefined : categoryFilter;
-      const response = await forumAPI.getTopics(category, undefined);
+      const response = await forumAPI.getTopics(category, topicSearch || undefined, cursor);
       if (response.success) {
-        setTopics(response.topics || []);
+        const page = response.topics || [];
+        setTopics(cursor ? [...topics, ...page] : page);
+        setNextCursor(response.next_cursor || null);
       }
     } catch (error: any) {
       console.error('❌ Error loading topics:', error);
@@ -102,6 +117,7 @@ export default function ForumModeration() {
       setTopics([]);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -313,14 +329,8 @@ export default function ForumModeration() {
     });
   };
   
-  const filteredTopics = topics.filter(topic => {
-    const matchesSearch = 
-      topic.title?.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      topic.content?.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      topic.user?.name?.toLowerCase().includes(searchQuery.toLowerCase());
-    
-    return matchesSearch;
-  });
+  // Search and category are applied by the server across all pages
+  const filteredTopics = topics;
 
   return (
     <div className="space-y-6">
@@ -604,6 +614,19 @@ export default function ForumModeration() {
                   </div>
                 </Card>
               ))}
+
+              {nextCursor && (
+                <div className="text-center pt-2">
+                  <Button
+                    variant="outline"
+                    onClick={() => loadTopics(nextCursor)}
+                    disabled={loadingMore}
+                    style={{ fontFamily: 'Nunito Sans, sans-serif' }}
+                  >
+                    {loadingMore ? 'Memuat...' : 'Muat lebih banyak'}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </TabsContent>
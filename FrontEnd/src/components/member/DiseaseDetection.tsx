@@ -128,6 +128,9 @@ export default function DiseaseDetection() {
 
       const formData = new FormData();
       formData.append('image', blob, 'frame.jpg');
+      if (activeDeviceId) {
+        formData.append('device_id', activeDeviceId); // Scopes the server-side frame cache
+      }
 
       try {
         const token = sessionStorage.getItem("access_token") || localStorage.getItem("access_token");
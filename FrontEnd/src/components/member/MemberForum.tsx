@@ -50,8 +50,12 @@ export default function MemberForum() {
   const [selectedTopic, setSelectedTopic] = useState<Topic | null>(null);
   const [showReplies, setShowReplies] = useState(false);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [searchQuery, setSearchQuery] = useState<string>('');
+  // Server-side full-text results for searchQuery (null = not searching)
+  const [searchResults, setSearchResults] = useState<Topic[] | null>(null);
   
   // Report Modal States
   const [showReportModal, setShowReportModal] = useState(false);
@@ -72,50 +76,85 @@ export default function MemberForum() {
     fetchTopics();
   }, []);
 
-  const fetchTopics = async () => {
+  // Search the whole forum (titles, content and replies) while typing, debounced
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (query.length < 2) {
+      setSearchResults(null);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await forumAPI.searchTopics(query);
+        if (!cancelled && response.success) {
+          setSearchResults(response.results.map(mapTopic));
+        }
+      } catch (err) {
+        console.error('❌ Error searching topics:', err);
+      }
+    }, 300);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery]);
+
+  // Map backend data to frontend format
+  const mapTopic = (topic: any): Topic => {
+    // Capitalize each word in category
+    const rawCategory = topic.category || 'umum';
+    const capitalizedCategory = rawCategory
+      .split('-')
+      .map((word: string) => word.charAt(0).toUpperCase() + word.slice(1).toLowerCase())
+      .join(' ');
+    
+    return {
+      id: topic.id,
+      title: topic.title,
+      content: topic.content,
+      author_name: topic.author?.name || topic.author?.username || 'Anonymous',
+      category: capitalizedCategory,
+      replies_count: topic.reply_count || 0,
+      likes: topic.like_count || 0,
+      views: topic.views || 0,
+      created_at: topic.created_at,
+      updated_at: topic.updated_at,
+      is_pinned: topic.is_pinned || false,
+      user_liked: topic.user_liked || false
+    };
+  };
+
+  // Topics come in pages; pass the previous page's next_cursor to append the next one
+  const fetchTopics = async (cursor?: string) => {
     try {
-      setLoading(true);
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
       setError(null);
       
-      const response = await forumAPI.getTopics();
+      const response = await forumAPI.getTopics(undefined, undefined, cursor);
       console.log('📥 Topics from database:', response);
 
       if (response.success && response.topics) {
-        // Map backend data to frontend format
-        const mappedTopics = response.topics.map((topic: any) => {
-          // Capitalize each word in category
-          const rawCategory = topic.category || 'umum';
-          const capitalizedCategory = rawCategory
-            .split('-')
-            .map((word: string) => word.charAt(0).toUpperCase() + word.slice(1).toLowerCase())
-            .join(' ');
-          
-          return {
-            id: topic.id,
-            title: topic.title,
-            content: topic.content,
-            author_name: topic.author?.name || topic.author?.username || 'Anonymous',
-            category: capitalizedCategory,
-            replies_count: topic.reply_count || 0,
-            likes: topic.like_count || 0,
-            views: topic.views || 0,
-            created_at: topic.created_at,
-            updated_at: topic.updated_at,
-            is_pinned: topic.is_pinned || false,
-            user_liked: topic.user_liked || false
-          };
-        });
+        const mappedTopics: Topic[] = response.topics.map(mapTopic);
         
-        setTopics(mappedTopics);
+        const loadedTopics: Topic[] = cursor ? [...topics, ...mappedTopics] : mappedTopics;
+        setTopics(loadedTopics);
+        setNextCursor(response.next_cursor || null);
         
-        // Hitung kategori dan count-nya dari data
-        const categoryCounts = mappedTopics.reduce((acc: Record<string, number>, topic: Topic) => {
+        // Hitung kategori dan count-nya dari data yang sudah dimuat
+        const categoryCounts = loadedTopics.reduce((acc: Record<string, number>, topic: Topic) => {
           acc[topic.category] = (acc[topic.category] || 0) + 1;
           return acc;
         }, {});
 
         const categoryList: Category[] = [
-          { name: t('forum.allTopics'), count: mappedTopics.length },
+          { name: t('forum.allTopics'), count: loadedTopics.length },
           ...Object.entries(categoryCounts).map(([name, count]) => ({
             name,
             count: count as number
@@ -129,6 +168,7 @@ export default function MemberForum() {
       setError(err.response?.data?.message || t('forum.error'));
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -163,6 +203,13 @@ export default function MemberForum() {
 
   // Filter topics berdasarkan kategori dan search query
   const getFilteredTopics = () => {
+    // Ranked server results replace the loaded pages while searching
+    if (searchResults) {
+      return selectedCategory !== t('forum.allTopics')
+        ? searchResults.filter(topic => topic.category === selectedCategory)
+        : searchResults;
+    }
+
     let filtered = topics;
     
     // Filter by category
@@ -285,7 +332,7 @@ export default function MemberForum() {
         <div className="text-center">
           <p className="text-red-500 mb-4">{error}</p>
           <button
-            onClick={fetchTopics}
+            onClick={() => fetchTopics()}
             className="px-4 py-2 bg-blue-500 text-white rounded-lg hover:bg-blue-600"
           >
             {t('common.tryAgain')}
@@ -622,6 +669,19 @@ export default function MemberForum() {
               </div>
             ))
           )}
+
+          {nextCursor && !searchResults && (
+            <div className="text-center pt-2">
+              <Button
+                variant="outline"
+                onClick={() => fetchTopics(nextCursor)}
+                disabled={loadingMore}
+                style={{ borderRadius: '24px', fontFamily: 'Nunito Sans, sans-serif' }}
+              >
+                {loadingMore ? 'Memuat...' : 'Muat lebih banyak'}
+              </Button>
+            </div>
+          )}
         </div>
       </div>
 
@@ -145,29 +145,35 @@ export default function MemberOverview() {
   useEffect(() => {
     if (!deviceId) return;
 
+    // ETag of the last dashboard response; unchanged dashboards come back as 304
+    let dashboardEtag: string | null = null;
+
     const fetchDashboardData = async () => {
       try {
         const numericDeviceId = parseInt(deviceId);
 
-        // Fetch water data
-        const waterResponse = await deviceAPI.getDashboardWaterLatest(numericDeviceId);
-        if (waterResponse.success && waterResponse.data) {
-          setPhValue(waterResponse.data.ph.value);
-          setTempValue(waterResponse.data.temperature.value);
-          setTurbidityValue(waterResponse.data.turbidity.value);
+        const dashboard = await deviceAPI.getDashboard(numericDeviceId, dashboardEtag);
+        dashboardEtag = dashboard.etag;
+        if (dashboard.notModified || !dashboard.data?.success) return;
+
+        const { water, robot, disease, notifications: recentNotifications } = dashboard.data.data;
+
+        // Water data
+        if (water) {
+          setPhValue(water.ph.value);
+          setTempValue(water.temperature.value);
+          setTurbidityValue(water.turbidity.value);
         }
 
-        // Fetch robot status
-        const robotResponse = await deviceAPI.getDashboardRobotStatus(numericDeviceId);
-        if (robotResponse.success && robotResponse.data) {
-          setRobotStatus(robotResponse.data.status);
-          setRobotBattery(robotResponse.data.battery);
+        // Robot status
+        if (robot) {
+          setRobotStatus(robot.status);
+          setRobotBattery(robot.battery);
         }
 
-        // Fetch latest disease detection
-        const diseaseResponse = await deviceAPI.getDashboardDiseaseLatest(numericDeviceId);
-        if (diseaseResponse.success && diseaseResponse.has_detection && diseaseResponse.data) {
-          const detail = diseaseResponse.data;
+        // Latest disease detection
+        if (disease?.has_detection && disease.data) {
+          const detail = disease.data;
           const severityRaw = detail.severity as SeverityKey;
           const severity: Exclude<SeverityKey, 'none'> = severityRaw === 'low' || severityRaw === 'high' ? severityRaw : 'medium';
           const severityStyle = SEVERITY_STYLES[severity];
@@ -193,16 +199,15 @@ export default function MemberOverview() {
           setDiseaseData(null);
         }
 
-        // Fetch recent notifications
-        const notifResponse = await deviceAPI.getDashboardNotificationsRecent(numericDeviceId);
-        if (notifResponse.success && notifResponse.data) {
-          const formattedNotifs = notifResponse.data.map((n: any) => ({
+        // Recent notifications
+        if (Array.isArray(recentNotifications)) {
+          const formattedNotifs = recentNotifications.map((n: any) => ({
             id: n.id,
             type: n.type || 'info',
             message: n.message,
             time: new Date(n.created_at).toLocaleString('id-ID', { hour: '2-digit', minute: '2-digit' }),
-            iconColor: n.type === 'warning' ? '#CE3939' : n.type === 'success' ? '#4AD991' : '#8280FF',
-            icon: n.type === 'warning' ? AlertTriangle : n.type === 'success' ? CheckCircle : Clock
+            iconColor: n.type === 'warning' || n.type === 'alert' ? '#CE3939' : n.type === 'success' ? '#4AD991' : '#8280FF',
+            icon: n.type === 'warning' || n.type === 'alert' ? AlertTriangle : n.type === 'success' ? CheckCircle : Clock
           }));
           setNotifications(formattedNotifs);
         }
@@ -214,7 +219,7 @@ export default function MemberOverview() {
 
     fetchDashboardData();
 
-    // Refetch data every 30 seconds to get new dummy data from backend
+    // Refetch every 30 seconds; unchanged data costs a 304
     const fetchInterval = setInterval(fetchDashboardData, 30000);
 
     return () => clearInterval(fetchInterval);
@@ -26,6 +26,10 @@ export default function MyTopics() {
   const { user } = useAuth();
   const [topics, setTopics] = useState<Topic[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  // Jumlah semua topik user (bukan hanya halaman yang sudah dimuat)
+  const [totalTopics, setTotalTopics] = useState(0);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [sortBy, setSortBy] = useState<'recent' | 'popular' | 'replies'>('recent');
   
@@ -40,13 +44,18 @@ export default function MyTopics() {
     fetchMyTopics();
   }, [user?.id]);
 
-  const fetchMyTopics = async () => {
+  // Topik dimuat per halaman; cursor = next_cursor dari halaman sebelumnya
+  const fetchMyTopics = async (cursor?: string) => {
     try {
-      setLoading(true);
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
       setError(null);
 
       // Panggil endpoint untuk get topik milik member
-      const response = await forumAPI.getUserTopics();
+      const response = await forumAPI.getUserTopics(cursor);
       console.log('📥 My topics from database:', response);
 
       if (response.success && response.topics) {
@@ -65,7 +74,9 @@ export default function MyTopics() {
           is_pinned: topic.is_pinned || false
         }));
         
-        setTopics(mappedTopics);
+        setTopics(cursor ? [...topics, ...mappedTopics] : mappedTopics);
+        setNextCursor(response.next_cursor || null);
+        setTotalTopics(response.total ?? mappedTopics.length);
       } else {
         setError('Gagal memuat topik Anda');
       }
@@ -74,6 +85,7 @@ export default function MyTopics() {
       setError(err.response?.data?.message || 'Gagal memuat topik');
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -92,6 +104,7 @@ export default function MyTopics() {
 
       if (response.message || response.success) {
         setTopics(topics.filter((t: Topic) => t.id !== deleteTopicId));
+        setTotalTopics(Math.max(totalTopics - 1, 0));
         setShowConfirmModal(false);
         setSuccessMessage('Topik berhasil dihapus');
         setShowSuccessModal(true);
@@ -159,7 +172,7 @@ export default function MyTopics() {
             <h2 className="text-3xl font-bold" style={{ color: '#FFFFFF' }}>
               Topik <span style={{ color: '#FFFFFF' }}>Saya</span>
             </h2>
-            <p className="text-sm text-gray-600">Total: {topics.length} topik</p>
+            <p className="text-sm text-gray-600">Total: {totalTopics} topik</p>
           </div>
         </div>
 
@@ -347,6 +360,19 @@ export default function MyTopics() {
             </div>
           ))
         )}
+
+        {nextCursor && (
+          <div className="text-center pt-2">
+            <Button
+              variant="outline"
+              onClick={() => fetchMyTopics(nextCursor)}
+              disabled={loadingMore}
+              style={{ borderRadius: '24px', fontFamily: 'Nunito Sans, sans-serif' }}
+            >
+              {loadingMore ? 'Memuat...' : 'Muat lebih banyak'}
+            </Button>
+          </div>
+        )}
       </div>
 
       {/* Confirmation Modal */}
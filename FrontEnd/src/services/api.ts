@@ -249,6 +249,19 @@ export const deviceAPI = {
   },
 
   // Device Dashboard Data Methods
+  // All dashboard sections in one request; pass the last ETag to get a cheap 304 when nothing changed
+  getDashboard: async (deviceId: number, etag?: string | null) => {
+    const response = await api.get(`/devices/${deviceId}/dashboard`, {
+      headers: etag ? { 'If-None-Match': etag } : {},
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304
+    });
+    return {
+      notModified: response.status === 304,
+      etag: (response.headers['etag'] as string | undefined) || etag || null,
+      data: response.status === 304 ? null : response.data
+    };
+  },
+
   getDashboardWaterLatest: async (deviceId: number) => {
     const response = await api.get(`/devices/${deviceId}/dashboard/water-latest`);
     return response.data;
@@ -279,6 +292,13 @@ export const waterAPI = {
     return response.data;
   },
 
+  getWaterSeries: async (deviceId: number, hours: number = 24, points: number = 500, method: 'lttb' | 'minmax' = 'lttb') => {
+    const response = await api.get(`/devices/${deviceId}/water-data`, {
+      params: { hours, points, method }
+    });
+    return response.data;
+  },
+
   addWaterData: async (deviceId: number, data: {
     temperature?: number;
     ph_level?: number;
@@ -447,10 +467,18 @@ export const fishpediaAPI = {
 
 // Forum API
 export const forumAPI = {
-  // Get all topics
-  getTopics: async (category?: string, search?: string) => {
+  // Get one page of topics (pinned first, newest first); pass next_cursor from the previous page to continue
+  getTopics: async (category?: string, search?: string, cursor?: string, limit?: number) => {
     const response = await api.get('/forum/topics', {
-      params: { category, search }
+      params: { category, search, cursor, limit }
+    });
+    return response.data;
+  },
+
+  // Ranked full-text search (titles, content, replies); each result has match.title_html / match.snippet_html
+  searchTopics: async (q: string, page: number = 1, perPage: number = 20, category?: string) => {
+    const response = await api.get('/forum/search', {
+      params: { q, page, per_page: perPage, category }
     });
     return response.data;
   },
@@ -552,14 +580,14 @@ export const forumAPI = {
     return response.data;
   },
 
-  getAllTopics: async () => {
-    const response = await api.get('/forum/topics');
+  getAllTopics: async (cursor?: string, limit?: number) => {
+    const response = await api.get('/forum/topics', { params: { cursor, limit } });
     return response.data;
   },
 
-  // Get topik milik user (Topik Saya)
-  getUserTopics: async () => {
-    const response = await api.get('/forum/my-topics');
+  // Get topik milik user (Topik Saya), per halaman seperti getTopics
+  getUserTopics: async (cursor?: string, limit?: number) => {
+    const response = await api.get('/forum/my-topics', { params: { cursor, limit } });
     return response.data;
   },
 